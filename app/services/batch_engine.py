@@ -0,0 +1,362 @@
+import math
+import logging
+from itertools import repeat
+from types import SimpleNamespace
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from app.services.ruleset_compiler import (
+    CompiledRuleset, CompiledStep, OverrideIndex, OUTPUT_VARIABLES, SAFE_FUNCTIONS, run_expression
+)
+from app.utils.rounding import rounding_array
+
+logger = logging.getLogger(__name__)
+
+
+def _vector_min(*args):
+    if len(args) == 1:
+        return min(args[0])
+    result = args[0]
+    for arg in args[1:]:
+        result = np.minimum(result, arg)
+    return result
+
+
+def _vector_max(*args):
+    if len(args) == 1:
+        return max(args[0])
+    result = args[0]
+    for arg in args[1:]:
+        result = np.maximum(result, arg)
+    return result
+
+
+_VECTOR_MATH = SimpleNamespace(
+    pi=math.pi, e=math.e, inf=math.inf,
+    ceil=np.ceil, floor=np.floor, trunc=np.trunc, fabs=np.fabs,
+    sqrt=np.sqrt, exp=np.exp, log=np.log, log10=np.log10, pow=np.power,
+)
+
+# Mismas funciones que el contexto escalar, en versión que opera sobre columnas
+VECTOR_GLOBALS = {
+    "__builtins__": {},
+    **SAFE_FUNCTIONS,
+    'math': _VECTOR_MATH,
+    'min': _vector_min,
+    'max': _vector_max,
+    'rounding': rounding_array,
+}
+
+
+class _Column:
+    """Valores de una variable para todas las filas del lote.
+
+    `values` es un escalar (mismo valor en todas las filas) o un array de numpy;
+    `present` marca las filas donde la variable existe (None = todas).
+    """
+    __slots__ = ('values', 'present')
+
+    def __init__(self, values: Any, present: Optional[np.ndarray] = None):
+        self.values = values
+        self.present = present
+
+    @property
+    def is_scalar(self) -> bool:
+        return not isinstance(self.values, np.ndarray)
+
+    def value_at(self, i: int) -> Any:
+        if self.is_scalar:
+            return self.values
+        value = self.values[i]
+        # Tipos nativos de Python para reproducir exactamente el camino escalar
+        return value.item() if isinstance(value, np.generic) else value
+
+    def has(self, i: int) -> bool:
+        return self.present is None or bool(self.present[i])
+
+    def tile(self, copies: int) -> "_Column":
+        """Repite la columna `copies` veces (una por combinación de un barrido)"""
+        if self.is_scalar:
+            return self
+        present = None if self.present is None else np.tile(self.present, copies)
+        return _Column(np.tile(self.values, copies), present)
+
+
+def _object_array(values: List[Any]) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _column_from_values(values: List[Any], present: Optional[np.ndarray] = None) -> _Column:
+    """Usa un array float cuando todos los valores son float, si no un array de objetos"""
+    if present is None and all(type(v) is float for v in values):
+        return _Column(np.asarray(values, dtype=float))
+    return _Column(_object_array(values), present)
+
+
+class _Batch:
+    """Contexto de evaluación de un ruleset sobre un lote de items"""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.size = len(items)
+        self.columns: Dict[str, _Column] = {}
+
+        self.columns['sku'] = _Column(_object_array([item.get('sku', '') for item in items]))
+        self.columns['marca'] = _Column(_object_array([item.get('marca', '') for item in items]))
+        self.columns['linea'] = _Column(_object_array([item.get('linea', '') for item in items]))
+        self.columns['base_price'] = _Column(
+            np.fromiter((float(item.get('base_price', 0)) for item in items), dtype=float, count=self.size)
+        )
+        self.columns['cost'] = _Column(
+            np.fromiter((float(item.get('cost', 0)) for item in items), dtype=float, count=self.size)
+        )
+
+        # Atributos extra: la unión de claves de todos los items
+        attrs = [item.get('attrs', {}) for item in items]
+        keys = []
+        for item_attrs in attrs:
+            for key in item_attrs:
+                if key not in keys:
+                    keys.append(key)
+        for key in keys:
+            present = np.fromiter((key in a for a in attrs), dtype=bool, count=self.size)
+            values = [a.get(key) for a in attrs]
+            self.columns[key] = _column_from_values(values, None if present.all() else present)
+
+    def tile(self, copies: int) -> "_Batch":
+        """Lote con las filas repetidas `copies` veces, en bloques consecutivos"""
+        tiled = _Batch.__new__(_Batch)
+        tiled.size = self.size * copies
+        tiled.columns = {name: column.tile(copies) for name, column in self.columns.items()}
+        return tiled
+
+    def float_values(self, name: str) -> np.ndarray:
+        """Valores de una variable como array float; 0 donde no existe"""
+        column = self.columns.get(name)
+        if column is None:
+            return np.zeros(self.size, dtype=float)
+        if column.is_scalar:
+            return np.full(self.size, float(column.values))
+        values = column.values
+        if column.present is not None:
+            values = np.where(column.present, values, 0)
+        return values.astype(float)
+
+    def row_variables(self, i: int) -> Dict[str, Any]:
+        """Reconstruye el diccionario de variables de una fila (camino escalar)"""
+        return {
+            name: column.value_at(i)
+            for name, column in self.columns.items()
+            if column.has(i)
+        }
+
+    def set(self, name: str, values: Any) -> None:
+        """Asigna una variable en todas las filas"""
+        self.columns[name] = _Column(values)
+
+    def set_rows(self, name: str, rows: List[int], values: List[Any]) -> None:
+        """Asigna una variable solo en las filas indicadas, conservando el resto"""
+        current = self.columns.get(name)
+        if current is None:
+            merged = np.full(self.size, None, dtype=object)
+            present = np.zeros(self.size, dtype=bool)
+        elif current.is_scalar:
+            merged = np.empty(self.size, dtype=object)
+            merged.fill(current.values)
+            present = None
+        else:
+            merged = current.values.astype(object)
+            present = None if current.present is None else current.present.copy()
+
+        for row, value in zip(rows, values):
+            merged[row] = value
+        if present is not None:
+            present[rows] = True
+            if present.all():
+                present = None
+        if present is None:
+            self.columns[name] = _column_from_values(merged.tolist())
+        else:
+            self.columns[name] = _Column(merged, present)
+
+
+def _run_step_vectorized(batch: _Batch, step: CompiledStep) -> np.ndarray:
+    """Evalúa una expresión sobre columnas; las filas no vectorizables se recalculan en escalar"""
+    env = {}
+    missing = np.zeros(batch.size, dtype=bool)
+    for name in step.expr.reads:
+        column = batch.columns.get(name)
+        if column is None:
+            missing[:] = True
+            continue
+        env[name] = column.values
+        if column.present is not None:
+            missing |= ~column.present
+
+    result = None
+    if not missing.all():
+        try:
+            with np.errstate(all='ignore'):
+                raw = eval(step.expr.code, VECTOR_GLOBALS, env)
+            result = np.array(np.broadcast_to(np.asarray(raw, dtype=float), (batch.size,)), dtype=float)
+        except Exception:
+            result = None
+
+    if result is None:
+        redo = np.ones(batch.size, dtype=bool)
+        result = np.zeros(batch.size, dtype=float)
+    else:
+        # NaN/inf: puede ser un error en escalar (ej. división por cero) → recalcular
+        redo = missing | ~np.isfinite(result)
+
+    for i in np.flatnonzero(redo):
+        result[i] = run_expression(step.expr, batch.row_variables(i))
+
+    return result
+
+
+def _apply_overrides(batch: _Batch, index: OverrideIndex, items: List[Dict[str, Any]], copies: int = 1) -> None:
+    """Aplica los overrides por filas usando el índice compilado (en cada copia del lote)"""
+    if not index.overrides:
+        return
+
+    size = len(items)
+    assigned: Dict[str, Tuple[List[int], List[Any]]] = {}
+    for position, item in enumerate(items):
+        for key, value in index.resolve(item).items():
+            rows, values = assigned.setdefault(key, ([], []))
+            for copy in range(copies):
+                rows.append(copy * size + position)
+                values.append(value)
+    for key, (rows, values) in assigned.items():
+        batch.set_rows(key, rows, values)
+
+
+def _run_steps(compiled: CompiledRuleset, batch: _Batch) -> None:
+    """Aplica los pasos invariantes ya evaluados y ejecuta los que dependen del item"""
+    for key, value in compiled.constants.items():
+        batch.set(key, value)
+
+    # Ejecutar sobre columnas completas solo los pasos que dependen del item
+    for step in compiled.item_steps:
+        if step.kind == 'from':
+            source = batch.columns.get(step.source)
+            if source is None:
+                batch.set(step.var, 0)
+            elif source.present is None:
+                batch.set(step.var, source.values)
+            else:
+                values = source.values.copy()
+                values[~source.present] = 0
+                batch.set(step.var, values)
+
+        elif step.kind == 'value':
+            batch.set(step.var, step.value)
+
+        elif step.kind == 'expr':
+            batch.set(step.var, _run_step_vectorized(batch, step))
+
+
+def evaluate_batch(compiled: CompiledRuleset, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Evalúa un ruleset compilado sobre un lote de items como operaciones de columna
+
+    Produce exactamente los mismos resultados que evaluar cada item con
+    RulesEngine.calculate_pricing; las filas o expresiones que no se pueden
+    vectorizar se recalculan con el camino escalar.
+
+    Args:
+        compiled: Ruleset compilado
+        items: Datos de entrada de los items (mismo formato que calculate_pricing)
+
+    Returns:
+        Lista de resultados, uno por item y en el mismo orden
+    """
+    if not items:
+        return []
+
+    batch = _Batch(items)
+
+    # Aplicar variables globales; los overrides tienen precedencia sobre ellas
+    for key, value in compiled.globals.items():
+        batch.set(key, value)
+
+    _apply_overrides(batch, compiled.override_index, items)
+    _run_steps(compiled, batch)
+
+    # Reconstruir resultados por item
+    full_names = [name for name, column in batch.columns.items() if column.present is None]
+    partial = [
+        (name, column.values.tolist(), column.present.tolist())
+        for name, column in batch.columns.items()
+        if column.present is not None
+    ]
+    full_values = [
+        repeat(column.values, batch.size) if column.is_scalar else column.values.tolist()
+        for column in (batch.columns[name] for name in full_names)
+    ]
+    ruleset_info = {'name': compiled.name, 'version': compiled.version}
+
+    results = []
+    for i, row in enumerate(zip(*full_values)):
+        variables = dict(zip(full_names, row))
+        for name, values, present in partial:
+            if present[i]:
+                variables[name] = values[i]
+
+        results.append({
+            'inputs': {
+                'sku': variables.get('sku'),
+                'marca': variables.get('marca'),
+                'linea': variables.get('linea'),
+                'base_price': variables.get('base_price'),
+                'cost': variables.get('cost'),
+            },
+            'outputs': {
+                'precio_publico': variables.get('precio_publico', 0),
+                'markup': variables.get('markup', 0),
+                'rentabilidad': variables.get('rentabilidad', 0),
+            },
+            'breakdown': variables,
+            'ruleset': dict(ruleset_info),
+        })
+
+    return results
+
+
+def evaluate_grid(compiled: CompiledRuleset, items: List[Dict[str, Any]],
+                  combinations: List[Dict[str, Any]],
+                  outputs: Tuple[str, ...] = OUTPUT_VARIABLES) -> Dict[str, np.ndarray]:
+    """
+    Evalúa un ruleset sobre todos los items para varias combinaciones de globals
+
+    Las combinaciones se apilan como bloques de filas de un único lote, así
+    cada paso se ejecuta una sola vez sobre items x combinaciones. Los overrides
+    siguen teniendo precedencia sobre los valores del barrido.
+
+    Args:
+        compiled: Ruleset compilado con los parámetros barridos como variables
+            (ver compile_sweep)
+        items: Datos de entrada de los items
+        combinations: Valores de los parámetros, uno por combinación
+        outputs: Variables a retornar
+
+    Returns:
+        Diccionario variable -> array de forma (combinaciones, items)
+    """
+    copies, size = len(combinations), len(items)
+    if not copies or not size:
+        return {name: np.zeros((copies, size), dtype=float) for name in outputs}
+
+    batch = _Batch(items).tile(copies)
+
+    for key, value in compiled.globals.items():
+        batch.set(key, value)
+    for key in combinations[0]:
+        column = _column_from_values([combination[key] for combination in combinations])
+        batch.set(key, np.repeat(column.values, size))
+
+    _apply_overrides(batch, compiled.override_index, items, copies)
+    _run_steps(compiled, batch)
+
+    return {name: batch.float_values(name).reshape(copies, size) for name in outputs}
@@ -0,0 +1,467 @@
+import ast
+import json
+import math
+import hashlib
+import logging
+import operator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import CodeType, MappingProxyType
+from collections import Counter
+from typing import Dict, List, Any, Iterable, Mapping, Optional, Tuple, FrozenSet
+from app.utils.rounding import rounding
+
+logger = logging.getLogger(__name__)
+
+# Funciones disponibles dentro de las expresiones de un ruleset
+SAFE_FUNCTIONS = {
+    'math': math,
+    'round': round,
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'rounding': rounding,
+}
+
+# Variables que forman los outputs de cada item
+OUTPUT_VARIABLES = ('precio_publico', 'markup', 'rentabilidad')
+
+# Contexto global para eval: sin builtins, solo las funciones permitidas
+SAFE_GLOBALS = {"__builtins__": {}, **SAFE_FUNCTIONS}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.Name, ast.Load, ast.Constant, ast.Attribute, ast.Tuple, ast.List,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _readonly(mapping: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Copia de solo lectura de un mapping de configuración"""
+    return MappingProxyType(dict(mapping))
+
+
+class RulesetCompilationError(ValueError):
+    """Error de validación o compilación de un ruleset"""
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    """Expresión parseada, validada y compilada una única vez"""
+    source: str
+    code: CodeType
+    reads: FrozenSet[str]
+    constant: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """Paso de un ruleset listo para ejecutar"""
+    var: str
+    kind: str  # from, value, expr, noop
+    source: Optional[str] = None
+    value: Any = None
+    expr: Optional[CompiledExpression] = None
+
+    @property
+    def reads(self) -> FrozenSet[str]:
+        if self.kind == 'from':
+            return frozenset([self.source])
+        if self.kind == 'expr':
+            return self.expr.reads
+        return frozenset()
+
+
+class OverrideIndex:
+    """
+    Índice hash de overrides agrupados por el conjunto de claves de `when`
+
+    Cada item se resuelve con una búsqueda por grupo de claves, sin importar
+    cuántos overrides existan. Precedencia: cuando varios overrides aplican,
+    se combinan en orden de declaración y el último gana por cada variable.
+    """
+
+    def __init__(self, overrides: Iterable[Dict[str, Any]]):
+        self.overrides = tuple(
+            _readonly({"when": _readonly(override.get("when", {})), "set": _readonly(override.get("set", {}))})
+            for override in overrides
+        )
+        self._groups: Dict[Tuple[str, ...], Dict[Tuple[Any, ...], List[int]]] = {}
+        self._unindexed: List[int] = []
+
+        for position, override in enumerate(self.overrides):
+            when = override.get("when", {})
+            keys = tuple(sorted(when))
+            values = tuple(when[key] for key in keys)
+            try:
+                self._groups.setdefault(keys, {}).setdefault(values, []).append(position)
+            except TypeError:
+                # Valores no hasheables (listas, dicts): se evalúan linealmente
+                self._unindexed.append(position)
+
+    @property
+    def keys(self) -> FrozenSet[str]:
+        """Variables que algún override puede modificar"""
+        return frozenset(key for override in self.overrides for key in override.get("set", {}))
+
+    def match(self, item_data: Dict[str, Any]) -> List[int]:
+        """Posiciones de los overrides que aplican al item, en orden de declaración"""
+        matched = []
+        for keys, table in self._groups.items():
+            try:
+                positions = table.get(tuple(item_data.get(key) for key in keys))
+            except TypeError:
+                continue
+            if positions:
+                matched.extend(positions)
+
+        for position in self._unindexed:
+            when = self.overrides[position].get("when", {})
+            if all(item_data.get(key) == value for key, value in when.items()):
+                matched.append(position)
+
+        if len(matched) > 1:
+            matched.sort()
+        return matched
+
+    def resolve(self, item_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Valores combinados de todos los overrides que aplican al item"""
+        matched = self.match(item_data)
+        if not matched:
+            return {}
+
+        values = {}
+        for position in matched:
+            values.update(self.overrides[position].get("set", {}))
+        return values
+
+
+@dataclass(frozen=True)
+class CompiledRuleset:
+    """Plan de ejecución de un ruleset: pasos pre-parseados y pre-validados
+
+    Es inmutable (dataclass congelada y mappings de solo lectura), así que
+    puede compartirse entre threads y simulaciones concurrentes.
+    """
+    name: str
+    version: str
+    applies_to: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    globals: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    steps: Tuple[CompiledStep, ...] = ()
+    overrides: Tuple[Mapping[str, Any], ...] = ()
+    override_index: OverrideIndex = field(default_factory=lambda: OverrideIndex(()))
+    # Plan: pasos invariantes ya evaluados y pasos que dependen del item
+    constants: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    # Configuración original y su huella, para recompilar en otros procesos
+    config: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    fingerprint: str = ""
+    item_steps: Tuple[CompiledStep, ...] = ()
+    hoisted: Tuple[str, ...] = ()
+    dropped: Tuple[str, ...] = ()
+
+    def describe_plan(self) -> Dict[str, Any]:
+        """Resumen del plan de ejecución (para logs y diagnóstico)"""
+        return {
+            'globals': list(self.globals),
+            'invariantes': list(self.hoisted),
+            'por_item': [step.var for step in self.item_steps],
+            'descartados': list(self.dropped),
+        }
+
+
+class _ConstantFolder(ast.NodeTransformer):
+    """Pliega sub-expresiones aritméticas formadas solo por constantes numéricas"""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        op = _BIN_OPS.get(type(node.op))
+        if op and _is_number(node.left) and _is_number(node.right):
+            try:
+                return ast.copy_location(ast.Constant(op(node.left.value, node.right.value)), node)
+            except (ArithmeticError, ValueError):
+                # Se deja sin plegar: el error aparecerá al evaluar, como antes
+                return node
+        return node
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        op = _UNARY_OPS.get(type(node.op))
+        if op and _is_number(node.operand):
+            return ast.copy_location(ast.Constant(op(node.operand.value)), node)
+        return node
+
+
+def _is_number(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+    )
+
+
+def _validate_tree(tree: ast.AST, expr: str) -> FrozenSet[str]:
+    """Verifica que el AST solo use nodos permitidos y retorna las variables leídas"""
+    reads = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise RulesetCompilationError(
+                f"Construcción no permitida en '{expr}': {type(node).__name__}"
+            )
+        if isinstance(node, ast.Attribute):
+            if not (isinstance(node.value, ast.Name) and node.value.id == 'math'):
+                raise RulesetCompilationError(f"Solo se permiten atributos de 'math' en '{expr}'")
+            if node.attr.startswith('_'):
+                raise RulesetCompilationError(f"Atributo no permitido en '{expr}': {node.attr}")
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                if func.id not in SAFE_FUNCTIONS or func.id == 'math':
+                    raise RulesetCompilationError(f"Función no permitida en '{expr}': {func.id}")
+            elif not isinstance(func, ast.Attribute):
+                raise RulesetCompilationError(f"Llamada no permitida en '{expr}'")
+            if node.keywords:
+                raise RulesetCompilationError(f"Argumentos por nombre no permitidos en '{expr}'")
+        elif isinstance(node, ast.Name) and node.id not in SAFE_FUNCTIONS:
+            reads.add(node.id)
+    return frozenset(reads)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expr: str) -> CompiledExpression:
+    """
+    Parsea, valida y compila una expresión de ruleset
+
+    Args:
+        expr: Expresión matemática (ej: "K * (1 + IVA)")
+
+    Returns:
+        CompiledExpression reutilizable en cada evaluación
+
+    Raises:
+        RulesetCompilationError: Si la expresión es inválida o usa construcciones no permitidas
+    """
+    if not isinstance(expr, str):
+        raise RulesetCompilationError(f"La expresión debe ser texto: {expr!r}")
+
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RulesetCompilationError(f"Sintaxis inválida en '{expr}': {e.msg}") from e
+
+    reads = _validate_tree(tree, expr)
+    tree = ast.fix_missing_locations(_ConstantFolder().visit(tree))
+
+    constant = None
+    if _is_number(tree.body):
+        constant = float(tree.body.value)
+
+    code = compile(tree, f"<ruleset:{expr}>", 'eval')
+    return CompiledExpression(source=expr, code=code, reads=reads, constant=constant)
+
+
+def _compile_step(step: Dict[str, Any], index: int) -> CompiledStep:
+    step_type = step.get('type', 'var')
+    var_name = step.get('var')
+
+    if step_type != 'var':
+        # Lógica condicional (para futuras expansiones)
+        return CompiledStep(var=var_name, kind='noop')
+
+    if not var_name:
+        raise RulesetCompilationError(f"Paso {index}: campo 'var' requerido")
+
+    if 'from' in step:
+        return CompiledStep(var=var_name, kind='from', source=step['from'])
+    if 'value' in step:
+        return CompiledStep(var=var_name, kind='value', value=step['value'])
+    if 'expr' in step:
+        compiled = compile_expression(step['expr'])
+        if compiled.constant is not None:
+            return CompiledStep(var=var_name, kind='value', value=compiled.constant, expr=compiled)
+        return CompiledStep(var=var_name, kind='expr', expr=compiled)
+
+    return CompiledStep(var=var_name, kind='noop')
+
+
+def _live_steps(steps: Tuple[CompiledStep, ...], outputs: Optional[Iterable[str]]) -> Tuple[list, list]:
+    """Descarta los pasos cuyos resultados nunca se leen (análisis de vida hacia atrás)"""
+    steps = [step for step in steps if step.kind != 'noop']
+    if outputs is None:
+        return steps, []
+
+    live = set(outputs)
+    keep = set()
+    for index in range(len(steps) - 1, -1, -1):
+        step = steps[index]
+        if step.var in live:
+            keep.add(index)
+            live.discard(step.var)
+            live |= step.reads
+
+    kept = [step for index, step in enumerate(steps) if index in keep]
+    dropped = [step.var for index, step in enumerate(steps) if index not in keep]
+    return kept, dropped
+
+
+def _evaluate_constant_step(step: CompiledStep, constants: Dict[str, Any]) -> Any:
+    if step.kind == 'from':
+        return constants.get(step.source, 0)
+    if step.kind == 'value':
+        return step.value
+    return run_expression(step.expr, dict(constants))
+
+
+def _plan_steps(steps: Tuple[CompiledStep, ...], globals_: Dict[str, Any],
+                overridden: FrozenSet[str], outputs: Optional[Iterable[str]]):
+    """
+    Arma el plan de ejecución a partir del grafo de dependencias de los pasos
+
+    Un paso es invariante si solo lee globals no alcanzados por overrides u
+    otros pasos invariantes; se evalúa una vez y su valor pasa a `constants`.
+    Solo se adelanta si su variable se asigna una única vez y ningún paso
+    anterior la lee, así el resultado es idéntico a ejecutar los pasos en orden.
+    """
+    live_steps, dropped = _live_steps(steps, outputs)
+    assignments = Counter(step.var for step in live_steps)
+
+    scope = {key: value for key, value in globals_.items() if key not in overridden}
+    invariant = set(scope)
+    constants = {}
+    read_before = set()
+    item_steps = []
+    hoisted = []
+
+    for step in live_steps:
+        hoistable = (
+            step.reads <= invariant
+            and assignments[step.var] == 1
+            and step.var not in read_before
+        )
+        read_before |= step.reads
+
+        if hoistable:
+            constants[step.var] = scope[step.var] = _evaluate_constant_step(step, scope)
+            invariant.add(step.var)
+            hoisted.append(step.var)
+        else:
+            item_steps.append(step)
+            invariant.discard(step.var)
+
+    return constants, tuple(item_steps), tuple(hoisted), tuple(dropped)
+
+
+def ruleset_fingerprint(ruleset_config: Dict[str, Any]) -> str:
+    """Huella estable del contenido de un ruleset"""
+    payload = json.dumps(ruleset_config, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def compile_ruleset(ruleset_config: Dict[str, Any], outputs: Optional[Iterable[str]] = None,
+                    varying: Iterable[str] = ()) -> CompiledRuleset:
+    """
+    Compila la configuración JSON de un ruleset a un plan ejecutable
+
+    Args:
+        ruleset_config: Configuración del ruleset (ver RulesetConfig)
+        outputs: Variables requeridas; si se indica, se descartan los pasos que
+            no contribuyen a ellas (el breakdown queda incompleto). Por defecto
+            se conservan todos los pasos.
+        varying: Globals cuyo valor cambia por fila (ej. barrido de parámetros);
+            igual que los alcanzados por overrides, no se consideran invariantes.
+
+    Returns:
+        CompiledRuleset con todas las expresiones ya parseadas y validadas
+
+    Raises:
+        RulesetCompilationError: Si algún paso es inválido
+    """
+    steps = tuple(
+        _compile_step(step, i) for i, step in enumerate(ruleset_config.get("steps", []))
+    )
+    globals_ = ruleset_config.get("globals", {})
+    override_index = OverrideIndex(ruleset_config.get("overrides", []))
+    constants, item_steps, hoisted, dropped = _plan_steps(
+        steps, globals_, override_index.keys | frozenset(varying), outputs
+    )
+
+    return CompiledRuleset(
+        name=ruleset_config.get("name", "default"),
+        version=ruleset_config.get("version", "v1"),
+        applies_to=_readonly(ruleset_config.get("appliesTo", {})),
+        globals=_readonly(globals_),
+        steps=steps,
+        overrides=override_index.overrides,
+        override_index=override_index,
+        constants=MappingProxyType(constants),
+        config=_readonly(ruleset_config),
+        fingerprint=ruleset_fingerprint(ruleset_config),
+        item_steps=item_steps,
+        hoisted=hoisted,
+        dropped=dropped,
+    )
+
+
+def compile_sweep(ruleset_config: Dict[str, Any], parameters: Iterable[str]) -> CompiledRuleset:
+    """
+    Compila un ruleset para evaluarlo con distintos valores de algunos parámetros
+
+    Los parámetros pueden ser globals o variables asignadas por pasos `value`
+    (ej. desc_contado); estos pasos se reemplazan por globals para que el valor
+    del barrido no sea pisado. Solo se conservan los pasos que llevan a las
+    salidas (OUTPUT_VARIABLES).
+
+    Args:
+        ruleset_config: Configuración del ruleset
+        parameters: Nombres de los parámetros a barrer
+
+    Returns:
+        CompiledRuleset con los parámetros fuera de los pasos invariantes
+
+    Raises:
+        RulesetCompilationError: Si un parámetro no es un global ni un paso `value`
+    """
+    parameters = list(parameters)
+    steps = ruleset_config.get("steps", [])
+    globals_ = dict(ruleset_config.get("globals", {}))
+    value_steps = {step.get("var"): step["value"] for step in steps if "value" in step}
+
+    for name in parameters:
+        if name in globals_:
+            continue
+        if name not in value_steps:
+            raise RulesetCompilationError(f"Parámetro no barrible: {name}")
+        globals_[name] = value_steps[name]
+
+    config = dict(
+        ruleset_config,
+        globals=globals_,
+        steps=[step for step in steps if not ("value" in step and step.get("var") in parameters)],
+    )
+    return compile_ruleset(config, outputs=OUTPUT_VARIABLES, varying=parameters)
+
+
+def run_expression(compiled: CompiledExpression, variables: Dict[str, Any]) -> float:
+    """Evalúa una expresión compilada; ante error registra y retorna 0.0"""
+    try:
+        return float(eval(compiled.code, SAFE_GLOBALS, variables))
+    except Exception as e:
+        logger.error(f"Error evaluando expresión '{compiled.source}': {e}")
+        return 0.0
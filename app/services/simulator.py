@@ -4,6 +4,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from app.db.models import PriceRun, PriceItem, NormalizedItem, Ruleset
 from app.services.rules_engine import RulesEngine
+from app.services.ruleset_compiler import compile_ruleset
 from app.schemas.pricing import RunSummary
 
 logger = logging.getLogger(__name__)
@@ -43,20 +44,28 @@ class PricingSimulator:
             if not ruleset:
                 raise ValueError(f"Ruleset no encontrado: {ruleset_id}")
             
-            # Cargar el ruleset en el motor
-            if not self.rules_engine.load_ruleset(ruleset.config):
-                raise ValueError("Error cargando ruleset")
+            # Compilar el ruleset para este run: se pasa explícito al motor
+            # compartido, así runs concurrentes no se pisan el ruleset
+            compiled = compile_ruleset(ruleset.config)
             
             # Obtener items normalizados
             items = db.query(NormalizedItem).filter(NormalizedItem.list_id == list_id).all()
             if not items:
                 raise ValueError(f"No se encontraron items para la lista: {list_id}")
             
-            # Procesar cada item
-            price_items = []
-            for item in items:
-                price_item = self._process_item(item, price_run.id)
-                price_items.append(price_item)
+            # Evaluar el ruleset sobre toda la lista en un único lote (operaciones de columna)
+            items_data = [self._build_item_data(item) for item in items]
+            results = self.rules_engine.calculate_pricing_batch(items_data, compiled)
+            price_items = [
+                PriceItem(
+                    run_id=price_run.id,
+                    sku=item.sku,
+                    inputs=item_data,
+                    outputs=result.get('outputs', {}),
+                    breakdown=result.get('breakdown', {})
+                )
+                for item, item_data, result in zip(items, items_data, results)
+            ]
             
             # Guardar price items
             db.add_all(price_items)
@@ -80,19 +89,17 @@ class PricingSimulator:
                 db.commit()
             raise
     
-    def _process_item(self, item: NormalizedItem, run_id: str) -> PriceItem:
+    def _build_item_data(self, item: NormalizedItem) -> Dict[str, Any]:
         """
-        Procesa un item individual con el motor de reglas
+        Prepara los datos de entrada de un item para el motor de reglas
         
         Args:
             item: Item normalizado
-            run_id: ID del price run
             
         Returns:
-            PriceItem con los resultados
+            Diccionario con los datos del item
         """
-        # Preparar datos de entrada
-        item_data = {
+        return {
             'sku': item.sku,
             'marca': item.marca,
             'linea': item.linea,
@@ -100,24 +107,6 @@ class PricingSimulator:
             'cost': item.cost,
             **item.attrs
         }
-        
-        # Ejecutar motor de reglas
-        result = self.rules_engine.calculate_pricing(item_data)
-        
-        # Extraer outputs y breakdown
-        outputs = result.get('outputs', {})
-        breakdown = result.get('breakdown', {})
-        
-        # Crear price item
-        price_item = PriceItem(
-            run_id=run_id,
-            sku=item.sku,
-            inputs=item_data,
-            outputs=outputs,
-            breakdown=breakdown
-        )
-        
-        return price_item
     
     def _calculate_summary(self, price_items: List[PriceItem]) -> Dict[str, Any]:
         """
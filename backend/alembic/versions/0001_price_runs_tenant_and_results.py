@@ -0,0 +1,80 @@
+"""price_runs: tenant, conteo y archivo de resultados; price_items: huella de inputs
+
+Agrega a las bases creadas antes de estos cambios las columnas e índices que
+create_all no agrega a tablas existentes, y completa price_runs.tenant_id
+desde su lista. Es idempotente: en una base creada con el esquema actual (o
+sin tablas todavía, que crea la app al iniciar) no hace nada.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (tabla, columna, tipo)
+_COLUMNS = [
+    ('price_runs', 'tenant_id', sa.String()),
+    ('price_runs', 'items_count', sa.Integer()),
+    ('price_runs', 'results_file', sa.String()),
+    ('price_runs', 'breakdown_constants', sa.JSON()),
+    ('price_items', 'input_hash', sa.String(40)),
+]
+
+_INDEXES = [
+    ('idx_listraw_tenant_created', 'lists_raw', ['tenant_id', 'created_at', 'id']),
+    ('idx_pricerun_list_created', 'price_runs', ['list_id', 'created_at', 'id']),
+    ('idx_pricerun_tenant_created', 'price_runs', ['tenant_id', 'created_at', 'id']),
+    ('idx_priceitem_run_sku', 'price_items', ['run_id', 'sku', 'id']),
+    ('idx_priceitem_run_hash', 'price_items', ['run_id', 'input_hash']),
+]
+
+# Mismo nombre que le da PostgreSQL a la FK creada por create_all
+_TENANT_FK = 'price_runs_tenant_id_fkey'
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    columns = {table: {column['name'] for column in inspector.get_columns(table)} for table in tables}
+    for table, name, type_ in _COLUMNS:
+        if table not in tables or name in columns[table]:
+            continue
+        op.add_column(table, sa.Column(name, type_))
+        if (table, name) == ('price_runs', 'tenant_id') and bind.dialect.name != 'sqlite':
+            op.create_foreign_key(_TENANT_FK, 'price_runs', 'tenants', ['tenant_id'], ['id'])
+
+    for name, table, columns in _INDEXES:
+        if table not in tables:
+            continue
+        existing = {index['name']: index['column_names'] for index in inspector.get_indexes(table)}
+        if existing.get(name) == columns:
+            continue
+        if name in existing:
+            # idx_priceitem_run_sku: antes (run_id, sku), ahora con id para el cursor
+            op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns)
+
+    if {'price_runs', 'lists_raw'} <= tables:
+        op.execute(
+            "UPDATE price_runs SET tenant_id = "
+            "(SELECT lists_raw.tenant_id FROM lists_raw WHERE lists_raw.id = price_runs.list_id) "
+            "WHERE tenant_id IS NULL"
+        )
+
+
+def downgrade() -> None:
+    for name, table, _ in _INDEXES:
+        op.drop_index(name, table_name=table)
+    op.create_index('idx_priceitem_run_sku', 'price_items', ['run_id', 'sku'])
+    # Al borrar price_runs.tenant_id se borra también su FK
+    for table, name, _ in _COLUMNS:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(name)
@@ -1,29 +1,92 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.db.base import get_db
-from app.db.models import PriceRun, PriceItem, ListRaw, Ruleset, Tenant
-from app.schemas.pricing import RunResponse, RunItemResponse
-from app.schemas.common import ErrorResponse
-from typing import List
+from app.db.models import PriceRun, ListRaw, Ruleset, Tenant
+from app.services.simulator import pricing_simulator
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.schemas.pricing import (
+    RunResponse, PriceItemResponse, RunsListResponse, SimulateResponse,
+    RunDiffItem, RunDiffResponse
+)
+from app.schemas.common import ErrorResponse, StatusEnum
+from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def _run_summary(run: PriceRun) -> SimulateResponse:
+    """Run sin sus items, para los listados"""
+    return SimulateResponse(
+        id=run.id,
+        list_id=run.list_id,
+        ruleset_id=run.ruleset_id,
+        status=run.status,
+        created_at=run.created_at,
+        completed_at=run.completed_at,
+        summary=run.resumen or {}
+    )
+
+def _list_tenant_runs(db: Session, tenant_id: Optional[str], cursor: Optional[str], size: int,
+                      status: Optional[StatusEnum], desde: Optional[datetime], hasta: Optional[datetime],
+                      list_id: Optional[str] = None) -> RunsListResponse:
+    try:
+        runs, next_cursor = pricing_simulator.list_runs(
+            db, tenant_id, cursor, size,
+            status=status.value if status else None, desde=desde, hasta=hasta, list_id=list_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return RunsListResponse(items=[_run_summary(run) for run in runs], next_cursor=next_cursor)
+
+@router.get("/runs", response_model=RunsListResponse)
+async def list_runs(
+    tenant_id: str = Query(..., description="ID del tenant"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    status: Optional[StatusEnum] = Query(None, description="Filtrar por estado"),
+    desde: Optional[datetime] = Query(None, description="Creados desde esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Creados antes de esta fecha"),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista los price runs de un tenant, del más reciente al más antiguo
+    
+    - **tenant_id**: ID del tenant
+    - **cursor**: `next_cursor` de la respuesta anterior (opcional)
+    - **size**: Tamaño de página (opcional, default: 50, max: 100)
+    - **status**, **desde**, **hasta**: Filtros por estado y fecha de creación (opcionales)
+    """
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant no encontrado")
+    
+    return _list_tenant_runs(db, tenant_id, cursor, size, status, desde, hasta)
+
 @router.get("/runs/{run_id}", response_model=RunResponse)
 async def get_run_details(
     run_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente de items"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene los detalles de una ejecución de pricing
+    Obtiene los detalles de una ejecución de pricing con una página de sus items
+    
+    - **cursor**: `next_cursor` de la respuesta anterior (opcional)
+    - **size**: Tamaño de página (opcional, default: 50, max: 100)
     """
     price_run = db.query(PriceRun).filter(PriceRun.id == run_id).first()
     if not price_run:
         raise HTTPException(status_code=404, detail="Ejecución no encontrada")
     
-    # Obtener items del run
-    items = db.query(PriceItem).filter(PriceItem.run_id == run_id).all()
+    # Obtener una página de items del run
+    try:
+        items, next_cursor = pricing_simulator.get_price_items(db, run_id, cursor, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return RunResponse(
         id=price_run.id,
@@ -34,105 +97,98 @@ async def get_run_details(
         completed_at=price_run.completed_at,
         summary=price_run.resumen,
         items=[
-            RunItemResponse(
+            PriceItemResponse(
                 id=item.id,
                 sku=item.sku,
                 inputs=item.inputs,
                 outputs=item.outputs,
-                breakdown=item.breakdown,
+                breakdown=pricing_simulator.get_item_breakdown(price_run, item),
                 created_at=item.created_at
             )
             for item in items
-        ]
+        ],
+        total_items=pricing_simulator.get_items_count(db, price_run),
+        next_cursor=next_cursor
     )
 
-@router.get("/runs/tenant/{tenant_id}", response_model=List[RunResponse])
+@router.get("/runs/{run_id}/diff", response_model=RunDiffResponse)
+async def get_run_diff(
+    run_id: str,
+    base_run_id: Optional[str] = Query(None, description="Run contra el que comparar (default: el anterior de la lista)"),
+    solo_bloqueados: bool = Query(False, description="Solo SKUs bloqueados por el QA gate"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    db: Session = Depends(get_db)
+):
+    """
+    Compara los precios de una ejecución con otra, SKU por SKU
+    
+    - **base_run_id**: Run base (opcional, default: el run completado anterior de la misma lista)
+    - **solo_bloqueados**: Solo los SKUs cuyo cambio supera el umbral de QA (opcional)
+    - **cursor**: `next_cursor` de la respuesta anterior (opcional)
+    - **size**: Tamaño de página (opcional, default: 50, max: 100)
+    """
+    price_run = db.query(PriceRun).filter(PriceRun.id == run_id).first()
+    if not price_run:
+        raise HTTPException(status_code=404, detail="Ejecución no encontrada")
+    
+    try:
+        after = decode_cursor(cursor, 1)[0] if cursor else None
+        diff = pricing_simulator.diff_runs(db, run_id, base_run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows, has_more = diff.page(after, size, solo_bloqueados)
+    return RunDiffResponse(
+        run_id=run_id,
+        base_run_id=diff.base_run_id,
+        summary=diff.summary(),
+        items=[RunDiffItem(**row) for row in rows],
+        next_cursor=encode_cursor([rows[-1]['sku']]) if has_more else None
+    )
+
+@router.get("/runs/tenant/{tenant_id}", response_model=RunsListResponse)
 async def get_tenant_runs(
     tenant_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    status: Optional[StatusEnum] = Query(None, description="Filtrar por estado"),
+    desde: Optional[datetime] = Query(None, description="Creados desde esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Creados antes de esta fecha"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene todas las ejecuciones de un tenant
+    Obtiene las ejecuciones de un tenant, paginadas del más reciente al más antiguo
+    
+    Los items de cada ejecución se consultan en /runs/{run_id}.
     """
     # Validar tenant
     tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant no encontrado")
     
-    # Obtener runs del tenant
-    runs = db.query(PriceRun).join(ListRaw).filter(ListRaw.tenant_id == tenant_id).all()
-    
-    result = []
-    for run in runs:
-        # Obtener items del run
-        items = db.query(PriceItem).filter(PriceItem.run_id == run.id).all()
-        
-        result.append(RunResponse(
-            id=run.id,
-            list_id=run.list_id,
-            ruleset_id=run.ruleset_id,
-            status=run.status,
-            created_at=run.created_at,
-            completed_at=run.completed_at,
-            summary=run.resumen,
-            items=[
-                RunItemResponse(
-                    id=item.id,
-                    sku=item.sku,
-                    inputs=item.inputs,
-                    outputs=item.outputs,
-                    breakdown=item.breakdown,
-                    created_at=item.created_at
-                )
-                for item in items
-            ]
-        ))
-    
-    return result
+    return _list_tenant_runs(db, tenant_id, cursor, size, status, desde, hasta)
 
-@router.get("/runs/list/{list_id}", response_model=List[RunResponse])
+@router.get("/runs/list/{list_id}", response_model=RunsListResponse)
 async def get_list_runs(
     list_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    status: Optional[StatusEnum] = Query(None, description="Filtrar por estado"),
+    desde: Optional[datetime] = Query(None, description="Creados desde esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Creados antes de esta fecha"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene todas las ejecuciones de una lista específica
+    Obtiene las ejecuciones de una lista específica, paginadas del más reciente al más antiguo
     """
     # Validar lista
     list_raw = db.query(ListRaw).filter(ListRaw.id == list_id).first()
     if not list_raw:
         raise HTTPException(status_code=404, detail="Lista no encontrada")
     
-    # Obtener runs de la lista
-    runs = db.query(PriceRun).filter(PriceRun.list_id == list_id).all()
-    
-    result = []
-    for run in runs:
-        # Obtener items del run
-        items = db.query(PriceItem).filter(PriceItem.run_id == run.id).all()
-        
-        result.append(RunResponse(
-            id=run.id,
-            list_id=run.list_id,
-            ruleset_id=run.ruleset_id,
-            status=run.status,
-            created_at=run.created_at,
-            completed_at=run.completed_at,
-            summary=run.resumen,
-            items=[
-                RunItemResponse(
-                    id=item.id,
-                    sku=item.sku,
-                    inputs=item.inputs,
-                    outputs=item.outputs,
-                    breakdown=item.breakdown,
-                    created_at=item.created_at
-                )
-                for item in items
-            ]
-        ))
-    
-    return result
+    # Solo por list_id: los runs anteriores a PriceRun.tenant_id no lo tienen cargado
+    return _list_tenant_runs(db, None, cursor, size, status, desde, hasta, list_id=list_id)
 
 @router.delete("/runs/{run_id}")
 async def delete_run(
@@ -147,7 +203,7 @@ async def delete_run(
         raise HTTPException(status_code=404, detail="Ejecución no encontrada")
     
     # Eliminar items del run
-    db.query(PriceItem).filter(PriceItem.run_id == run_id).delete()
+    pricing_simulator.delete_results(db, price_run)
     
     # Eliminar el run
     db.delete(price_run)
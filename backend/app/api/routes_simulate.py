@@ -1,58 +1,95 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.db.base import get_db
-from app.db.models import ListRaw, Ruleset, Tenant, PriceRun, PriceItem
+from app.db.models import ListRaw, Ruleset, Tenant, PriceRun
 from app.services.simulator import pricing_simulator
-from app.schemas.pricing import SimulateRequest, SimulateResponse
-from app.schemas.common import ErrorResponse
+from app.services.jobs import simulation_jobs, SimulationQueueFull
+from app.schemas.pricing import (
+    SimulateRequest, SimulateResponse, SweepRequest, SweepResponse, SweepCombination, RunsListResponse
+)
+from app.schemas.common import ErrorResponse, StatusEnum
 from datetime import datetime
+from typing import Optional
 import uuid
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.post("/simulate", response_model=SimulateResponse)
+def _validate_simulation_target(db: Session, tenant_id: str, list_id: str, ruleset_id: str) -> Ruleset:
+    """Valida tenant, lista y ruleset activo de una simulación; retorna el ruleset"""
+    # Validar tenant
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant no encontrado")
+    
+    # Validar lista
+    list_raw = db.query(ListRaw).filter(
+        ListRaw.id == list_id,
+        ListRaw.tenant_id == tenant_id
+    ).first()
+    if not list_raw:
+        raise HTTPException(status_code=404, detail="Lista no encontrada")
+    list_status = (list_raw.list_metadata or {}).get("status")
+    if list_status in ("parsing", "failed"):
+        raise HTTPException(status_code=409, detail=f"La lista no está lista para simular (estado: {list_status})")
+    
+    # Validar ruleset
+    ruleset = db.query(Ruleset).filter(
+        Ruleset.id == ruleset_id,
+        Ruleset.tenant_id == tenant_id,
+        Ruleset.is_active == True
+    ).first()
+    if not ruleset:
+        raise HTTPException(status_code=404, detail="Ruleset no encontrado o inactivo")
+    
+    return ruleset
+
+def _simulation_response(price_run: PriceRun) -> SimulateResponse:
+    """Arma la respuesta de una simulación con su avance"""
+    progress = simulation_jobs.progress(price_run.id)
+    if progress is None and price_run.status == "completed":
+        total = (price_run.resumen or {}).get('total_items', 0)
+        progress = {'items_procesados': total, 'items_totales': total}
+    
+    return SimulateResponse(
+        id=price_run.id,
+        list_id=price_run.list_id,
+        ruleset_id=price_run.ruleset_id,
+        status=price_run.status,
+        created_at=price_run.created_at,
+        completed_at=price_run.completed_at,
+        summary=price_run.resumen or {},
+        progress=progress
+    )
+
+@router.post("/simulate", response_model=SimulateResponse, status_code=202)
 async def simulate_pricing(
     request: SimulateRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Ejecuta una simulación de pricing
+    Encola una simulación de pricing
+    
+    Retorna 202 con el run en estado `queued`; el avance se consulta con
+    GET /simulate/{run_id}.
     
     - **tenant_id**: ID del tenant
     - **list_id**: ID de la lista de precios
     - **ruleset_id**: ID del ruleset a aplicar
+    - **base_run_id**: run previo a reutilizar para los items sin cambios (opcional)
     """
     try:
-        # Validar tenant
-        tenant = db.query(Tenant).filter(Tenant.id == request.tenant_id).first()
-        if not tenant:
-            raise HTTPException(status_code=404, detail="Tenant no encontrado")
-        
-        # Validar lista
-        list_raw = db.query(ListRaw).filter(
-            ListRaw.id == request.list_id,
-            ListRaw.tenant_id == request.tenant_id
-        ).first()
-        if not list_raw:
-            raise HTTPException(status_code=404, detail="Lista no encontrada")
-        
-        # Validar ruleset
-        ruleset = db.query(Ruleset).filter(
-            Ruleset.id == request.ruleset_id,
-            Ruleset.tenant_id == request.tenant_id,
-            Ruleset.is_active == True
-        ).first()
-        if not ruleset:
-            raise HTTPException(status_code=404, detail="Ruleset no encontrado o inactivo")
+        _validate_simulation_target(db, request.tenant_id, request.list_id, request.ruleset_id)
         
         # Crear price run
         price_run = PriceRun(
             id=str(uuid.uuid4()),
+            tenant_id=request.tenant_id,
             list_id=request.list_id,
             ruleset_id=request.ruleset_id,
-            status="running",
+            status="queued",
             resumen={},
             created_at=datetime.utcnow()
         )
@@ -60,82 +97,63 @@ async def simulate_pricing(
         db.commit()
         db.refresh(price_run)
         
-        # Simular cálculo de precios (demo)
         try:
-            # Obtener items normalizados
-            from app.db.models import NormalizedItem
-            items = db.query(NormalizedItem).filter(NormalizedItem.list_id == request.list_id).all()
-            
-            # Aplicar reglas de pricing
-            for item in items:
-                # Calcular markup según línea
-                markup = ruleset.config.get("markup_base", 0.25)
-                if item.linea == "Automotriz":
-                    markup = ruleset.config.get("markup_automotriz", 0.30)
-                elif item.linea == "Industrial":
-                    markup = ruleset.config.get("markup_industrial", 0.35)
-                
-                # Calcular precio final
-                precio_final = item.cost * (1 + markup)
-                
-                # Crear price item
-                price_item = PriceItem(
-                    id=str(uuid.uuid4()),
-                    run_id=price_run.id,
-                    sku=item.sku,
-                    inputs={
-                        "base_price": item.base_price,
-                        "cost": item.cost,
-                        "linea": item.linea,
-                        "marca": item.marca
-                    },
-                    outputs={
-                        "final_price": round(precio_final, 2),
-                        "markup_applied": markup,
-                        "profit_margin": round((precio_final - item.cost) / precio_final, 4)
-                    },
-                    breakdown={
-                        "cost": item.cost,
-                        "markup": markup,
-                        "markup_amount": round(item.cost * markup, 2),
-                        "final_price": round(precio_final, 2)
-                    }
-                )
-                db.add(price_item)
-            
-            # Actualizar resumen
-            price_run.resumen = {
-                "total_items": len(items),
-                "total_cost": sum(item.cost for item in items),
-                "total_revenue": sum(item.cost * (1 + ruleset.config.get("markup_base", 0.25)) for item in items),
-                "average_markup": ruleset.config.get("markup_base", 0.25),
-                "status": "completed"
-            }
-            price_run.status = "completed"
-            price_run.completed_at = datetime.utcnow()
-            
-        except Exception as e:
+            simulation_jobs.submit(
+                price_run.id, request.tenant_id, request.list_id, request.ruleset_id,
+                base_run_id=request.base_run_id
+            )
+        except SimulationQueueFull as e:
             price_run.status = "failed"
             price_run.resumen = {"error": str(e)}
-            logger.error(f"Error en simulación: {e}")
+            db.commit()
+            raise HTTPException(status_code=503, detail="Cola de simulaciones llena, reintentar más tarde")
         
-        db.commit()
-        logger.info(f"Simulación completada: {price_run.id} - Status: {price_run.status}")
+        logger.info(f"Simulación encolada: {price_run.id}")
+        db.refresh(price_run)
+        return _simulation_response(price_run)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en simulación: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@router.post("/simulate/sweep", response_model=SweepResponse)
+async def simulate_sweep(
+    request: SweepRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Evalúa una grilla de parámetros (what-if) sobre una lista sin guardar resultados
+    
+    - **grid**: valores a probar por parámetro, ej. {"IVA": [0.21, 0.27], "L": [0.05, 0.08]}
+    - **umbral_rentabilidad**: se cuentan los SKUs con rentabilidad por debajo
+    """
+    try:
+        _validate_simulation_target(db, request.tenant_id, request.list_id, request.ruleset_id)
         
-        return SimulateResponse(
-            id=price_run.id,
-            list_id=price_run.list_id,
-            ruleset_id=price_run.ruleset_id,
-            status=price_run.status,
-            created_at=price_run.created_at,
-            completed_at=price_run.completed_at,
-            summary=price_run.resumen
+        # Evaluación intensiva en CPU: fuera del event loop
+        results = await run_in_threadpool(
+            pricing_simulator.run_sweep, db, request.tenant_id, request.list_id, request.ruleset_id,
+            request.grid, request.umbral_rentabilidad
+        )
+        
+        return SweepResponse(
+            list_id=request.list_id,
+            ruleset_id=request.ruleset_id,
+            total_combinations=len(results),
+            combinations=[
+                SweepCombination(globals=result['globals'], summary=result['resumen'])
+                for result in results
+            ]
         )
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error en simulación: {e}")
+        logger.error(f"Error en barrido de parámetros: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @router.get("/simulate/{run_id}", response_model=SimulateResponse)
@@ -144,29 +162,30 @@ async def get_simulation_status(
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene el estado de una simulación
+    Obtiene el estado de una simulación y su avance (items procesados / totales)
     """
     price_run = db.query(PriceRun).filter(PriceRun.id == run_id).first()
     if not price_run:
         raise HTTPException(status_code=404, detail="Simulación no encontrada")
     
-    return SimulateResponse(
-        id=price_run.id,
-        list_id=price_run.list_id,
-        ruleset_id=price_run.ruleset_id,
-        status=price_run.status,
-        created_at=price_run.created_at,
-        completed_at=price_run.completed_at,
-        summary=price_run.resumen
-    )
+    return _simulation_response(price_run)
 
-@router.get("/simulate/tenant/{tenant_id}", response_model=list[SimulateResponse])
+@router.get("/simulate/tenant/{tenant_id}", response_model=RunsListResponse)
 async def get_tenant_simulations(
     tenant_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    status: Optional[StatusEnum] = Query(None, description="Filtrar por estado"),
+    desde: Optional[datetime] = Query(None, description="Creadas desde esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Creadas antes de esta fecha"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene todas las simulaciones de un tenant
+    Obtiene las simulaciones de un tenant, paginadas de la más reciente a la más antigua
+    
+    - **cursor**: `next_cursor` de la respuesta anterior (opcional)
+    - **size**: Tamaño de página (opcional, default: 50, max: 100)
+    - **status**, **desde**, **hasta**: Filtros por estado y fecha de creación (opcionales)
     """
     # Validar tenant
     tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
@@ -174,17 +193,15 @@ async def get_tenant_simulations(
         raise HTTPException(status_code=404, detail="Tenant no encontrado")
     
     # Obtener simulaciones del tenant
-    simulations = db.query(PriceRun).join(ListRaw).filter(ListRaw.tenant_id == tenant_id).all()
-    
-    return [
-        SimulateResponse(
-            id=sim.id,
-            list_id=sim.list_id,
-            ruleset_id=sim.ruleset_id,
-            status=sim.status,
-            created_at=sim.created_at,
-            completed_at=sim.completed_at,
-            summary=sim.resumen
+    try:
+        simulations, next_cursor = pricing_simulator.list_runs(
+            db, tenant_id, cursor, size,
+            status=status.value if status else None, desde=desde, hasta=hasta
         )
-        for sim in simulations
-    ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return RunsListResponse(
+        items=[_simulation_response(sim) for sim in simulations],
+        next_cursor=next_cursor
+    )
@@ -1,26 +1,54 @@
 import os
-import tempfile
 import logging
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
 from app.db.base import get_db
 from app.db.models import ListRaw, Tenant
-from app.services.storage import storage_service
-from app.services.parser import excel_parser
-from app.schemas.pricing import UploadResponse
+from app.core.config import settings
+from app.services.storage import storage_service, FileTooLarge
+from app.services.jobs import parse_jobs, ParseQueueFull
+from app.schemas.pricing import UploadResponse, UploadsListResponse
+from app.utils.pagination import paginate_newest_first
 from app.schemas.common import ErrorResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.post("/upload", response_model=UploadResponse)
-async def upload_excel(
+def _upload_response(list_raw: ListRaw) -> UploadResponse:
+    """Respuesta de una lista subida con su estado y avance del parseo"""
+    metadata = list_raw.list_metadata or {}
+    status = metadata.get("status", "ready")
+    count = metadata.get("normalized_items_count", 0)
+    progress = parse_jobs.progress(list_raw.id)
+    if progress is None and status == "ready":
+        progress = {'etapa': 'completado', 'filas_procesadas': count, 'filas_totales': count}
+    
+    return UploadResponse(
+        id=list_raw.id,
+        filename=list_raw.filename,
+        storage_url=list_raw.storage_url,
+        status=status,
+        normalized_items_count=count,
+        metadata=metadata,
+        progress=progress
+    )
+
+@router.post("/upload", response_model=UploadResponse, status_code=202)
+def upload_excel(
     file: UploadFile = File(..., description="Archivo Excel a subir"),
     tenant_id: str = Form(..., description="ID del tenant"),
     db: Session = Depends(get_db)
 ):
     """
-    Sube un archivo Excel y normaliza los datos
+    Sube un archivo Excel y encola su parseo
+    
+    Retorna 202 con la lista en estado `parsing`; el avance y el estado final
+    (`ready` o `failed`) se consultan con GET /upload/{list_id}.
+    
+    Es una función síncrona: FastAPI la corre en el threadpool, así copiar el
+    archivo al volumen y las consultas a la DB no bloquean el event loop.
     
     - **file**: Archivo Excel (.xlsx, .xls)
     - **tenant_id**: ID del tenant propietario
@@ -38,78 +66,50 @@ async def upload_excel(
                 detail="Solo se permiten archivos Excel (.xlsx, .xls)"
             )
         
-        # Validar tamaño de archivo
-        file_size = 0
-        file_content = b""
-        for chunk in file.file:
-            file_size += len(chunk)
-            file_content += chunk
-            if file_size > 50 * 1024 * 1024:  # 50MB
-                raise HTTPException(
-                    status_code=413, 
-                    detail="Archivo demasiado grande (máximo 50MB)"
-                )
-        
-        # Crear archivo temporal
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
+        # Guardar en el volumen en una sola pasada (tamaño máximo y hash mientras se escribe)
+        max_size = settings.get_max_file_size()
         try:
-            # Subir archivo a S3
-            file.file.seek(0)  # Resetear posición del archivo
-            storage_url = storage_service.upload_file(
-                file_data=file.file,
-                filename=file.filename,
-                content_type=file.content_type or "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            
-            # Crear registro en DB
-            list_raw = ListRaw(
-                tenant_id=tenant_id,
-                filename=file.filename,
-                storage_url=storage_url,
-                list_metadata={
-                    "file_size": file_size,
-                    "content_type": file.content_type,
-                    "original_filename": file.filename
-                }
+            stored = storage_service.store_stream(
+                file.file,
+                directory=f"lists/{tenant_id}",
+                suffix=os.path.splitext(file.filename)[1].lower(),
+                max_size=max_size
             )
-            db.add(list_raw)
-            db.commit()
-            db.refresh(list_raw)
-            
-            # Parsear Excel y normalizar datos
-            normalized_items = excel_parser.parse_excel_file(
-                temp_file_path, 
-                tenant_id, 
-                list_raw.id
+        except FileTooLarge:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archivo demasiado grande (máximo {max_size // (1024 * 1024)}MB)"
             )
-            
-            # Guardar items normalizados
-            excel_parser.save_items_to_db(normalized_items)
-            
-            # Actualizar metadata con conteo de items
-            list_raw.list_metadata["normalized_items_count"] = len(normalized_items)
+        
+        # Crear registro en DB
+        list_raw = ListRaw(
+            tenant_id=tenant_id,
+            filename=file.filename,
+            storage_url=stored.path,
+            list_metadata={
+                "file_size": stored.size,
+                "sha256": stored.sha256,
+                "content_type": file.content_type,
+                "original_filename": file.filename,
+                "status": "parsing"
+            }
+        )
+        db.add(list_raw)
+        db.commit()
+        db.refresh(list_raw)
+        
+        # Parsear y normalizar en segundo plano (o tomar los items de la caché por hash)
+        try:
+            parse_jobs.submit(list_raw.id, tenant_id, stored.path, content_hash=stored.sha256)
+        except ParseQueueFull as e:
+            list_raw.list_metadata = {**list_raw.list_metadata, "status": "failed", "error": str(e)}
             db.commit()
-            
-            logger.info(f"Archivo subido exitosamente: {file.filename} - {len(normalized_items)} items")
-            
-            return UploadResponse(
-                id=list_raw.id,
-                filename=list_raw.filename,
-                storage_url=storage_url,
-                normalized_items_count=len(normalized_items),
-                metadata=list_raw.list_metadata
-            )
-            
-        finally:
-            # Limpiar archivo temporal
-            try:
-                os.unlink(temp_file_path)
-            except OSError:
-                pass
-                
+            raise HTTPException(status_code=503, detail="Cola de parseo llena, reintentar más tarde")
+        
+        logger.info(f"Archivo subido: {file.filename} - parseo encolado ({list_raw.id})")
+        db.refresh(list_raw)
+        return _upload_response(list_raw)
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -128,36 +128,41 @@ async def get_upload_status(
     if not list_raw:
         raise HTTPException(status_code=404, detail="Lista no encontrada")
     
-    return UploadResponse(
-        id=list_raw.id,
-        filename=list_raw.filename,
-        storage_url=list_raw.storage_url,
-        normalized_items_count=list_raw.list_metadata.get("normalized_items_count", 0),
-        metadata=list_raw.list_metadata
-    )
+    return _upload_response(list_raw)
 
-@router.get("/upload/tenant/{tenant_id}", response_model=list[UploadResponse])
+@router.get("/upload/tenant/{tenant_id}", response_model=UploadsListResponse)
 async def get_tenant_uploads(
     tenant_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    size: int = Query(50, ge=1, le=100, description="Tamaño de página"),
+    desde: Optional[datetime] = Query(None, description="Subidas desde esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Subidas antes de esta fecha"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtiene todas las listas de un tenant
+    Obtiene las listas de un tenant, paginadas de la más reciente a la más antigua
+    
+    - **cursor**: `next_cursor` de la respuesta anterior (opcional)
+    - **size**: Tamaño de página (opcional, default: 50, max: 100)
+    - **desde**, **hasta**: Filtros por fecha de subida (opcionales)
     """
     # Validar tenant
     tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant no encontrado")
     
-    lists = db.query(ListRaw).filter(ListRaw.tenant_id == tenant_id).all()
+    query = db.query(ListRaw).filter(ListRaw.tenant_id == tenant_id)
+    if desde:
+        query = query.filter(ListRaw.created_at >= desde)
+    if hasta:
+        query = query.filter(ListRaw.created_at < hasta)
     
-    return [
-        UploadResponse(
-            id=list_raw.id,
-            filename=list_raw.filename,
-            storage_url=list_raw.storage_url,
-            normalized_items_count=list_raw.list_metadata.get("normalized_items_count", 0),
-            metadata=list_raw.list_metadata
-        )
-        for list_raw in lists
-    ]
+    try:
+        lists, next_cursor = paginate_newest_first(query, ListRaw.created_at, ListRaw.id, cursor, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return UploadsListResponse(
+        items=[_upload_response(list_raw) for list_raw in lists],
+        next_cursor=next_cursor
+    )
@@ -10,6 +10,10 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SQLite en archivo para la demo: cada sesión (request o job) usa su propia
+# conexión y transacción; en memoria habría una única conexión compartida
+DEMO_DATABASE_URL = "sqlite:///./acubat_demo.db"
+
 class Settings(BaseSettings):
     # Aplicación
     APP_NAME: str = "AcuBat Pricing Platform"
@@ -17,7 +21,18 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     
     # Base de datos - TEMPORALMENTE SQLite para demo
-    DATABASE_URL: str = "sqlite:///:memory:"
+    DATABASE_URL: str = DEMO_DATABASE_URL
+    
+    # Pool de conexiones (PostgreSQL y SQLite en archivo)
+    DB_POOL_SIZE: str = "5"  # Conexiones mantenidas abiertas
+    DB_MAX_OVERFLOW: str = "10"  # Conexiones extra en picos
+    DB_POOL_TIMEOUT: str = "30"  # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: str = "300"  # Segundos antes de reciclar una conexión
+    
+    # SQLite en archivo (despliegues de un solo nodo)
+    SQLITE_CACHE_SIZE_MB: str = "64"  # Cache de páginas por conexión
+    SQLITE_MMAP_SIZE_MB: str = "256"  # Lectura por memory-mapping
+    SQLITE_BUSY_TIMEOUT_MS: str = "15000"  # Espera por el lock de escritura
     
     # Seguridad
     SECRET_KEY: str = "your-secret-key-here"
@@ -48,6 +63,8 @@ class Settings(BaseSettings):
     # Límites
     MAX_FILE_SIZE: str = "52428800"  # 50MB en bytes
     MAX_UPLOAD_FILES: str = "10"
+    EXCEL_READER: str = "auto"  # auto, calamine, openpyxl (read_only) o pandas
+    PARSE_CACHE_MAX_ENTRIES: str = "200"  # Listas parseadas guardadas por hash de contenido (0 = sin caché)
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -60,6 +77,24 @@ class Settings(BaseSettings):
     QA_SKU_THRESHOLD: str = "0.15"
     AUTO_PUBLISH: str = "False"
     
+    # Motor de reglas
+    RULESET_CACHE_SIZE: str = "64"  # Rulesets compilados en cache por proceso
+    
+    # Simulación en paralelo (listas grandes)
+    SIMULATION_WORKERS: str = "1"  # Procesos por simulación grande (1 = sin pool, 0 = uno por CPU)
+    SIMULATION_SHARD_SIZE: str = "25000"  # Items por shard
+    SIMULATION_PARALLEL_THRESHOLD: str = "100000"  # Items a partir de los cuales se paraleliza
+    PRICE_ITEM_CHUNK_SIZE: str = "5000"  # Filas de resultados por escritura masiva
+    RESULTS_STORAGE: str = "database"  # database = tabla price_items, parquet = un archivo columnar por run
+    SIMULATION_JOB_WORKERS: str = "2"  # Simulaciones ejecutándose a la vez
+    SIMULATION_MAX_PENDING_JOBS: str = "50"  # Simulaciones encoladas o en curso como máximo
+    PARSE_JOB_WORKERS: str = "2"  # Listas parseándose a la vez
+    PARSE_MAX_PENDING_JOBS: str = "20"  # Listas encoladas o parseándose como máximo
+    
+    # Barrido de parámetros (what-if)
+    SWEEP_MAX_COMBINATIONS: str = "500"  # Combinaciones máximas por barrido
+    SWEEP_CHUNK_CELLS: str = "2000000"  # Celdas items x combinaciones por pasada vectorizada
+    
     # Puerto
     PORT: str = os.getenv("PORT", "8000")
     
@@ -85,6 +120,61 @@ class Settings(BaseSettings):
             logger.warning(f"Puerto '{self.PORT}' no es numérico, usando 8000")
             return 8000
     
+    def get_db_pool_size(self) -> int:
+        try:
+            size = int(self.DB_POOL_SIZE)
+            return size if size > 0 else 5
+        except (ValueError, TypeError):
+            logger.warning(f"DB_POOL_SIZE '{self.DB_POOL_SIZE}' no es numérico, usando 5")
+            return 5
+    
+    def get_db_max_overflow(self) -> int:
+        try:
+            overflow = int(self.DB_MAX_OVERFLOW)
+            return overflow if overflow >= 0 else 10
+        except (ValueError, TypeError):
+            logger.warning(f"DB_MAX_OVERFLOW '{self.DB_MAX_OVERFLOW}' no es numérico, usando 10")
+            return 10
+    
+    def get_db_pool_timeout(self) -> float:
+        try:
+            timeout = float(self.DB_POOL_TIMEOUT)
+            return timeout if timeout > 0 else 30.0
+        except (ValueError, TypeError):
+            logger.warning(f"DB_POOL_TIMEOUT '{self.DB_POOL_TIMEOUT}' no es numérico, usando 30")
+            return 30.0
+    
+    def get_db_pool_recycle(self) -> int:
+        try:
+            return int(self.DB_POOL_RECYCLE)
+        except (ValueError, TypeError):
+            logger.warning(f"DB_POOL_RECYCLE '{self.DB_POOL_RECYCLE}' no es numérico, usando 300")
+            return 300
+    
+    def get_sqlite_cache_size_mb(self) -> int:
+        try:
+            size = int(self.SQLITE_CACHE_SIZE_MB)
+            return size if size > 0 else 64
+        except (ValueError, TypeError):
+            logger.warning(f"SQLITE_CACHE_SIZE_MB '{self.SQLITE_CACHE_SIZE_MB}' no es numérico, usando 64")
+            return 64
+    
+    def get_sqlite_mmap_size_mb(self) -> int:
+        try:
+            size = int(self.SQLITE_MMAP_SIZE_MB)
+            return size if size >= 0 else 256
+        except (ValueError, TypeError):
+            logger.warning(f"SQLITE_MMAP_SIZE_MB '{self.SQLITE_MMAP_SIZE_MB}' no es numérico, usando 256")
+            return 256
+    
+    def get_sqlite_busy_timeout_ms(self) -> int:
+        try:
+            timeout = int(self.SQLITE_BUSY_TIMEOUT_MS)
+            return timeout if timeout >= 0 else 15000
+        except (ValueError, TypeError):
+            logger.warning(f"SQLITE_BUSY_TIMEOUT_MS '{self.SQLITE_BUSY_TIMEOUT_MS}' no es numérico, usando 15000")
+            return 15000
+    
     def get_max_file_size(self) -> int:
         try:
             return int(self.MAX_FILE_SIZE)
@@ -92,6 +182,21 @@ class Settings(BaseSettings):
             logger.warning(f"MAX_FILE_SIZE '{self.MAX_FILE_SIZE}' no es numérico, usando 50MB")
             return 50 * 1024 * 1024
     
+    def get_excel_reader(self) -> str:
+        reader = (self.EXCEL_READER or "").strip().lower()
+        if reader in ("auto", "calamine", "openpyxl", "pandas"):
+            return reader
+        logger.warning(f"EXCEL_READER '{self.EXCEL_READER}' no es válido, usando auto")
+        return "auto"
+    
+    def get_parse_cache_max_entries(self) -> int:
+        try:
+            entries = int(self.PARSE_CACHE_MAX_ENTRIES)
+            return entries if entries >= 0 else 200
+        except (ValueError, TypeError):
+            logger.warning(f"PARSE_CACHE_MAX_ENTRIES '{self.PARSE_CACHE_MAX_ENTRIES}' no es numérico, usando 200")
+            return 200
+    
     def get_max_upload_files(self) -> int:
         try:
             return int(self.MAX_UPLOAD_FILES)
@@ -120,6 +225,100 @@ class Settings(BaseSettings):
             logger.warning(f"QA_SKU_THRESHOLD '{self.QA_SKU_THRESHOLD}' no es numérico, usando 0.15")
             return 0.15
     
+    def get_ruleset_cache_size(self) -> int:
+        try:
+            size = int(self.RULESET_CACHE_SIZE)
+            return size if size > 0 else 64
+        except (ValueError, TypeError):
+            logger.warning(f"RULESET_CACHE_SIZE '{self.RULESET_CACHE_SIZE}' no es numérico, usando 64")
+            return 64
+    
+    def get_simulation_workers(self) -> int:
+        try:
+            workers = int(self.SIMULATION_WORKERS)
+        except (ValueError, TypeError):
+            logger.warning(f"SIMULATION_WORKERS '{self.SIMULATION_WORKERS}' no es numérico, usando 1")
+            workers = 1
+        return workers if workers > 0 else (os.cpu_count() or 1)
+    
+    def get_simulation_shard_size(self) -> int:
+        try:
+            size = int(self.SIMULATION_SHARD_SIZE)
+            return size if size > 0 else 25000
+        except (ValueError, TypeError):
+            logger.warning(f"SIMULATION_SHARD_SIZE '{self.SIMULATION_SHARD_SIZE}' no es numérico, usando 25000")
+            return 25000
+    
+    def get_simulation_parallel_threshold(self) -> int:
+        try:
+            return int(self.SIMULATION_PARALLEL_THRESHOLD)
+        except (ValueError, TypeError):
+            logger.warning(f"SIMULATION_PARALLEL_THRESHOLD '{self.SIMULATION_PARALLEL_THRESHOLD}' no es numérico, usando 100000")
+            return 100000
+    
+    def get_price_item_chunk_size(self) -> int:
+        try:
+            size = int(self.PRICE_ITEM_CHUNK_SIZE)
+            return size if size > 0 else 5000
+        except (ValueError, TypeError):
+            logger.warning(f"PRICE_ITEM_CHUNK_SIZE '{self.PRICE_ITEM_CHUNK_SIZE}' no es numérico, usando 5000")
+            return 5000
+    
+    def get_results_storage(self) -> str:
+        storage = (self.RESULTS_STORAGE or "").strip().lower()
+        if storage in ("database", "parquet"):
+            return storage
+        logger.warning(f"RESULTS_STORAGE '{self.RESULTS_STORAGE}' no es válido, usando database")
+        return "database"
+    
+    def get_simulation_job_workers(self) -> int:
+        try:
+            workers = int(self.SIMULATION_JOB_WORKERS)
+            return workers if workers > 0 else 2
+        except (ValueError, TypeError):
+            logger.warning(f"SIMULATION_JOB_WORKERS '{self.SIMULATION_JOB_WORKERS}' no es numérico, usando 2")
+            return 2
+    
+    def get_simulation_max_pending_jobs(self) -> int:
+        try:
+            limit = int(self.SIMULATION_MAX_PENDING_JOBS)
+            return limit if limit > 0 else 50
+        except (ValueError, TypeError):
+            logger.warning(f"SIMULATION_MAX_PENDING_JOBS '{self.SIMULATION_MAX_PENDING_JOBS}' no es numérico, usando 50")
+            return 50
+    
+    def get_parse_job_workers(self) -> int:
+        try:
+            workers = int(self.PARSE_JOB_WORKERS)
+            return workers if workers > 0 else 2
+        except (ValueError, TypeError):
+            logger.warning(f"PARSE_JOB_WORKERS '{self.PARSE_JOB_WORKERS}' no es numérico, usando 2")
+            return 2
+    
+    def get_parse_max_pending_jobs(self) -> int:
+        try:
+            limit = int(self.PARSE_MAX_PENDING_JOBS)
+            return limit if limit > 0 else 20
+        except (ValueError, TypeError):
+            logger.warning(f"PARSE_MAX_PENDING_JOBS '{self.PARSE_MAX_PENDING_JOBS}' no es numérico, usando 20")
+            return 20
+    
+    def get_sweep_max_combinations(self) -> int:
+        try:
+            limit = int(self.SWEEP_MAX_COMBINATIONS)
+            return limit if limit > 0 else 500
+        except (ValueError, TypeError):
+            logger.warning(f"SWEEP_MAX_COMBINATIONS '{self.SWEEP_MAX_COMBINATIONS}' no es numérico, usando 500")
+            return 500
+    
+    def get_sweep_chunk_cells(self) -> int:
+        try:
+            cells = int(self.SWEEP_CHUNK_CELLS)
+            return cells if cells > 0 else 2000000
+        except (ValueError, TypeError):
+            logger.warning(f"SWEEP_CHUNK_CELLS '{self.SWEEP_CHUNK_CELLS}' no es numérico, usando 2000000")
+            return 2000000
+    
     def get_auto_publish(self) -> bool:
         try:
             return self.AUTO_PUBLISH.lower() in ('true', '1', 'yes', 'on')
@@ -150,10 +349,10 @@ class Settings(BaseSettings):
         Prioridad: DATABASE_URL > POSTGRES_URL > DATABASE_URL_WITH_SSL.
         Ignora DB_PORT si no es numérica (solo log informativo).
         """
-        # PARA DEMO: Usar SQLite en memoria
-        if os.getenv('DEMO_MODE') == 'true' or os.getenv('DATABASE_URL', '').startswith('sqlite'):
-            self.DATABASE_URL = "sqlite:///:memory:"
-            logger.info("MODO DEMO: Usando SQLite en memoria")
+        # PARA DEMO: Usar SQLite en archivo
+        if os.getenv('DEMO_MODE') == 'true':
+            self.DATABASE_URL = DEMO_DATABASE_URL
+            logger.info("MODO DEMO: Usando SQLite en archivo")
             return
             
         # Ignorar DB_PORT no numérica (solo informativo; no se usa para construir)
@@ -174,8 +373,8 @@ class Settings(BaseSettings):
                 self.DATABASE_URL = ssl_url
             # si nada presente, mantiene el valor existente (default o .env)
 
-        # Enforce sslmode=require si no está presente
-        if self.DATABASE_URL:
+        # Enforce sslmode=require si no está presente (SQLite, en memoria o en archivo, no usa SSL)
+        if self.DATABASE_URL and not self.DATABASE_URL.startswith('sqlite'):
             lower = self.DATABASE_URL.lower()
             if 'sslmode=' not in lower:
                 sep = '&' if '?' in self.DATABASE_URL else '?'
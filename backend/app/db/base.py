@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.url import URL, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
 import logging
+import threading
 import time
-from sqlalchemy.exc import OperationalError
+from typing import Any, Dict
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +15,107 @@ logger = logging.getLogger(__name__)
 # Evitamos reparsear/reformatear para no romper el percent-encoding de la contraseña.
 database_url = settings.DATABASE_URL
 
+
+def is_memory_sqlite(url: Any = None) -> bool:
+    """True si la URL (por defecto la configurada) es SQLite en memoria"""
+    url = make_url(url if url is not None else database_url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _engine_options(url: URL) -> Dict[str, Any]:
+    """Opciones de create_engine según el motor"""
+    if url.get_backend_name() == "sqlite":
+        options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+        if is_memory_sqlite(url):
+            # Una única conexión compartida: todos los threads ven la misma base
+            # y la misma transacción, así que solo sirve para tests
+            logger.warning("SQLite en memoria: una única conexión compartida, usar solo en tests")
+            options["poolclass"] = StaticPool
+            return options
+    else:
+        options = {"pool_pre_ping": True}
+
+    options.update(
+        pool_size=settings.get_db_pool_size(),
+        max_overflow=settings.get_db_max_overflow(),
+        pool_timeout=settings.get_db_pool_timeout(),
+        pool_recycle=settings.get_db_pool_recycle(),
+    )
+    return options
+
+
+def _configure_sqlite_file(dbapi_connection, connection_record) -> None:
+    """PRAGMAs de cada conexión a SQLite en archivo (un solo nodo)
+
+    WAL permite leer mientras se escribe; con synchronous=NORMAL solo se
+    sincroniza al hacer checkpoint, sin riesgo de corrupción en WAL.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.get_sqlite_busy_timeout_ms()}")
+        # cache_size negativo = KiB
+        cursor.execute(f"PRAGMA cache_size=-{settings.get_sqlite_cache_size_mb() * 1024}")
+        cursor.execute(f"PRAGMA mmap_size={settings.get_sqlite_mmap_size_mb() * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+class PoolMetrics:
+    """Contadores del pool de conexiones, alimentados por sus eventos"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connections_created = 0
+        self.checkouts = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connections_created += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado actual del pool y contadores acumulados"""
+        pool = self.engine.pool
+        with self._lock:
+            metrics = {
+                "pool": type(pool).__name__,
+                "conexiones_creadas": self.connections_created,
+                "checkouts": self.checkouts,
+                "invalidadas": self.invalidated,
+            }
+        # Solo los pools con límite (QueuePool) informan ocupación
+        for name, attr in (("tamano", "size"), ("en_uso", "checkedout"),
+                           ("libres", "checkedin"), ("overflow", "overflow")):
+            method = getattr(pool, attr, None)
+            if callable(method):
+                metrics[name] = method()
+        if hasattr(pool, "timeout"):
+            metrics["timeout"] = pool.timeout()
+        return metrics
+
+
 # Crear engine de SQLAlchemy
-engine = create_engine(
-    database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    # Para SQLite en memoria
-    connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
-)
+engine = create_engine(database_url, **_engine_options(make_url(database_url)))
+if engine.url.get_backend_name() == "sqlite" and not is_memory_sqlite(engine.url):
+    event.listen(engine, "connect", _configure_sqlite_file)
+
+pool_metrics = PoolMetrics(engine)
 
 # Crear sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -42,9 +138,9 @@ def wait_for_db_connectivity(max_attempts: int = 30, delay_seconds: float = 2.0)
     Esto evita fallos al inicio cuando el contenedor del backend arranca antes
     de que PostgreSQL esté listo.
     """
-    # Para SQLite en memoria, no necesitamos esperar
+    # Para SQLite (local), no necesitamos esperar
     if "sqlite" in database_url:
-        logger.info("SQLite en memoria detectado - saltando verificación de conectividad")
+        logger.info("SQLite detectado - saltando verificación de conectividad")
         return
         
     last_error: Exception | None = None
@@ -72,13 +168,17 @@ def wait_for_db_connectivity(max_attempts: int = 30, delay_seconds: float = 2.0)
 def create_demo_data():
     """Crea datos de ejemplo para la demo"""
     from app.db.models import Tenant, Product, Ruleset, ListRaw, NormalizedItem
-    from datetime import datetime
     import uuid
     
     logger.info("Creando datos de ejemplo para la demo...")
     
     db = SessionLocal()
     try:
+        # La base de la demo persiste entre reinicios: los datos se crean una vez
+        if db.query(Tenant).filter(Tenant.id == "demo-tenant-001").first():
+            logger.info("Datos de ejemplo ya presentes")
+            return
+        
         # Crear tenant de demo
         demo_tenant = Tenant(
             id="demo-tenant-001",
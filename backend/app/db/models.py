@@ -62,6 +62,11 @@ class ListRaw(Base):
     tenant = relationship("Tenant", back_populates="lists_raw")
     normalized_items = relationship("NormalizedItem", back_populates="list_raw")
     price_runs = relationship("PriceRun", back_populates="list_raw")
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_listraw_tenant_created', 'tenant_id', 'created_at', 'id'),
+    )
 
 class NormalizedItem(Base):
     __tablename__ = "normalized_items"
@@ -109,10 +114,15 @@ class PriceRun(Base):
     __tablename__ = "price_runs"
     
     id = Column(String, primary_key=True, default=generate_uuid)
+    # Copia de lists_raw.tenant_id: listados por tenant sin join
+    tenant_id = Column(String, ForeignKey("tenants.id"))
     list_id = Column(String, ForeignKey("lists_raw.id"), nullable=False)
     ruleset_id = Column(String, ForeignKey("rulesets.id"), nullable=False)
     resumen = Column(JSON, default={})
-    status = Column(String(20), default="running")  # running, completed, failed
+    status = Column(String(20), default="running")  # queued, running, completed, failed
+    items_count = Column(Integer)  # Cantidad de price items, guardada al completar
+    results_file = Column(String)  # Archivo columnar con los resultados (None = tabla price_items)
+    breakdown_constants = Column(JSON)  # Valores del breakdown comunes a todos los items del run
     created_at = Column(DateTime, default=func.now())
     completed_at = Column(DateTime)
     
@@ -121,6 +131,12 @@ class PriceRun(Base):
     ruleset = relationship("Ruleset", back_populates="price_runs")
     price_items = relationship("PriceItem", back_populates="price_run")
     publishes = relationship("Publish", back_populates="price_run")
+    
+    # Índices
+    __table_args__ = (
+        Index('idx_pricerun_list_created', 'list_id', 'created_at', 'id'),
+        Index('idx_pricerun_tenant_created', 'tenant_id', 'created_at', 'id'),
+    )
 
 class PriceItem(Base):
     __tablename__ = "price_items"
@@ -131,6 +147,7 @@ class PriceItem(Base):
     inputs = Column(JSON, default={})
     outputs = Column(JSON, default={})
     breakdown = Column(JSON, default={})
+    input_hash = Column(String(40))  # Huella de inputs + ruleset para re-simulación incremental
     created_at = Column(DateTime, default=func.now())
     
     # Relaciones
@@ -138,7 +155,8 @@ class PriceItem(Base):
     
     # Índices
     __table_args__ = (
-        Index('idx_priceitem_run_sku', 'run_id', 'sku'),
+        Index('idx_priceitem_run_sku', 'run_id', 'sku', 'id'),
+        Index('idx_priceitem_run_hash', 'run_id', 'input_hash'),
     )
 
 class Publish(Base):
@@ -6,8 +6,11 @@ import logging
 from app.core.config import settings
 # from app.core.security import get_current_user
 from app.api import routes_upload, routes_simulate, routes_publish, routes_runs
-from app.db.base import engine, wait_for_db_connectivity, create_demo_data
+from app.db.base import engine, wait_for_db_connectivity, create_demo_data, pool_metrics
 from app.db.models import Base, Tenant
+from app.services.ruleset_cache import ruleset_cache
+from app.services.jobs import simulation_jobs, parse_jobs, recover_interrupted_runs, recover_interrupted_uploads
+from app.services.sharding import sharded_pricer
 from sqlalchemy.orm import Session
 from app.db.base import get_db
 import uuid
@@ -20,8 +23,12 @@ logger = logging.getLogger(__name__)
 wait_for_db_connectivity()
 Base.metadata.create_all(bind=engine)
 
-# Crear datos de ejemplo si estamos en modo demo
-if "sqlite" in str(engine.url):
+# Los runs y parseos encolados o en curso antes de un reinicio no se retoman
+recover_interrupted_runs()
+recover_interrupted_uploads()
+
+# Crear datos de ejemplo si estamos en modo demo (SQLite)
+if engine.url.get_backend_name() == "sqlite":
     create_demo_data()
 
 # Crear aplicación FastAPI
@@ -48,6 +55,13 @@ app.include_router(routes_simulate.router, prefix="/api/v1", tags=["simulate"])
 app.include_router(routes_publish.router, prefix="/api/v1", tags=["publish"])
 app.include_router(routes_runs.router, prefix="/api/v1", tags=["runs"])
 
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Detiene los pools de simulación y de parseo al apagar la aplicación"""
+    simulation_jobs.shutdown()
+    parse_jobs.shutdown()
+    sharded_pricer.shutdown()
+
 @app.get("/")
 async def root():
     """Endpoint raíz"""
@@ -65,7 +79,11 @@ async def health_check():
     return {
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat() + "Z",
-        "database": "sqlite" if "sqlite" in str(engine.url) else "postgresql"
+        "database": "sqlite" if "sqlite" in str(engine.url) else "postgresql",
+        "database_pool": pool_metrics.snapshot(),
+        "ruleset_cache": ruleset_cache.stats(),
+        "simulaciones_pendientes": simulation_jobs.pending(),
+        "listas_en_parseo": parse_jobs.pending()
     }
 
 @app.get("/demo/data")
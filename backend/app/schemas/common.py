@@ -4,6 +4,7 @@ from datetime import datetime
 from enum import Enum
 
 class StatusEnum(str, Enum):
+    QUEUED = "queued"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
@@ -6,20 +6,36 @@ from .common import StatusEnum, ChannelEnum, PaginationParams
 class UploadRequest(BaseModel):
     tenant_id: str = Field(..., description="ID del tenant")
 
+class UploadProgress(BaseModel):
+    etapa: str = Field(..., description="en_cola, leyendo, normalizando, guardando o completado")
+    filas_procesadas: int = 0
+    filas_totales: Optional[int] = None
+
 class UploadResponse(BaseModel):
     id: str
     filename: str
     storage_url: str
+    status: str = Field(default="ready", description="parsing, ready o failed")
     normalized_items_count: int
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    progress: Optional[UploadProgress] = None
 
     class Config:
         from_attributes = True
 
+class UploadsListResponse(BaseModel):
+    items: List[UploadResponse]
+    next_cursor: Optional[str] = Field(default=None, description="Cursor de la página siguiente")
+
 class SimulateRequest(BaseModel):
     tenant_id: str = Field(..., description="ID del tenant")
     list_id: str = Field(..., description="ID de la lista de precios")
     ruleset_id: str = Field(..., description="ID del ruleset a aplicar")
+    base_run_id: Optional[str] = Field(default=None, description="Run previo cuyos resultados sin cambios se reutilizan")
+
+class SimulationProgress(BaseModel):
+    items_procesados: int = 0
+    items_totales: Optional[int] = None
 
 class SimulateResponse(BaseModel):
     id: str
@@ -29,10 +45,28 @@ class SimulateResponse(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime] = None
     summary: Dict[str, Any] = Field(default_factory=dict)
+    progress: Optional[SimulationProgress] = None
 
     class Config:
         from_attributes = True
 
+class SweepRequest(BaseModel):
+    tenant_id: str = Field(..., description="ID del tenant")
+    list_id: str = Field(..., description="ID de la lista de precios")
+    ruleset_id: str = Field(..., description="ID del ruleset a aplicar")
+    grid: Dict[str, List[Any]] = Field(..., description="Valores a probar por parámetro (ej. IVA, L, desc_contado)")
+    umbral_rentabilidad: float = Field(default=0.0, description="Rentabilidad mínima; se cuentan los SKUs por debajo")
+
+class SweepCombination(BaseModel):
+    globals: Dict[str, Any]
+    summary: Dict[str, Any] = Field(default_factory=dict)
+
+class SweepResponse(BaseModel):
+    list_id: str
+    ruleset_id: str
+    total_combinations: int
+    combinations: List[SweepCombination]
+
 class PublishRequest(BaseModel):
     run_id: str = Field(..., description="ID de la ejecución")
     canal: str = Field(..., description="Canal de publicación")
@@ -87,10 +121,30 @@ class RunResponse(BaseModel):
     completed_at: Optional[datetime]
     summary: Dict[str, Any]
     items: List[PriceItemResponse]
+    total_items: Optional[int] = None
+    next_cursor: Optional[str] = Field(default=None, description="Cursor de la página siguiente de items")
 
     class Config:
         from_attributes = True
 
+class RunsListResponse(BaseModel):
+    items: List[SimulateResponse]
+    next_cursor: Optional[str] = Field(default=None, description="Cursor de la página siguiente")
+
+class RunDiffItem(BaseModel):
+    sku: str
+    precio_anterior: Optional[float] = Field(default=None, description="Precio en el run base (None = SKU nuevo)")
+    precio_nuevo: Optional[float] = Field(default=None, description="Precio en el run (None = SKU eliminado)")
+    cambio: Optional[float] = Field(default=None, description="Cambio relativo de precio")
+    bloqueado: bool = Field(default=False, description="Supera el umbral de QA por SKU")
+
+class RunDiffResponse(BaseModel):
+    run_id: str
+    base_run_id: str
+    summary: Dict[str, Any]
+    items: List[RunDiffItem]
+    next_cursor: Optional[str] = Field(default=None, description="Cursor de la página siguiente")
+
 class RunItemResponse(BaseModel):
     id: str
     sku: str
@@ -0,0 +1,40 @@
+from typing import Dict, Any, Optional
+from app.services.ruleset_compiler import CompiledRuleset
+
+
+def run_constants(compiled: CompiledRuleset) -> Dict[str, Any]:
+    """
+    Valores del breakdown comunes a todos los items de un run
+
+    Son los globals y los pasos invariantes del plan. Los items alcanzados por
+    un override conservan su propio valor en el breakdown compacto.
+
+    Args:
+        compiled: Ruleset compilado de la simulación
+
+    Returns:
+        Diccionario variable -> valor
+    """
+    return {**compiled.globals, **compiled.constants}
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    # Mismo tipo además de igual valor: 1, 1.0 y True no son intercambiables en el JSON
+    return type(a) is type(b) and a == b
+
+
+def compact_breakdown(breakdown: Dict[str, Any], constants: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Quita del breakdown de un item los valores iguales a las constantes del run"""
+    if not constants or not breakdown:
+        return breakdown
+    return {
+        key: value for key, value in breakdown.items()
+        if key not in constants or not _same_value(value, constants[key])
+    }
+
+
+def expand_breakdown(breakdown: Optional[Dict[str, Any]], constants: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Rearma el breakdown completo de un item a partir del compacto y las constantes del run"""
+    if not constants or not breakdown:
+        return breakdown or {}
+    return {**constants, **breakdown}
@@ -0,0 +1,156 @@
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+import pandas as pd
+from openpyxl import load_workbook
+from app.core.config import settings
+
+try:  # Backend opcional (Rust), mucho más rápido que openpyxl
+    from python_calamine import CalamineWorkbook
+except ImportError:  # pragma: no cover - depende del entorno
+    CalamineWorkbook = None
+
+logger = logging.getLogger(__name__)
+
+SheetName = Union[str, int]
+
+# Extensiones que solo puede leer xlrd
+_LEGACY_EXTENSIONS = ('.xls',)
+
+
+def _convert_cell(value: Any) -> Any:
+    # Igual que pandas: los números enteros guardados como float vuelven a int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        # calamine devuelve date para celdas sin hora; pandas siempre datetime
+        return datetime(value.year, value.month, value.day)
+    if value == "":
+        return None
+    return value
+
+
+def _header_names(row: Sequence[Any]) -> List[str]:
+    """Nombres de columna como los arma pandas: vacíos "Unnamed: i", repetidos con sufijo .n"""
+    names = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or value == "" else str(_convert_cell(value))
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _rows_to_frame(rows: Iterable[Sequence[Any]], header: Optional[int]) -> pd.DataFrame:
+    """
+    Arma el DataFrame a partir de las filas de una hoja
+
+    Como pandas: descarta las filas y columnas vacías del final (no las
+    intermedias) y toma la fila `header` como nombres de columna (None = sin
+    encabezado).
+    """
+    data = []
+    width = 0
+    for row in rows:
+        values = [_convert_cell(value) for value in row]
+        while values and values[-1] is None:
+            values.pop()
+        data.append(values)
+        width = max(width, len(values))
+    while data and not data[-1]:
+        data.pop()
+    if not data:
+        return pd.DataFrame()
+
+    data = [row + [None] * (width - len(row)) for row in data]
+    if header is None:
+        return pd.DataFrame(data)
+    return pd.DataFrame(data[header + 1:], columns=_header_names(data[header]))
+
+
+def _read_openpyxl(file_path: str, sheet_name: SheetName, header: Optional[int]) -> pd.DataFrame:
+    # read_only: recorre el XML de la hoja sin crear un objeto por celda
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        return _rows_to_frame(sheet.iter_rows(values_only=True), header)
+    finally:
+        workbook.close()
+
+
+def _read_calamine(file_path: str, sheet_name: SheetName, header: Optional[int]) -> pd.DataFrame:
+    workbook = CalamineWorkbook.from_path(file_path)
+    if isinstance(sheet_name, int):
+        sheet = workbook.get_sheet_by_index(sheet_name)
+    else:
+        sheet = workbook.get_sheet_by_name(sheet_name)
+    return _rows_to_frame(sheet.to_python(skip_empty_area=False), header)
+
+
+def _read_pandas(file_path: str, sheet_name: SheetName, header: Optional[int]) -> pd.DataFrame:
+    # Lectura completa de pandas (openpyxl en modo normal o xlrd para .xls)
+    engine = 'xlrd' if Path(file_path).suffix.lower() in _LEGACY_EXTENSIONS else 'openpyxl'
+    return pd.read_excel(file_path, sheet_name=sheet_name, header=header, engine=engine)
+
+
+EXCEL_READERS: Dict[str, Callable[[str, SheetName, Optional[int]], pd.DataFrame]] = {
+    'openpyxl': _read_openpyxl,
+    'calamine': _read_calamine,
+    'pandas': _read_pandas,
+}
+
+
+def available_readers() -> List[str]:
+    """Lectores utilizables en este entorno"""
+    return [name for name in EXCEL_READERS if name != 'calamine' or CalamineWorkbook is not None]
+
+
+def resolve_reader(file_path: str, engine: Optional[str] = None) -> str:
+    """
+    Elige el lector para un archivo
+
+    Args:
+        file_path: Ruta del archivo
+        engine: Lector pedido (None = EXCEL_READER de la configuración)
+
+    Returns:
+        Nombre del lector: "auto" usa calamine si está instalado y si no openpyxl
+        en modo read_only; los .xls solo los leen calamine o pandas (xlrd)
+    """
+    engine = engine or settings.get_excel_reader()
+    legacy = Path(file_path).suffix.lower() in _LEGACY_EXTENSIONS
+    if engine == 'auto':
+        if CalamineWorkbook is not None:
+            return 'calamine'
+        return 'pandas' if legacy else 'openpyxl'
+    if engine not in EXCEL_READERS:
+        raise ValueError(f"Lector de Excel desconocido: {engine}")
+    if engine == 'calamine' and CalamineWorkbook is None:
+        raise ValueError("El lector calamine requiere el paquete python-calamine")
+    if engine == 'openpyxl' and legacy:
+        return 'pandas'
+    return engine
+
+
+def read_excel(file_path: str, sheet_name: SheetName = 0, header: Optional[int] = 0,
+               engine: Optional[str] = None) -> pd.DataFrame:
+    """
+    Lee una hoja de un Excel como DataFrame (mismo resultado que pd.read_excel)
+
+    Args:
+        file_path: Ruta del archivo
+        sheet_name: Nombre o índice de la hoja
+        header: Fila de encabezados (None = sin encabezado)
+        engine: Lector a usar (None = EXCEL_READER de la configuración)
+
+    Returns:
+        DataFrame con los valores de la hoja
+    """
+    reader = resolve_reader(file_path, engine)
+    logger.debug(f"Leyendo {file_path} con {reader}")
+    return EXCEL_READERS[reader](str(file_path), sheet_name, header)
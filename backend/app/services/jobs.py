@@ -0,0 +1,258 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.base import SessionLocal, engine
+from app.db.models import ListRaw, PriceRun
+from app.services.parser import excel_parser
+from app.services.simulator import pricing_simulator
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(RuntimeError):
+    """No hay lugar en la cola de trabajos"""
+
+
+class SimulationQueueFull(JobQueueFull):
+    """No hay lugar en la cola de simulaciones"""
+
+
+class ParseQueueFull(JobQueueFull):
+    """No hay lugar en la cola de parseo de listas"""
+
+
+class BackgroundJobs:
+    """Cola de trabajos ejecutados en un pool acotado de threads
+
+    Cada job abre su propia sesión. El progreso se guarda en memoria del
+    proceso mientras el job está pendiente; el estado final queda en la base.
+    Las subclases definen submit() y _run().
+    """
+
+    thread_name_prefix = "job"
+    queue_full_error = JobQueueFull
+
+    def __init__(self, workers: int, max_pending: int,
+                 session_factory: Callable[[], Session] = SessionLocal, inline: bool = False,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        # inline: ejecutar en el llamador (tests)
+        self.inline = inline
+        # executor: pool externo compartido entre colas (ver _serial_executor)
+        self._executor: Optional[ThreadPoolExecutor] = executor
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progreso de un job pendiente, o None si no está en la cola"""
+        with self._lock:
+            progress = self._progress.get(job_id)
+            return dict(progress) if progress is not None else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._progress)
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _enqueue(self, job_id: str, progress: Dict[str, Any], *args) -> None:
+        """Reserva el lugar del job y lo ejecuta (en el pool o en el llamador)"""
+        with self._lock:
+            if len(self._progress) >= self.max_pending:
+                raise self.queue_full_error(f"Hay {len(self._progress)} trabajos pendientes")
+            self._progress[job_id] = progress
+
+        if self.inline:
+            self._run(*args)
+            return
+        self._get_executor().submit(self._run, *args)
+
+    def _report(self, job_id: str, progress: Dict[str, Any]) -> None:
+        with self._lock:
+            self._progress[job_id] = progress
+
+    def _finish(self, job_id: str) -> None:
+        with self._lock:
+            self._progress.pop(job_id, None)
+
+    def _run(self, *args) -> None:
+        raise NotImplementedError
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.thread_name_prefix
+                )
+            return self._executor
+
+
+class SimulationJobs(BackgroundJobs):
+    """Cola de simulaciones; el progreso son los items procesados / totales"""
+
+    thread_name_prefix = "simulation"
+    queue_full_error = SimulationQueueFull
+
+    def submit(self, run_id: str, tenant_id: str, list_id: str, ruleset_id: str,
+               base_run_id: Optional[str] = None) -> None:
+        """
+        Encola la simulación de un price run ya creado (status "queued")
+
+        Raises:
+            SimulationQueueFull: Si ya hay max_pending simulaciones pendientes
+        """
+        self._enqueue(
+            run_id, {'items_procesados': 0, 'items_totales': None},
+            run_id, tenant_id, list_id, ruleset_id, base_run_id
+        )
+
+    def _run(self, run_id: str, tenant_id: str, list_id: str, ruleset_id: str,
+             base_run_id: Optional[str]) -> None:
+        def report(done: int, total: int) -> None:
+            self._report(run_id, {'items_procesados': done, 'items_totales': total})
+
+        db = self.session_factory()
+        try:
+            pricing_simulator.run_simulation(
+                db, tenant_id, list_id, ruleset_id,
+                base_run_id=base_run_id, run_id=run_id, progress=report
+            )
+        except Exception as e:
+            # run_simulation ya marcó el run como fallido
+            logger.error(f"Simulación {run_id} fallida: {e}")
+        finally:
+            db.close()
+            self._finish(run_id)
+
+
+class ParseJobs(BackgroundJobs):
+    """Cola de parseo de listas subidas
+
+    El progreso es la etapa (leyendo, normalizando, guardando) y las filas
+    procesadas / totales de esa etapa. Los items y el estado final de la lista
+    (metadata "status": ready o failed) se confirman en una misma transacción.
+    """
+
+    thread_name_prefix = "parse"
+    queue_full_error = ParseQueueFull
+
+    def submit(self, list_id: str, tenant_id: str, file_path: str,
+               content_hash: Optional[str] = None) -> None:
+        """
+        Encola el parseo de una lista ya guardada (metadata "status": "parsing")
+
+        Raises:
+            ParseQueueFull: Si ya hay max_pending listas pendientes
+        """
+        self._enqueue(
+            list_id, {'etapa': 'en_cola', 'filas_procesadas': 0, 'filas_totales': None},
+            list_id, tenant_id, file_path, content_hash
+        )
+
+    def _run(self, list_id: str, tenant_id: str, file_path: str, content_hash: Optional[str]) -> None:
+        def report(etapa: str, done: int, total: Optional[int]) -> None:
+            self._report(list_id, {'etapa': etapa, 'filas_procesadas': done, 'filas_totales': total})
+
+        db = self.session_factory()
+        try:
+            items = excel_parser.parse_excel_file(
+                file_path, tenant_id, list_id, content_hash=content_hash, progress=report
+            )
+            excel_parser.save_items_to_db(items, db=db, progress=report)
+            self._set_list_metadata(db, list_id, status="ready", normalized_items_count=len(items))
+            logger.info(f"Lista {list_id} procesada: {len(items)} items")
+        except Exception as e:
+            logger.error(f"Parseo de la lista {list_id} fallido: {e}")
+            db.rollback()
+            try:
+                self._set_list_metadata(db, list_id, status="failed", error=str(e))
+            except Exception as update_error:
+                logger.error(f"No se pudo marcar la lista {list_id} como fallida: {update_error}")
+                db.rollback()
+        finally:
+            db.close()
+            self._finish(list_id)
+
+    def _set_list_metadata(self, db: Session, list_id: str, **values) -> None:
+        list_raw = db.query(ListRaw).filter(ListRaw.id == list_id).one()
+        list_raw.list_metadata = {**(list_raw.list_metadata or {}), **values}
+        db.commit()
+
+
+def recover_interrupted_runs(session_factory: Callable[[], Session] = SessionLocal) -> int:
+    """
+    Marca como fallidos los runs que quedaron encolados o en curso
+
+    La cola vive en memoria del proceso: tras un reinicio nadie va a retomar
+    esos runs. Se llama al iniciar la aplicación.
+
+    Returns:
+        Cantidad de runs marcados
+    """
+    db = session_factory()
+    try:
+        count = db.query(PriceRun).filter(PriceRun.status.in_(("queued", "running"))).update(
+            {PriceRun.status: "failed", PriceRun.resumen: {"error": "Simulación interrumpida por un reinicio del servidor"}},
+            synchronize_session=False
+        )
+        db.commit()
+        if count:
+            logger.warning(f"Runs interrumpidos marcados como fallidos: {count}")
+        return count
+    finally:
+        db.close()
+
+
+def recover_interrupted_uploads(session_factory: Callable[[], Session] = SessionLocal) -> int:
+    """
+    Marca como fallidas las listas que quedaron con el parseo pendiente
+
+    Igual que recover_interrupted_runs: se llama al iniciar la aplicación.
+
+    Returns:
+        Cantidad de listas marcadas
+    """
+    db = session_factory()
+    try:
+        lists = db.query(ListRaw).filter(ListRaw.list_metadata["status"].as_string() == "parsing").all()
+        for list_raw in lists:
+            list_raw.list_metadata = {
+                **list_raw.list_metadata, "status": "failed",
+                "error": "Parseo interrumpido por un reinicio del servidor"
+            }
+        db.commit()
+        if lists:
+            logger.warning(f"Listas con el parseo interrumpido marcadas como fallidas: {len(lists)}")
+        return len(lists)
+    finally:
+        db.close()
+
+
+# SQLite admite un único escritor: los jobs (cada uno con su sesión y su
+# conexión) se serializan en un único thread, fuera del event loop
+_serial_executor = (
+    ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite") if engine.url.get_backend_name() == "sqlite" else None
+)
+
+# Instancia global de la cola de simulaciones
+simulation_jobs = SimulationJobs(
+    workers=settings.get_simulation_job_workers(),
+    max_pending=settings.get_simulation_max_pending_jobs(),
+    executor=_serial_executor
+)
+
+# Instancia global de la cola de parseo de listas
+parse_jobs = ParseJobs(
+    workers=settings.get_parse_job_workers(),
+    max_pending=settings.get_parse_max_pending_jobs(),
+    executor=_serial_executor
+)
@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+import uuid
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.core.config import settings
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+# Carpeta del volumen con una subcarpeta por versión del parser
+PARSE_CACHE_DIR = "parse_cache"
+
+# Columnas de normalized_items que dependen solo del contenido del archivo
+# (id, list_id y created_at se asignan en cada upload)
+CACHE_SCHEMA = pa.schema([
+    ('sku', pa.string()),
+    ('marca', pa.string()),
+    ('linea', pa.string()),
+    ('base_price', pa.float64()),
+    ('cost', pa.float64()),
+    ('attrs', pa.string()),
+])
+
+
+class ParseCache:
+    """Caché en disco de listas ya parseadas, por hash de contenido y versión del parser
+
+    Cada entrada es un Parquet con los items normalizados. Se conservan como
+    máximo PARSE_CACHE_MAX_ENTRIES entradas; al superarlo se borran las usadas
+    hace más tiempo (la fecha de modificación se actualiza en cada acierto).
+    """
+
+    def __init__(self, directory: str = PARSE_CACHE_DIR):
+        self.directory = directory
+
+    @property
+    def enabled(self) -> bool:
+        return settings.get_parse_cache_max_entries() > 0
+
+    def _path(self, content_hash: str, version: str) -> Path:
+        return storage_service.resolve_path(f"{self.directory}/{version}/{content_hash}.parquet")
+
+    def get(self, content_hash: str, version: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Items normalizados de un archivo ya parseado
+
+        Args:
+            content_hash: sha256 del contenido del archivo
+            version: Versión del parser
+
+        Returns:
+            Items sin id ni list_id, o None si no está en caché
+        """
+        if not self.enabled:
+            return None
+        path = self._path(content_hash, version)
+        if not path.exists():
+            return None
+        try:
+            columns = pq.read_table(str(path), schema=CACHE_SCHEMA).to_pydict()
+            os.utime(path)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"Entrada de caché ilegible {path}, se descarta: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        return [
+            {
+                'sku': sku,
+                'marca': marca,
+                'linea': linea,
+                'base_price': base_price,
+                'cost': cost,
+                'attrs': json.loads(attrs),
+            }
+            for sku, marca, linea, base_price, cost, attrs in zip(
+                columns['sku'], columns['marca'], columns['linea'],
+                columns['base_price'], columns['cost'], columns['attrs']
+            )
+        ]
+
+    def put(self, content_hash: str, version: str, items: List[Dict[str, Any]]) -> None:
+        """Guarda los items normalizados de un archivo (un error no interrumpe el upload)"""
+        if not self.enabled:
+            return
+        path = self._path(content_hash, version)
+        # Nombre temporal único: otro worker puede estar guardando el mismo archivo
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pydict({
+                'sku': [item['sku'] for item in items],
+                'marca': [item['marca'] for item in items],
+                'linea': [item['linea'] for item in items],
+                'base_price': [item['base_price'] for item in items],
+                'cost': [item['cost'] for item in items],
+                'attrs': [json.dumps(item['attrs'], default=str) for item in items],
+            }, schema=CACHE_SCHEMA)
+            pq.write_table(table, str(tmp_path), compression='zstd')
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"No se pudo guardar la lista en caché {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Borra las entradas menos usadas por encima del máximo (de todas las versiones)"""
+        root = storage_service.resolve_path(self.directory)
+        entries = []
+        for path in root.glob("*/*.parquet"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        excess = len(entries) - settings.get_parse_cache_max_entries()
+        if excess <= 0:
+            return
+        for _, path in sorted(entries)[:excess]:
+            path.unlink(missing_ok=True)
+        logger.info(f"Caché de listas parseadas: {excess} entradas eliminadas")
+
+
+# Instancia global de la caché
+parse_cache = ParseCache()
@@ -1,11 +1,39 @@
+import math
+import numpy as np
 import pandas as pd
 import logging
-from typing import List, Dict, Any, Optional
-from app.db.models import NormalizedItem
+from datetime import datetime
+from typing import Callable, List, Dict, Any, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import NormalizedItem, generate_uuid
 from app.db.base import SessionLocal
+from app.services.excel_reader import read_excel
+from app.services.parse_cache import parse_cache
 
 logger = logging.getLogger(__name__)
 
+# Versión de la normalización: cambiarla cuando cambie el resultado del parseo
+# (mapeos, limpieza, atributos) invalida las listas guardadas en la caché
+PARSER_VERSION = "1"
+
+# Callback de avance: (etapa, filas procesadas, filas totales o None)
+ParseProgress = Callable[[str, int, Optional[int]], None]
+
+def _json_value(value: Any) -> Any:
+    """Valor de una celda apto para JSON: vacías como None, fechas y demás tipos como texto"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    if value is pd.NaT:
+        return None
+    return str(value)
+
+
 class ExcelParser:
     """Servicio para parsear archivos Excel y normalizar datos"""
     
@@ -25,7 +53,9 @@ class ExcelParser:
             'cost': 'cost'
         }
     
-    def parse_excel_file(self, file_path: str, tenant_id: str, list_id: str) -> List[NormalizedItem]:
+    def parse_excel_file(self, file_path: str, tenant_id: str, list_id: str,
+                         content_hash: Optional[str] = None,
+                         progress: Optional[ParseProgress] = None) -> List[Dict[str, Any]]:
         """
         Parsea un archivo Excel y normaliza los datos
         
@@ -33,14 +63,29 @@ class ExcelParser:
             file_path: Ruta del archivo Excel
             tenant_id: ID del tenant
             list_id: ID de la lista
+            content_hash: sha256 del archivo; si la lista ya se parseó, los
+                items salen de la caché sin leer el Excel
+            progress: Callback (etapa, filas procesadas, filas totales) en
+                cada cambio de etapa
             
         Returns:
-            Lista de items normalizados
+            Lista de items normalizados (filas de normalized_items como diccionarios)
         """
         try:
-            # Leer archivo Excel
-            df = pd.read_excel(file_path, engine='openpyxl')
-            logger.info(f"Archivo Excel leído: {len(df)} filas")
+            if content_hash:
+                cached = parse_cache.get(content_hash, PARSER_VERSION)
+                if cached is not None:
+                    logger.info(f"Lista en caché ({content_hash[:12]}): {len(cached)} items, sin parsear el Excel")
+                    return self._attach_to_list(cached, list_id)
+            
+            # Leer archivo Excel (lector en modo solo lectura, ver EXCEL_READER)
+            if progress:
+                progress('leyendo', 0, None)
+            df = read_excel(file_path)
+            total_rows = len(df)
+            logger.info(f"Archivo Excel leído: {total_rows} filas")
+            if progress:
+                progress('normalizando', 0, total_rows)
             
             # Normalizar columnas
             df = self._normalize_columns(df)
@@ -51,9 +96,14 @@ class ExcelParser:
             # Limpiar datos
             df = self._clean_data(df)
             
-            # Convertir a objetos NormalizedItem
+            # Convertir a filas de normalized_items
             items = self._convert_to_items(df, tenant_id, list_id)
             
+            if content_hash:
+                parse_cache.put(content_hash, PARSER_VERSION, items)
+            if progress:
+                progress('normalizando', total_rows, total_rows)
+            
             logger.info(f"Items normalizados: {len(items)}")
             return items
             
@@ -103,44 +153,84 @@ class ExcelParser:
         
         return df
     
-    def _convert_to_items(self, df: pd.DataFrame, tenant_id: str, list_id: str) -> List[NormalizedItem]:
-        """Convierte el DataFrame a objetos NormalizedItem"""
-        items = []
-        
-        for _, row in df.iterrows():
-            # Extraer atributos adicionales
-            attrs = {}
-            for col in df.columns:
-                if col not in self.required_columns:
-                    attrs[col] = row[col]
-            
-            item = NormalizedItem(
-                list_id=list_id,
-                sku=str(row['sku']),
-                marca=str(row['marca']),
-                linea=str(row['linea']),
-                base_price=float(row['base_price']),
-                cost=float(row['cost']),
-                attrs=attrs
+    def _convert_to_items(self, df: pd.DataFrame, tenant_id: str, list_id: str) -> List[Dict[str, Any]]:
+        """
+        Convierte el DataFrame a filas de normalized_items
+
+        Se arma por columnas, sin recorrer el DataFrame fila a fila ni crear un
+        objeto del ORM por item; los atributos adicionales van como diccionario
+        (celdas vacías como None para que el JSON sea válido). Las fechas y
+        demás valores no JSON pasan a texto igual que al guardarlos en la
+        caché, así un acierto de caché devuelve los mismos atributos.
+        """
+        extra_columns = [col for col in df.columns if col not in self.required_columns]
+        columns = [[_json_value(value) for value in df[col].tolist()] for col in extra_columns]
+        attrs_list = [dict(zip(extra_columns, values)) for values in zip(*columns)]
+        if not extra_columns:
+            attrs_list = [{} for _ in range(len(df))]
+
+        created_at = datetime.utcnow()
+        return [
+            {
+                'id': generate_uuid(),
+                'list_id': list_id,
+                'sku': sku,
+                'marca': marca,
+                'linea': linea,
+                'base_price': base_price,
+                'cost': cost,
+                'attrs': attrs,
+                'created_at': created_at,
+            }
+            for sku, marca, linea, base_price, cost, attrs in zip(
+                df['sku'].astype(str).tolist(),
+                df['marca'].astype(str).tolist(),
+                df['linea'].astype(str).tolist(),
+                df['base_price'].astype(float).tolist(),
+                df['cost'].astype(float).tolist(),
+                attrs_list
             )
-            
-            items.append(item)
-        
-        return items
+        ]
+    
+    def _attach_to_list(self, rows: List[Dict[str, Any]], list_id: str) -> List[Dict[str, Any]]:
+        """Asigna id, lista y fecha a items normalizados (ej. los de la caché)"""
+        created_at = datetime.utcnow()
+        return [
+            {'id': generate_uuid(), 'list_id': list_id, **row, 'created_at': created_at}
+            for row in rows
+        ]
     
-    def save_items_to_db(self, items: List[NormalizedItem]):
-        """Guarda los items en la base de datos"""
-        db = SessionLocal()
+    def save_items_to_db(self, items: List[Dict[str, Any]], db: Optional[Session] = None,
+                         progress: Optional[ParseProgress] = None):
+        """
+        Guarda los items en la base de datos con INSERT masivo en chunks
+        
+        Args:
+            items: Items normalizados
+            db: Sesión a usar; los items se confirman con su commit (None = sesión
+                propia con commit al terminar)
+            progress: Callback (etapa, filas guardadas, filas totales) por chunk
+        """
+        chunk_size = settings.get_price_item_chunk_size()
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
         try:
-            db.add_all(items)
-            db.commit()
+            for start in range(0, len(items), chunk_size):
+                db.execute(insert(NormalizedItem.__table__), items[start:start + chunk_size])
+                if progress:
+                    progress('guardando', min(start + chunk_size, len(items)), len(items))
+            if own_session:
+                db.commit()
             logger.info(f"Items guardados en DB: {len(items)}")
         except Exception as e:
-            db.rollback()
+            if own_session:
+                db.rollback()
             logger.error(f"Error guardando items: {e}")
             raise
         finally:
-            db.close()
+            if own_session:
+                db.close()
 
 # Instancia global del parser
 excel_parser = ExcelParser()
@@ -0,0 +1,99 @@
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import PriceItem, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+_COPY_COLUMNS = ('id', 'run_id', 'sku', 'inputs', 'outputs', 'breakdown', 'input_hash', 'created_at')
+_JSON_COLUMNS = frozenset(('inputs', 'outputs', 'breakdown'))
+
+
+def _csv_field(value: Optional[str]) -> str:
+    # Para COPY ... CSV un campo vacío sin comillas es NULL; el resto va siempre entre comillas
+    if value is None:
+        return ''
+    return '"' + value.replace('"', '""') + '"'
+
+
+class PriceItemWriter:
+    """Escritura masiva de PriceItems en chunks, sin la unit of work del ORM
+
+    En PostgreSQL usa COPY; en el resto de motores, INSERT con executemany.
+    Las filas se escriben dentro de la transacción de la sesión, así que se
+    confirman con su commit o se descartan con su rollback.
+    """
+
+    def __init__(self, db: Session, run_id: str, chunk_size: Optional[int] = None):
+        self.db = db
+        self.run_id = run_id
+        self.chunk_size = chunk_size or settings.get_price_item_chunk_size()
+        self.use_copy = db.get_bind().dialect.name == 'postgresql'
+        self.written = 0
+        self._rows: List[Dict[str, Any]] = []
+
+    def add(self, sku: str, inputs: Dict[str, Any], outputs: Dict[str, Any],
+            breakdown: Dict[str, Any], input_hash: Optional[str] = None) -> None:
+        """Agrega un resultado; se escribe al completarse el chunk"""
+        self._rows.append({
+            'id': generate_uuid(),
+            'run_id': self.run_id,
+            'sku': sku,
+            'inputs': inputs,
+            'outputs': outputs,
+            'breakdown': breakdown,
+            'input_hash': input_hash,
+            'created_at': datetime.utcnow(),
+        })
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Escribe las filas pendientes"""
+        if not self._rows:
+            return
+        if self.use_copy:
+            self._copy(self._rows)
+        else:
+            self.db.execute(insert(PriceItem.__table__), self._rows)
+        self.written += len(self._rows)
+        self._rows = []
+
+    def close(self) -> int:
+        """Escribe lo pendiente y retorna el total de filas escritas"""
+        self.flush()
+        return self.written
+
+    def discard(self) -> None:
+        """Descarta las filas pendientes (las ya escritas se descartan con el rollback)"""
+        self._rows = []
+    
+    def _copy(self, rows: List[Dict[str, Any]]) -> None:
+        buffer = io.StringIO()
+        for row in rows:
+            fields = []
+            for column in _COPY_COLUMNS:
+                value = row[column]
+                if column in _JSON_COLUMNS:
+                    value = json.dumps(value, default=str)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                fields.append(_csv_field(value))
+            buffer.write(','.join(fields))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        # Conexión DBAPI (psycopg2) de la transacción actual de la sesión
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {PriceItem.__tablename__} ({', '.join(_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
@@ -6,6 +6,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from app.db.models import Publish, PriceRun, PriceItem
 from app.services.storage import storage_service
+from app.services.simulator import pricing_simulator
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +40,7 @@ class Publisher:
                 raise ValueError(f"Price run no está completado: {run_id}")
             
             # Obtener price items
-            price_items = db.query(PriceItem).filter(PriceItem.run_id == run_id).all()
+            price_items = list(pricing_simulator.iter_price_items(db, price_run))
             if not price_items:
                 raise ValueError(f"No se encontraron items para el run: {run_id}")
             
@@ -1,88 +1,96 @@
 import json
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP
-import math
-from app.utils.rounding import rounding
+from app.services.batch_engine import evaluate_batch
+from app.services.ruleset_compiler import (
+    CompiledRuleset, CompiledStep, RulesetCompilationError,
+    compile_expression, compile_ruleset, run_expression
+)
 
 logger = logging.getLogger(__name__)
 
 class RulesEngine:
-    """Motor de reglas genérico para pricing"""
+    """Motor de reglas genérico para pricing
+    
+    El ruleset compilado es inmutable y el contexto de cada item vive solo
+    durante la llamada, por lo que una misma instancia puede usarse desde
+    varios threads. Los métodos de cálculo aceptan un `ruleset` compilado
+    explícito; si no se indica, usan el último cargado con load_ruleset.
+    """
     
     def __init__(self):
-        self.variables = {}
-        self.globals = {}
-        self.overrides = []
+        self.compiled: Optional[CompiledRuleset] = None
+    
+    @property
+    def name(self) -> Optional[str]:
+        return self.compiled.name if self.compiled else None
+    
+    @property
+    def version(self) -> Optional[str]:
+        return self.compiled.version if self.compiled else None
+    
+    @property
+    def globals(self) -> Mapping[str, Any]:
+        return self.compiled.globals if self.compiled else {}
+    
+    @property
+    def steps(self) -> Tuple[CompiledStep, ...]:
+        return self.compiled.steps if self.compiled else ()
+    
+    @property
+    def overrides(self) -> Tuple[Mapping[str, Any], ...]:
+        return self.compiled.overrides if self.compiled else ()
     
     def load_ruleset(self, ruleset_config: Dict[str, Any]) -> bool:
-        """Carga un ruleset desde configuración JSON"""
+        """Carga un ruleset desde configuración JSON y lo compila una única vez"""
         try:
-            self.name = ruleset_config.get("name", "default")
-            self.version = ruleset_config.get("version", "v1")
-            self.applies_to = ruleset_config.get("appliesTo", {})
-            self.globals = ruleset_config.get("globals", {})
-            self.steps = ruleset_config.get("steps", [])
-            self.overrides = ruleset_config.get("overrides", [])
+            compiled = compile_ruleset(ruleset_config)
+            
+            # Reemplazo atómico: los cálculos en curso conservan el ruleset anterior
+            self.compiled = compiled
             
-            logger.info(f"Ruleset cargado: {self.name} v{self.version}")
+            logger.info(f"Ruleset cargado: {compiled.name} v{compiled.version}")
+            logger.debug(f"Plan de ejecución {compiled.name}: {compiled.describe_plan()}")
             return True
             
         except Exception as e:
             logger.error(f"Error cargando ruleset: {e}")
             return False
     
-    def apply_overrides(self, item_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Aplica overrides basados en condiciones del item"""
-        overrides = {}
-        
-        for override in self.overrides:
-            when_conditions = override.get("when", {})
-            set_values = override.get("set", {})
-            
-            # Verificar si se cumplen las condiciones
-            conditions_met = True
-            for key, value in when_conditions.items():
-                if item_data.get(key) != value:
-                    conditions_met = False
-                    break
-            
-            if conditions_met:
-                overrides.update(set_values)
-                logger.debug(f"Override aplicado para {item_data.get('sku', 'unknown')}: {set_values}")
-        
+    def _resolve(self, ruleset: Optional[CompiledRuleset]) -> CompiledRuleset:
+        compiled = ruleset if ruleset is not None else self.compiled
+        if compiled is None:
+            raise ValueError("No hay ruleset cargado")
+        return compiled
+    
+    def apply_overrides(self, item_data: Dict[str, Any],
+                        ruleset: Optional[CompiledRuleset] = None) -> Dict[str, Any]:
+        """Aplica overrides basados en condiciones del item (búsqueda indexada)"""
+        overrides = self._resolve(ruleset).override_index.resolve(item_data)
+        if overrides:
+            logger.debug(f"Override aplicado para {item_data.get('sku', 'unknown')}: {overrides}")
         return overrides
     
     def evaluate_expression(self, expr: str, context: Dict[str, Any]) -> float:
         """Evalúa una expresión matemática con variables del contexto"""
         try:
-            # Crear un contexto seguro para eval
-            safe_context = {
-                'math': math,
-                'round': round,
-                'abs': abs,
-                'min': min,
-                'max': max,
-                'sum': sum,
-                **context
-            }
-            
-            # Usar la función de redondeo importada
-            safe_context['rounding'] = rounding
-            
-            # Evaluar expresión
-            result = eval(expr, {"__builtins__": {}}, safe_context)
-            return float(result)
-            
+            # La compilación se cachea por texto de expresión
+            compiled = compile_expression(expr)
         except Exception as e:
             logger.error(f"Error evaluando expresión '{expr}': {e}")
             return 0.0
+        
+        return run_expression(compiled, context)
     
-    def calculate_pricing(self, item_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Calcula el pricing para un item usando el ruleset cargado"""
+    def calculate_pricing(self, item_data: Dict[str, Any],
+                          ruleset: Optional[CompiledRuleset] = None) -> Dict[str, Any]:
+        """Calcula el pricing para un item usando el ruleset indicado o el cargado"""
         try:
-            # Inicializar variables con datos del item
-            self.variables = {
+            compiled = self._resolve(ruleset)
+            
+            # Inicializar variables con datos del item (contexto local a la llamada)
+            variables = {
                 'sku': item_data.get('sku', ''),
                 'marca': item_data.get('marca', ''),
                 'linea': item_data.get('linea', ''),
@@ -91,56 +99,45 @@ class RulesEngine:
                 **item_data.get('attrs', {})
             }
             
-            # Aplicar overrides
-            overrides = self.apply_overrides(item_data)
-            self.variables.update(overrides)
+            # Aplicar variables globales; los overrides tienen precedencia sobre ellas
+            variables.update(compiled.globals)
+            variables.update(self.apply_overrides(item_data, compiled))
             
-            # Aplicar variables globales
-            self.variables.update(self.globals)
+            # Aplicar pasos invariantes ya evaluados
+            variables.update(compiled.constants)
             
-            # Ejecutar pasos del ruleset
-            for step in self.steps:
-                step_type = step.get('type', 'var')
+            # Ejecutar solo los pasos que dependen del item
+            for step in compiled.item_steps:
+                if step.kind == 'from':
+                    # Variable desde otra variable
+                    variables[step.var] = variables.get(step.source, 0)
                 
-                if step_type == 'var':
-                    var_name = step['var']
-                    
-                    if 'from' in step:
-                        # Variable desde otra variable
-                        source_var = step['from']
-                        self.variables[var_name] = self.variables.get(source_var, 0)
-                    
-                    elif 'value' in step:
-                        # Valor fijo
-                        self.variables[var_name] = step['value']
-                    
-                    elif 'expr' in step:
-                        # Expresión matemática
-                        expr = step['expr']
-                        self.variables[var_name] = self.evaluate_expression(expr, self.variables)
+                elif step.kind == 'value':
+                    # Valor fijo (o expresión plegada a constante)
+                    variables[step.var] = step.value
                 
-                elif step_type == 'condition':
-                    # Lógica condicional (para futuras expansiones)
-                    pass
+                elif step.kind == 'expr':
+                    # Expresión matemática pre-compilada
+                    variables[step.var] = run_expression(step.expr, variables)
             
             # Preparar resultado
             result = {
                 'inputs': {
-                    'sku': self.variables.get('sku'),
-                    'marca': self.variables.get('marca'),
-                    'linea': self.variables.get('linea'),
-                    'base_price': self.variables.get('base_price'),
-                    'cost': self.variables.get('cost'),
+                    'sku': variables.get('sku'),
+                    'marca': variables.get('marca'),
+                    'linea': variables.get('linea'),
+                    'base_price': variables.get('base_price'),
+                    'cost': variables.get('cost'),
                 },
                 'outputs': {
-                    'precio_publico': self.variables.get('precio_publico', 0),
-                    'markup': self.variables.get('markup', 0),
-                    'rentabilidad': self.variables.get('rentabilidad', 0),
+                    'precio_publico': variables.get('precio_publico', 0),
+                    'markup': variables.get('markup', 0),
+                    'rentabilidad': variables.get('rentabilidad', 0),
                 },
-                'breakdown': self.variables.copy(),
+                'breakdown': variables,
                 'ruleset': {
-                    'name': self.name,
-                    'version': self.version
+                    'name': compiled.name,
+                    'version': compiled.version
                 }
             }
             
@@ -155,6 +152,46 @@ class RulesEngine:
                 'error': str(e)
             }
     
+    def calculate_pricing_batch(self, items_data: List[Dict[str, Any]],
+                                ruleset: Optional[CompiledRuleset] = None) -> List[Dict[str, Any]]:
+        """
+        Calcula el pricing de un lote de items evaluando cada paso como operación de columna
+        
+        Los resultados son idénticos a llamar calculate_pricing item por item.
+        """
+        compiled = ruleset if ruleset is not None else self.compiled
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items_data)
+        batch_items = []
+        batch_positions = []
+        
+        for position, item_data in enumerate(items_data):
+            try:
+                float(item_data.get('base_price', 0))
+                float(item_data.get('cost', 0))
+                dict(item_data.get('attrs', {}))
+            except Exception:
+                # Datos inválidos: el camino escalar arma el resultado con el error
+                results[position] = self.calculate_pricing(item_data, compiled)
+                continue
+            batch_items.append(item_data)
+            batch_positions.append(position)
+        
+        try:
+            batch_results = evaluate_batch(compiled, batch_items)
+        except Exception as e:
+            logger.error(f"Error en evaluación por lotes, usando cálculo por item: {e}")
+            batch_results = [self.calculate_pricing(item_data, compiled) for item_data in batch_items]
+        
+        for position, result in zip(batch_positions, batch_results):
+            results[position] = result
+        
+        return results
+    
+    def describe_plan(self, ruleset: Optional[CompiledRuleset] = None) -> Dict[str, Any]:
+        """Retorna el plan de ejecución del ruleset indicado o el cargado"""
+        compiled = ruleset if ruleset is not None else self.compiled
+        return compiled.describe_plan() if compiled else {}
+    
     def validate_ruleset(self, ruleset_config: Dict[str, Any]) -> List[str]:
         """Valida la estructura de un ruleset"""
         errors = []
@@ -171,6 +208,12 @@ class RulesEngine:
                 
                 if 'from' not in step and 'value' not in step and 'expr' not in step:
                     errors.append(f"Paso {i}: debe tener 'from', 'value' o 'expr'")
+                
+                if 'expr' in step:
+                    try:
+                        compile_expression(step['expr'])
+                    except RulesetCompilationError as e:
+                        errors.append(f"Paso {i}: {e}")
         
         return errors
 
@@ -0,0 +1,129 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import Ruleset
+from app.services.ruleset_compiler import CompiledRuleset, compile_ruleset
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Optional[datetime]]
+
+
+class RulesetCache:
+    """Cache LRU acotada de rulesets compilados, compartida por todo el proceso
+
+    La clave es (ruleset.id, ruleset.updated_at): al actualizar un ruleset cambia
+    su updated_at y la versión anterior deja de usarse. Además se invalida
+    explícitamente ante cualquier update/delete hecho desde el ORM.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[CacheKey, CompiledRuleset]" = OrderedDict()
+        self._keys_by_id: Dict[str, CacheKey] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db: Session, ruleset_id: str) -> CompiledRuleset:
+        """
+        Obtiene el ruleset compilado, cargándolo y compilándolo solo si no está en cache
+
+        Args:
+            db: Sesión de base de datos
+            ruleset_id: ID del ruleset
+
+        Returns:
+            CompiledRuleset listo para usar
+
+        Raises:
+            ValueError: Si el ruleset no existe o no compila
+        """
+        # Solo se consulta la versión; la configuración se carga en caso de miss
+        row = db.query(Ruleset.updated_at).filter(Ruleset.id == ruleset_id).first()
+        if row is None:
+            raise ValueError(f"Ruleset no encontrado: {ruleset_id}")
+
+        key = (ruleset_id, row.updated_at)
+        compiled = self._lookup(key)
+        if compiled is not None:
+            return compiled
+
+        ruleset = db.query(Ruleset).filter(Ruleset.id == ruleset_id).first()
+        if ruleset is None:
+            raise ValueError(f"Ruleset no encontrado: {ruleset_id}")
+        return self._compile(ruleset)
+
+    def _compile(self, ruleset: Ruleset) -> CompiledRuleset:
+        # Se compila fuera del lock; si dos threads compilan a la vez, gana el último
+        compiled = compile_ruleset(ruleset.config)
+        self._store((ruleset.id, ruleset.updated_at), compiled)
+        logger.info(f"Ruleset compilado y cacheado: {ruleset.id} ({compiled.name} v{compiled.version})")
+        return compiled
+
+    def invalidate(self, ruleset_id: Optional[str] = None) -> None:
+        """Invalida un ruleset (todas sus versiones) o la cache completa"""
+        with self._lock:
+            if ruleset_id is None:
+                self._entries.clear()
+                self._keys_by_id.clear()
+                return
+            key = self._keys_by_id.pop(ruleset_id, None)
+            if key is not None:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def _lookup(self, key: CacheKey) -> Optional[CompiledRuleset]:
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+    def _store(self, key: CacheKey, compiled: CompiledRuleset) -> None:
+        with self._lock:
+            # Una sola versión por ruleset: la anterior queda obsoleta
+            stale = self._keys_by_id.get(key[0])
+            if stale is not None and stale != key:
+                self._entries.pop(stale, None)
+
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            self._keys_by_id[key[0]] = key
+
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                if self._keys_by_id.get(old_key[0]) == old_key:
+                    del self._keys_by_id[old_key[0]]
+                self.evictions += 1
+
+
+# Instancia global de la cache
+ruleset_cache = RulesetCache(settings.get_ruleset_cache_size())
+
+
+@event.listens_for(Ruleset, "after_update")
+@event.listens_for(Ruleset, "after_delete")
+def _invalidate_ruleset(mapper, connection, target):
+    ruleset_cache.invalidate(target.id)
@@ -0,0 +1,250 @@
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import PriceRun, PriceItem
+from app.services.run_results import RunResultsFile
+
+logger = logging.getLogger(__name__)
+
+# Variable de salida que se compara entre runs
+PRICE_OUTPUT = 'precio_publico'
+
+# Cambios menores a esto se consideran precio sin cambios (redondeo de floats)
+_CHANGE_EPSILON = 1e-9
+
+# Claves del resumen del diff dentro de PriceRun.resumen
+DIFF_SUMMARY_KEYS = (
+    'run_anterior_id', 'cambio_promedio', 'cambio_global', 'skus_afectados',
+    'skus_bloqueados_por_gate', 'skus_nuevos', 'skus_eliminados', 'gate_global_superado',
+    'umbral_sku', 'umbral_global',
+)
+
+# Precios (sku, precio) de un run ordenados por sku, a partir de un sku
+# (None = desde el principio); NaN = sin precio numérico
+PriceSource = Callable[[Optional[str]], Iterator[Tuple[str, float]]]
+
+
+def _price(outputs: Optional[Dict[str, Any]]) -> float:
+    value = (outputs or {}).get(PRICE_OUTPUT)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def run_prices(db: Session, price_run: PriceRun, chunk_size: Optional[int] = None) -> PriceSource:
+    """
+    Precios de un run guardado, leídos en orden de sku de a un chunk
+
+    Args:
+        db: Sesión de base de datos
+        price_run: Price run
+        chunk_size: Filas por lectura (None = PRICE_ITEM_CHUNK_SIZE)
+
+    Returns:
+        Fuente de (sku, precio): de la tabla price_items por keyset sobre
+        (sku, id), o del archivo de resultados desde el row group del sku
+    """
+    chunk_size = chunk_size or settings.get_price_item_chunk_size()
+
+    if price_run.results_file:
+        results = RunResultsFile(price_run.results_file)
+
+        def file_prices(after: Optional[str]) -> Iterator[Tuple[str, float]]:
+            for table in results.iter_sorted(['sku', PRICE_OUTPUT], after_sku=after):
+                yield from zip(table['sku'].to_pylist(), table[PRICE_OUTPUT].to_numpy().tolist())
+        return file_prices
+
+    def table_prices(after: Optional[str]) -> Iterator[Tuple[str, float]]:
+        last_sku, last_id = after, None
+        while True:
+            query = db.query(PriceItem.sku, PriceItem.id, PriceItem.outputs).filter(PriceItem.run_id == price_run.id)
+            if last_id is not None:
+                query = query.filter(or_(
+                    PriceItem.sku > last_sku,
+                    and_(PriceItem.sku == last_sku, PriceItem.id > last_id)
+                ))
+            elif last_sku is not None:
+                query = query.filter(PriceItem.sku > last_sku)
+            rows = query.order_by(PriceItem.sku, PriceItem.id).limit(chunk_size).all()
+            for row in rows:
+                yield row.sku, _price(row.outputs)
+            if len(rows) < chunk_size:
+                return
+            last_sku, last_id = rows[-1].sku, rows[-1].id
+    return table_prices
+
+
+def _unique(prices: Iterator[Tuple[str, float]]) -> Iterator[Tuple[str, float]]:
+    # SKUs repetidos en un run (vienen contiguos): vale el último
+    previous = None
+    for row in prices:
+        if previous is not None and row[0] != previous[0]:
+            yield previous
+        previous = row
+    if previous is not None:
+        yield previous
+
+
+def find_previous_run(db: Session, price_run: PriceRun) -> Optional[PriceRun]:
+    """Último run completado de la misma lista antes de `price_run` (o None)"""
+    query = db.query(PriceRun).filter(
+        PriceRun.list_id == price_run.list_id,
+        PriceRun.id != price_run.id,
+        PriceRun.status == "completed"
+    )
+    if price_run.completed_at is not None:
+        query = query.filter(PriceRun.completed_at < price_run.completed_at)
+    return query.order_by(PriceRun.completed_at.desc()).first()
+
+
+class RunDiff:
+    """Comparación de precios por SKU entre un run y un run anterior
+
+    Une ambos runs por sku recorriéndolos en orden, como un merge de dos
+    listas ordenadas: la memoria no depende del tamaño de los runs. Marca los
+    SKUs cuyo cambio de precio supera el umbral de QA por SKU; el cambio
+    global del surtido se compara con el umbral de QA global.
+    """
+
+    def __init__(self, prices: PriceSource, base_prices: PriceSource,
+                 base_run_id: Optional[str] = None,
+                 sku_threshold: Optional[float] = None, global_threshold: Optional[float] = None,
+                 summary: Optional[Dict[str, Any]] = None):
+        self.prices = prices
+        self.base_prices = base_prices
+        self.base_run_id = base_run_id
+        self.sku_threshold = settings.get_qa_sku_threshold() if sku_threshold is None else sku_threshold
+        self.global_threshold = settings.get_qa_global_threshold() if global_threshold is None else global_threshold
+        # Resumen ya calculado (ej. el guardado en el run), para no recorrer ambos runs
+        self._summary = summary
+
+    def rows(self, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Filas del diff (sku, precio_anterior, precio_nuevo, cambio, bloqueado) en orden de sku"""
+        new = _unique(self.prices(after))
+        old = _unique(self.base_prices(after))
+        current, previous = next(new, None), next(old, None)
+        while current is not None or previous is not None:
+            if previous is None or (current is not None and current[0] < previous[0]):
+                yield self._row(current[0], current[1], math.nan)
+                current = next(new, None)
+            elif current is None or previous[0] < current[0]:
+                yield self._row(previous[0], math.nan, previous[1])
+                previous = next(old, None)
+            else:
+                yield self._row(current[0], current[1], previous[1])
+                current, previous = next(new, None), next(old, None)
+
+    def _row(self, sku: str, current: float, previous: float) -> Dict[str, Any]:
+        change = (current - previous) / previous if previous > 0 else math.nan
+        return {
+            'sku': sku,
+            'precio_anterior': previous,
+            'precio_nuevo': current,
+            'cambio': change,
+            'bloqueado': not math.isnan(change) and abs(change) > self.sku_threshold,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Métricas del diff para el resumen del run (formato de PriceRun.resumen)"""
+        if self._summary is not None:
+            return self._summary
+
+        compared = change_sum = affected = blocked = new_skus = removed_skus = 0
+        total_previous = total_current = 0.0
+        for row in self.rows():
+            current, previous, change = row['precio_nuevo'], row['precio_anterior'], row['cambio']
+            new_skus += math.isnan(previous)
+            removed_skus += math.isnan(current)
+            blocked += row['bloqueado']
+            if not math.isnan(change):
+                compared += 1
+                change_sum += change
+                affected += abs(change) > _CHANGE_EPSILON
+                # Cambio global: SKUs presentes en ambos runs con precio anterior positivo
+                total_previous += previous
+                total_current += current
+
+        global_change = total_current / total_previous - 1 if total_previous else 0.0
+        self._summary = {
+            'run_anterior_id': self.base_run_id,
+            'cambio_promedio': change_sum / compared if compared else 0.0,
+            'cambio_global': global_change,
+            'skus_afectados': int(affected),
+            'skus_bloqueados_por_gate': int(blocked),
+            'skus_nuevos': int(new_skus),
+            'skus_eliminados': int(removed_skus),
+            'gate_global_superado': bool(abs(global_change) > self.global_threshold),
+            'umbral_sku': self.sku_threshold,
+            'umbral_global': self.global_threshold,
+        }
+        return self._summary
+
+    def page(self, after: Optional[str] = None, limit: int = 50,
+             solo_bloqueados: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Filas del diff ordenadas por sku a partir de un sku
+
+        Ambos runs se leen desde `after`, así el costo de una página no crece
+        con el número de página.
+
+        Args:
+            after: Último sku de la página anterior (None = primera página)
+            limit: Número máximo de filas
+            solo_bloqueados: Solo los SKUs que no pasan el gate
+
+        Returns:
+            Tupla (filas, hay más filas)
+        """
+        result = []
+        for row in self.rows(after):
+            if solo_bloqueados and not row['bloqueado']:
+                continue
+            if len(result) == limit:
+                return result, True
+            result.append({
+                **row,
+                'precio_anterior': _optional(row['precio_anterior']),
+                'precio_nuevo': _optional(row['precio_nuevo']),
+                'cambio': _optional(row['cambio']),
+            })
+        return result, False
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+class DiffSummaryCache:
+    """Cache LRU acotada de resúmenes de diffs ya calculados
+
+    Los runs completados no cambian: el resumen de un par de runs (con los
+    mismos umbrales) se calcula una vez y no en cada página del diff.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is not None:
+                self._entries.move_to_end(key)
+            return summary
+
+    def put(self, key: Tuple[Any, ...], summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Instancia global de la cache de resúmenes
+diff_summaries = DiffSummaryCache()
@@ -0,0 +1,372 @@
+import os
+import heapq
+import json
+import logging
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Sequence
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app.core.config import settings
+from app.db.models import PriceItem, generate_uuid
+from app.services.ruleset_compiler import OUTPUT_VARIABLES
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+# Carpeta del volumen con un archivo de resultados por run
+RESULTS_DIR = "results"
+
+# inputs/outputs/breakdown van como JSON (con codificación de diccionario y
+# compresión, el breakdown repetido por item ocupa poco); las salidas numéricas
+# además en columnas propias para leerlas sin decodificar el JSON
+RESULTS_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('sku', pa.string()),
+    ('input_hash', pa.string()),
+    ('inputs', pa.string()),
+    ('outputs', pa.string()),
+    ('breakdown', pa.string()),
+    ('created_at', pa.timestamp('us')),
+    *[(name, pa.float64()) for name in OUTPUT_VARIABLES],
+])
+
+_JSON_COLUMNS = ('inputs', 'outputs', 'breakdown')
+_COMPRESSION = 'zstd'
+
+# Orden de las filas en el archivo: el mismo de la paginación por cursor
+_SORT_KEYS = [('sku', 'ascending'), ('id', 'ascending')]
+_SORTED_METADATA = {b'sorted_by': b'sku,id'}
+
+
+def results_object_name(run_id: str) -> str:
+    """Nombre en el almacenamiento del archivo de resultados de un run"""
+    return f"{RESULTS_DIR}/{run_id}.parquet"
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class RunResultsWriter:
+    """Escritura de los resultados de un run en un archivo Parquet
+
+    Misma interfaz que PriceItemWriter. Cada chunk se ordena por (sku, id) y
+    se escribe como un row group de un archivo temporal; al cerrarse, los row
+    groups se mezclan (k-way merge, leyendo de a batches) en el archivo
+    final, así una página del run se ubica por búsqueda binaria. La memoria
+    queda acotada a unos pocos chunks a costa de escribir las filas dos veces
+    en disco. El archivo solo queda visible (renombrado) al terminar; si la
+    simulación falla, discard() lo borra, esté o no cerrado.
+    """
+
+    def __init__(self, run_id: str, chunk_size: Optional[int] = None):
+        self.run_id = run_id
+        self.object_name = results_object_name(run_id)
+        self.chunk_size = chunk_size or settings.get_price_item_chunk_size()
+        self.path = storage_service.resolve_path(self.object_name)
+        self.written = 0
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._runs_path = self.path.with_name(self.path.name + ".runs.tmp")
+        self._rows: Dict[str, List[Any]] = {name: [] for name in RESULTS_SCHEMA.names}
+        self._runs_writer: Optional[pq.ParquetWriter] = None
+
+    def add(self, sku: str, inputs: Dict[str, Any], outputs: Dict[str, Any],
+            breakdown: Dict[str, Any], input_hash: Optional[str] = None) -> None:
+        """Agrega un resultado; se escribe al completarse el chunk"""
+        rows = self._rows
+        rows['id'].append(generate_uuid())
+        rows['sku'].append(sku)
+        rows['input_hash'].append(input_hash)
+        rows['inputs'].append(json.dumps(inputs, default=str))
+        rows['outputs'].append(json.dumps(outputs, default=str))
+        rows['breakdown'].append(json.dumps(breakdown, default=str))
+        rows['created_at'].append(datetime.utcnow())
+        for name in OUTPUT_VARIABLES:
+            rows[name].append(_number(outputs.get(name)))
+        if len(rows['id']) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Escribe las filas pendientes, ordenadas, como un row group del archivo temporal"""
+        pending = len(self._rows['id'])
+        if not pending:
+            return
+        table = pa.Table.from_pydict(self._rows, schema=RESULTS_SCHEMA)
+        table = table.take(pc.sort_indices(table, sort_keys=_SORT_KEYS))
+        if self._runs_writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._runs_writer = pq.ParquetWriter(str(self._runs_path), RESULTS_SCHEMA, compression=_COMPRESSION)
+        self._runs_writer.write_table(table, row_group_size=pending)
+        self.written += pending
+        self._rows = {name: [] for name in RESULTS_SCHEMA.names}
+
+    def close(self) -> int:
+        """Mezcla los row groups ordenados, publica el archivo y retorna el total de filas"""
+        self.flush()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        schema = RESULTS_SCHEMA.with_metadata(_SORTED_METADATA)
+        with pq.ParquetWriter(str(self._tmp_path), schema, compression=_COMPRESSION) as writer:
+            if self._runs_writer is not None:
+                self._runs_writer.close()
+                self._runs_writer = None
+                self._merge_runs(writer)
+            else:
+                writer.write_table(schema.empty_table())
+        if self._runs_path.exists():
+            os.remove(self._runs_path)
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Resultados guardados: {self.path} - {self.written} items")
+        return self.written
+
+    def _merge_runs(self, writer: pq.ParquetWriter) -> None:
+        """Escribe las filas de todos los row groups en orden, en row groups de un chunk
+
+        Se lee un batch por row group; en cada ronda salen, ordenadas, todas
+        las filas con clave hasta la menor de las últimas claves de los row
+        groups que aún tienen filas por leer (ninguna fila pendiente puede ser
+        anterior) y el resto espera a la ronda siguiente.
+        """
+        source = pq.ParquetFile(str(self._runs_path), buffer_size=1 << 16)
+        num_runs = source.metadata.num_row_groups
+        # Entre todos los batches abiertos, del orden de un chunk en memoria
+        batch_size = max(256, self.chunk_size // num_runs)
+        batches = [source.iter_batches(batch_size=batch_size, row_groups=[i]) for i in range(num_runs)]
+        # Por row group: filas pendientes del batch actual y sus claves (sku, id)
+        buffers: List[Optional[pa.RecordBatch]] = [None] * num_runs
+        keys: List[List[tuple]] = [[] for _ in range(num_runs)]
+        exhausted = [False] * num_runs
+        output: List[pa.RecordBatch] = []
+        pending = 0
+
+        while True:
+            for i in range(num_runs):
+                if not exhausted[i] and not keys[i]:
+                    batch = next(batches[i], None)
+                    if batch is None:
+                        exhausted[i] = True
+                    else:
+                        buffers[i] = batch
+                        keys[i] = list(zip(batch.column('sku').to_pylist(), batch.column('id').to_pylist()))
+            active = [i for i in range(num_runs) if keys[i]]
+            if not active:
+                break
+
+            bounds = [keys[i][-1] for i in active if not exhausted[i]]
+            bound = min(bounds) if bounds else None
+            window = []
+            for i in active:
+                count = len(keys[i]) if bound is None else bisect_right(keys[i], bound)
+                if count:
+                    window.append(buffers[i].slice(0, count))
+                    buffers[i] = buffers[i].slice(count)
+                    del keys[i][:count]
+
+            window = pa.Table.from_batches(window, schema=RESULTS_SCHEMA)
+            output.extend(window.take(pc.sort_indices(window, sort_keys=_SORT_KEYS)).to_batches())
+            pending += window.num_rows
+            if pending >= self.chunk_size:
+                table = pa.Table.from_batches(output, schema=RESULTS_SCHEMA)
+                full = pending - pending % self.chunk_size
+                writer.write_table(table.slice(0, full), row_group_size=self.chunk_size)
+                output, pending = table.slice(full).to_batches(), pending - full
+        if pending:
+            writer.write_table(pa.Table.from_batches(output, schema=RESULTS_SCHEMA))
+
+    def discard(self) -> None:
+        """Descarta el archivo, en construcción o ya publicado"""
+        self._rows = {name: [] for name in RESULTS_SCHEMA.names}
+        if self._runs_writer is not None:
+            self._runs_writer.close()
+            self._runs_writer = None
+        for path in (self._runs_path, self._tmp_path, self.path):
+            if path.exists():
+                os.remove(path)
+
+
+class RunResultsFile:
+    """Lectura de los resultados de un run guardados en Parquet
+
+    El archivo se abre con memory-mapping y se leen solo las columnas y los
+    row groups necesarios.
+    """
+
+    def __init__(self, object_name: str):
+        self.object_name = object_name
+        self.path = storage_service.resolve_path(object_name)
+        self._file: Optional[pq.ParquetFile] = None
+        self._hash_rows: Optional[Dict[str, int]] = None
+
+    @property
+    def parquet_file(self) -> pq.ParquetFile:
+        if self._file is None:
+            if not self.path.exists():
+                raise ValueError(f"Archivo de resultados no encontrado: {self.object_name}")
+            self._file = pq.ParquetFile(pa.memory_map(str(self.path)))
+        return self._file
+
+    @property
+    def num_rows(self) -> int:
+        return self.parquet_file.metadata.num_rows
+
+    def read_columns(self, columns: Sequence[str]) -> pa.Table:
+        """Lee columnas completas (ej. sku y precio_publico para comparar runs)"""
+        return self.parquet_file.read(columns=list(columns))
+
+    @property
+    def is_sorted(self) -> bool:
+        """Si las filas están ordenadas por (sku, id) (archivos escritos por RunResultsWriter)"""
+        metadata = self.parquet_file.schema_arrow.metadata or {}
+        return metadata.get(b'sorted_by') == _SORTED_METADATA[b'sorted_by']
+
+    def page(self, run_id: str, after: Optional[Sequence[str]], limit: int) -> List[PriceItem]:
+        """
+        Items de una página ordenada por (sku, id)
+
+        Args:
+            run_id: ID del price run
+            after: (sku, id) de la última fila de la página anterior, o None
+            limit: Número máximo de items
+
+        Returns:
+            Hasta `limit` PriceItems (no asociados a la sesión)
+        """
+        if not self.is_sorted:
+            return self._page_unsorted(run_id, after, limit)
+        start = self._position_after(tuple(after)) if after else 0
+        rows = np.arange(start, min(start + limit, self.num_rows), dtype=np.int64)
+        return self._to_price_items(run_id, self._take(rows))
+
+    def _position_after(self, key: tuple) -> int:
+        """
+        Posición de la primera fila posterior a `key`: (sku, id) o solo (sku,)
+
+        Las estadísticas de sku de cada row group descartan los anteriores sin
+        leerlos; dentro del row group candidato se hace búsqueda binaria.
+        """
+        metadata = self.parquet_file.metadata
+        sku_column = RESULTS_SCHEMA.get_field_index('sku')
+        columns = ['sku', 'id'][:len(key)]
+        start = 0
+        for i in range(metadata.num_row_groups):
+            group = metadata.row_group(i)
+            stats = group.column(sku_column).statistics
+            if stats is not None and stats.has_min_max and stats.max < key[0]:
+                start += group.num_rows
+                continue
+            keys = self.parquet_file.read_row_group(i, columns=columns)
+            rows = list(zip(*(keys[column].to_pylist() for column in columns)))
+            position = bisect_right(rows, key)
+            if position < len(rows):
+                return start + position
+            start += group.num_rows
+        return start
+
+    def _page_unsorted(self, run_id: str, after: Optional[Sequence[str]], limit: int) -> List[PriceItem]:
+        # Archivos sin ordenar: se ordenan las claves completas en cada página
+        keys = self.read_columns(['sku', 'id'])
+        keys = keys.append_column('row', pa.array(np.arange(keys.num_rows, dtype=np.int64)))
+        if after:
+            last_sku, last_id = after
+            keys = keys.filter(pc.or_kleene(
+                pc.greater(keys['sku'], last_sku),
+                pc.and_kleene(pc.equal(keys['sku'], last_sku), pc.greater(keys['id'], last_id))
+            ))
+        order = pc.sort_indices(keys, sort_keys=_SORT_KEYS)
+        rows = keys['row'].take(order[:limit]).to_numpy()
+        return self._to_price_items(run_id, self._take(rows))
+
+    def iter_sorted(self, columns: Sequence[str], after_sku: Optional[str] = None) -> Iterator[pa.Table]:
+        """
+        Columnas de las filas en orden (sku, id), de a un row group por vez
+
+        Args:
+            columns: Columnas a leer
+            after_sku: Empezar en el primer sku posterior a este (None = desde el principio)
+
+        Returns:
+            Iterador de tablas, una por row group leído
+        """
+        if not self.is_sorted:
+            # Archivos sin ordenar: se ordenan completos
+            table = self.read_columns(list(dict.fromkeys([*columns, 'sku', 'id'])))
+            table = table.take(pc.sort_indices(table, sort_keys=_SORT_KEYS))
+            if after_sku is not None:
+                table = table.filter(pc.greater(table['sku'], after_sku))
+            yield table.select(list(columns))
+            return
+
+        start = self._position_after((after_sku,)) if after_sku is not None else 0
+        metadata = self.parquet_file.metadata
+        offset = 0
+        for i in range(metadata.num_row_groups):
+            rows = metadata.row_group(i).num_rows
+            if offset + rows > start:
+                table = self.parquet_file.read_row_group(i, columns=list(columns))
+                yield table.slice(max(0, start - offset))
+            offset += rows
+
+    def iter_items(self, run_id: str) -> Iterator[PriceItem]:
+        """Recorre todos los items del run, de a un row group por vez"""
+        for i in range(self.parquet_file.num_row_groups):
+            yield from self._to_price_items(run_id, self.parquet_file.read_row_group(i))
+
+    def lookup(self, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resultados (outputs y breakdown) por huella de inputs
+
+        Args:
+            hashes: Huellas buscadas
+
+        Returns:
+            Diccionario huella -> resultado, solo con las huellas presentes
+        """
+        if self._hash_rows is None:
+            column = self.read_columns(['input_hash'])['input_hash'].to_pylist()
+            self._hash_rows = {value: row for row, value in enumerate(column) if value is not None}
+
+        found = {value: self._hash_rows[value] for value in set(hashes) if value in self._hash_rows}
+        if not found:
+            return {}
+        table = self._take(np.fromiter(found.values(), dtype=np.int64, count=len(found)),
+                           columns=['input_hash', 'outputs', 'breakdown'])
+        return {
+            row['input_hash']: {'outputs': json.loads(row['outputs']), 'breakdown': json.loads(row['breakdown'])}
+            for row in table.to_pylist()
+        }
+
+    def _take(self, rows: np.ndarray, columns: Optional[List[str]] = None) -> pa.Table:
+        """Filas por posición, en el orden pedido, leyendo solo sus row groups"""
+        if not len(rows):
+            return RESULTS_SCHEMA.empty_table().select(columns or RESULTS_SCHEMA.names)
+
+        metadata = self.parquet_file.metadata
+        starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        groups = np.searchsorted(starts, rows, side='right') - 1
+        needed = sorted(set(groups.tolist()))
+        table = self.parquet_file.read_row_groups(needed, columns=columns)
+
+        # Posición de cada fila dentro de la tabla de los row groups leídos
+        offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in needed[:-1]])
+        group_offset = dict(zip(needed, offsets.tolist()))
+        local = rows - starts[groups] + np.array([group_offset[group] for group in groups.tolist()])
+        return table.take(pa.array(local, type=pa.int64()))
+
+    def _to_price_items(self, run_id: str, table: pa.Table) -> List[PriceItem]:
+        items = []
+        for row in table.select(['id', 'sku', *_JSON_COLUMNS, 'input_hash', 'created_at']).to_pylist():
+            items.append(PriceItem(
+                id=row['id'],
+                run_id=run_id,
+                sku=row['sku'],
+                inputs=json.loads(row['inputs']),
+                outputs=json.loads(row['outputs']),
+                breakdown=json.loads(row['breakdown']),
+                input_hash=row['input_hash'],
+                created_at=row['created_at']
+            ))
+        return items
@@ -0,0 +1,250 @@
+import math
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+
+# Límites del histograma de markup; se agregan los intervalos abiertos en los extremos
+MARKUP_BINS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0)
+
+# Percentiles estimados en streaming para las métricas globales
+PERCENTILES = (0.05, 0.50, 0.95)
+
+# Grupos distintos por desglose (marca, línea); el resto se acumula en "otros"
+MAX_GROUPS = 100
+OTHER_GROUP = "otros"
+
+
+class QuantileSketch:
+    """Sketch de cuantiles en streaming con memoria acotada (compactores tipo KLL)
+
+    Cada nivel guarda hasta `capacity` valores; al llenarse se ordena y se
+    promueve uno de cada dos valores al nivel siguiente, donde cada valor pesa
+    el doble. Mientras no haya compactaciones los cuantiles son exactos.
+    """
+
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self.levels: List[np.ndarray] = []
+        self._offset = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        level = 0
+        while len(values):
+            if len(self.levels) <= level:
+                self.levels.append(np.empty(0, dtype=float))
+            buffer = np.concatenate((self.levels[level], values))
+            if len(buffer) <= self.capacity:
+                self.levels[level] = buffer
+                return
+            # Compactar: ordenar y promover la mitad (alternando pares/impares
+            # para que los errores de rango se compensen)
+            buffer.sort()
+            if len(buffer) % 2:
+                self.levels[level], buffer = buffer[-1:], buffer[:-1]
+            else:
+                self.levels[level] = np.empty(0, dtype=float)
+            values = buffer[self._offset::2]
+            self._offset ^= 1
+            level += 1
+
+    def quantile(self, p: float) -> Optional[float]:
+        sizes = [len(values) for values in self.levels]
+        if not any(sizes):
+            return None
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(size, 2.0 ** level) for level, size in enumerate(sizes)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        rank = max(p * cumulative[-1], weights[order][0])
+        return float(values[order][np.searchsorted(cumulative, rank)])
+
+
+class StreamingStat:
+    """Cantidad, media y desvío, mínimo, máximo y percentiles en una pasada
+
+    Los valores llegan por chunks; media y varianza se combinan con la fórmula
+    de Welford para lotes (Chan et al.), sin guardar las observaciones.
+    """
+
+    def __init__(self, percentiles: Tuple[float, ...] = ()):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.percentiles = percentiles
+        self._sketch = QuantileSketch() if percentiles else None
+
+    def extend(self, values: np.ndarray) -> None:
+        """Agrega un chunk de valores; se ignoran NaN e infinitos"""
+        values = values[np.isfinite(values)]
+        n = len(values)
+        if not n:
+            return
+
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(np.square(values - chunk_mean).sum())
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self._sketch is not None:
+            self._sketch.extend(values)
+
+    def result(self) -> Dict[str, Any]:
+        if not self.count:
+            return {'count': 0}
+        result = {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0,
+            'min': self.min,
+            'max': self.max,
+        }
+        for p in self.percentiles:
+            result[f"p{int(round(p * 100))}"] = self._sketch.quantile(p)
+        return result
+
+
+class Histogram:
+    """Conteos por intervalo [desde, hasta) con límites fijos"""
+
+    def __init__(self, edges: Tuple[float, ...] = MARKUP_BINS):
+        self.edges = edges
+        self.counts = np.zeros(len(edges) + 1, dtype=np.int64)
+
+    def extend(self, values: np.ndarray) -> None:
+        values = values[np.isfinite(values)]
+        bins = np.searchsorted(self.edges, values, side='right')
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def result(self) -> List[Dict[str, Any]]:
+        bounds = [None, *self.edges, None]
+        return [
+            {'desde': bounds[i], 'hasta': bounds[i + 1], 'items': int(count)}
+            for i, count in enumerate(self.counts)
+        ]
+
+
+class _GroupStats:
+    __slots__ = ('items', 'markup', 'rentabilidad')
+
+    def __init__(self):
+        self.items = 0
+        self.markup = StreamingStat()
+        self.rentabilidad = StreamingStat()
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'items': self.items,
+            'margen_promedio': self.markup.mean if self.markup.count else 0,
+            'margen_min': self.markup.min if self.markup.count else None,
+            'margen_max': self.markup.max if self.markup.count else None,
+            'rentabilidad_promedio': self.rentabilidad.mean if self.rentabilidad.count else 0,
+        }
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def _column(outputs_list: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.fromiter(
+        (_number(outputs.get(key)) if outputs else math.nan for outputs in outputs_list),
+        dtype=float, count=len(outputs_list)
+    )
+
+
+class RunStatistics:
+    """Resumen de una simulación acumulado por chunks, en una pasada y memoria acotada"""
+
+    def __init__(self):
+        self.total_items = 0
+        self.markup = StreamingStat(PERCENTILES)
+        self.rentabilidad = StreamingStat(PERCENTILES)
+        self.precio_publico = StreamingStat(PERCENTILES)
+        self.histograma_markup = Histogram()
+        self.por_marca: Dict[str, _GroupStats] = {}
+        self.por_linea: Dict[str, _GroupStats] = {}
+
+    def add(self, outputs: Dict[str, Any], marca: Optional[str] = None, linea: Optional[str] = None) -> None:
+        """Agrega los outputs de un item (y su marca/línea para los desgloses)"""
+        self.add_batch([outputs], [marca], [linea])
+
+    def add_batch(self, outputs_list: List[Dict[str, Any]],
+                  marcas: Optional[List[Optional[str]]] = None,
+                  lineas: Optional[List[Optional[str]]] = None) -> None:
+        """
+        Agrega los outputs de un chunk de items
+
+        Args:
+            outputs_list: Outputs de cada item
+            marcas: Marca de cada item (opcional, para el desglose)
+            lineas: Línea de cada item (opcional, para el desglose)
+        """
+        if not outputs_list:
+            return
+        self.total_items += len(outputs_list)
+
+        markups = _column(outputs_list, 'markup')
+        rentabilidades = _column(outputs_list, 'rentabilidad')
+        self.markup.extend(markups)
+        self.rentabilidad.extend(rentabilidades)
+        self.precio_publico.extend(_column(outputs_list, 'precio_publico'))
+        self.histograma_markup.extend(markups)
+
+        for groups, keys in ((self.por_marca, marcas), (self.por_linea, lineas)):
+            if keys is None:
+                continue
+            rows_by_key: Dict[Any, List[int]] = {}
+            for i, key in enumerate(keys):
+                rows_by_key.setdefault(key, []).append(i)
+            for key, rows in rows_by_key.items():
+                group = self._group(groups, key)
+                group.items += len(rows)
+                group.markup.extend(markups[rows])
+                group.rentabilidad.extend(rentabilidades[rows])
+
+    def _group(self, groups: Dict[str, _GroupStats], key: Optional[str]) -> _GroupStats:
+        key = key or "sin_dato"
+        group = groups.get(key)
+        if group is None:
+            if len(groups) >= MAX_GROUPS - 1:
+                key = OTHER_GROUP
+                group = groups.get(key)
+            if group is None:
+                group = groups[key] = _GroupStats()
+        return group
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen del run (formato de PriceRun.resumen)"""
+        if not self.total_items:
+            return {}
+
+        # Sin run anterior para comparar: todos los SKUs son nuevos y ninguno se
+        # bloquea; el simulador reemplaza estos valores con los del diff (RunDiff)
+        skus_bloqueados = 0
+        skus_afectados = self.total_items
+        cambio_promedio = 0.0
+
+        return {
+            'total_items': self.total_items,
+            'cambio_promedio': cambio_promedio,
+            'skus_afectados': skus_afectados,
+            'skus_bloqueados_por_gate': skus_bloqueados,
+            'margen_promedio': self.markup.mean if self.markup.count else 0,
+            'rentabilidad_promedio': self.rentabilidad.mean if self.rentabilidad.count else 0,
+            'estadisticas': {
+                'markup': self.markup.result(),
+                'rentabilidad': self.rentabilidad.result(),
+                'precio_publico': self.precio_publico.result(),
+                'histograma_markup': self.histograma_markup.result(),
+                'por_marca': {key: group.result() for key, group in self.por_marca.items()},
+                'por_linea': {key: group.result() for key, group in self.por_linea.items()},
+            }
+        }
@@ -0,0 +1,109 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Optional
+from app.core.config import settings
+from app.services.rules_engine import RulesEngine
+from app.services.ruleset_compiler import CompiledRuleset, compile_ruleset
+
+logger = logging.getLogger(__name__)
+
+# Rulesets compilados dentro de cada proceso worker, por huella
+_worker_rulesets: Dict[str, CompiledRuleset] = {}
+_WORKER_CACHE_SIZE = 8
+
+
+def _mp_context():
+    # Sin fork: el servidor tiene threads (jobs, pool de SQLAlchemy, logging) y un
+    # hijo forkeado heredaría sus locks tomados y los sockets de la base
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _price_shard(fingerprint: str, ruleset_config: Dict[str, Any],
+                 items_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Evalúa un shard de items dentro de un proceso worker
+
+    Recibe solo datos planos (huella, configuración JSON del ruleset y dicts de
+    items); el ruleset se compila en el worker y queda cacheado por huella.
+    """
+    compiled = _worker_rulesets.get(fingerprint)
+    if compiled is None:
+        if len(_worker_rulesets) >= _WORKER_CACHE_SIZE:
+            _worker_rulesets.clear()
+        compiled = compile_ruleset(ruleset_config)
+        _worker_rulesets[fingerprint] = compiled
+    return RulesEngine().calculate_pricing_batch(items_data, compiled)
+
+
+class ShardedPricer:
+    """Reparte la evaluación de listas grandes en shards sobre un pool de procesos"""
+
+    def __init__(self, workers: int, shard_size: int, threshold: int):
+        self.workers = workers
+        self.shard_size = shard_size
+        self.threshold = threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def should_shard(self, total_items: int) -> bool:
+        """Indica si una lista de este tamaño se procesa en paralelo"""
+        return self.workers > 1 and total_items >= self.threshold and total_items > self.shard_size
+
+    def price(self, compiled: CompiledRuleset, items_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Calcula el pricing de todos los items repartiéndolos en shards
+
+        Args:
+            compiled: Ruleset compilado
+            items_data: Datos de entrada de los items
+
+        Returns:
+            Resultados en el mismo orden que items_data
+        """
+        shards = [
+            items_data[start:start + self.shard_size]
+            for start in range(0, len(items_data), self.shard_size)
+        ]
+        # Configuración como dict plano: el MappingProxyType del plan no se serializa
+        config = dict(compiled.config)
+
+        try:
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_price_shard, compiled.fingerprint, config, shard)
+                for shard in shards
+            ]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+        except BrokenProcessPool as e:
+            logger.error(f"Pool de simulación caído, procesando en el proceso actual: {e}")
+            self.shutdown()
+            return RulesEngine().calculate_pricing_batch(items_data, compiled)
+
+        logger.info(f"Simulación en paralelo: {len(items_data)} items en {len(shards)} shards")
+        return results
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+            return self._executor
+
+
+# Instancia global del pool de simulación
+sharded_pricer = ShardedPricer(
+    workers=settings.get_simulation_workers(),
+    shard_size=settings.get_simulation_shard_size(),
+    threshold=settings.get_simulation_parallel_threshold()
+)
@@ -1,170 +1,366 @@
+import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import numpy as np
+from itertools import product
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
-from app.db.models import PriceRun, PriceItem, NormalizedItem, Ruleset
+from app.db.models import PriceRun, PriceItem, NormalizedItem
 from app.services.rules_engine import RulesEngine
+from app.services.ruleset_cache import ruleset_cache
+from app.services.ruleset_compiler import CompiledRuleset, compile_sweep
+from app.services.batch_engine import evaluate_grid
+from app.core.config import settings
+from app.services.sharding import sharded_pricer
+from app.services.price_item_writer import PriceItemWriter
+from app.services.run_results import RunResultsFile, RunResultsWriter
+from app.services.run_diff import DIFF_SUMMARY_KEYS, RunDiff, diff_summaries, find_previous_run, run_prices
+from app.services.storage import storage_service
+from app.services.run_stats import RunStatistics
+from app.services.breakdown import compact_breakdown, expand_breakdown, run_constants
+from app.utils.pagination import encode_cursor, decode_cursor, paginate_newest_first
 
 logger = logging.getLogger(__name__)
 
+# Huellas por consulta al buscar resultados del run base (límite de parámetros)
+_BASE_LOOKUP_BATCH = 500
+
+
+def item_input_hash(item_data: Dict[str, Any], fingerprint: str) -> str:
+    """Huella de los inputs de un item junto con la versión del ruleset"""
+    payload = json.dumps([fingerprint, item_data], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class _SweepTotals:
+    """Métricas de cada combinación de un barrido, acumuladas chunk a chunk de items"""
+
+    def __init__(self, combinations: int, umbral_rentabilidad: float):
+        self.umbral_rentabilidad = umbral_rentabilidad
+        self.total_items = 0
+        self._precio = np.zeros(combinations)
+        self._markup = np.zeros(combinations)
+        self._rentabilidad = np.zeros(combinations)
+        self._rentabilidad_minima = np.full(combinations, np.inf)
+        self._bajo_umbral = np.zeros(combinations, dtype=np.int64)
+
+    def add(self, start: int, outputs: Dict[str, np.ndarray]) -> None:
+        """Suma un bloque de combinaciones (desde `start`) evaluado sobre un chunk de items"""
+        rentabilidades = outputs['rentabilidad']
+        block = slice(start, start + rentabilidades.shape[0])
+        if start == 0:
+            self.total_items += rentabilidades.shape[1]
+        self._precio[block] += outputs['precio_publico'].sum(axis=1)
+        self._markup[block] += outputs['markup'].sum(axis=1)
+        self._rentabilidad[block] += rentabilidades.sum(axis=1)
+        self._rentabilidad_minima[block] = np.minimum(self._rentabilidad_minima[block], rentabilidades.min(axis=1))
+        self._bajo_umbral[block] += (rentabilidades < self.umbral_rentabilidad).sum(axis=1)
+
+    def summary(self, i: int) -> Dict[str, Any]:
+        """Resumen de una combinación"""
+        total = self.total_items
+        return {
+            'total_items': total,
+            'precio_promedio': float(self._precio[i] / total),
+            'margen_promedio': float(self._markup[i] / total),
+            'rentabilidad_promedio': float(self._rentabilidad[i] / total),
+            'rentabilidad_minima': float(self._rentabilidad_minima[i]),
+            'skus_bajo_umbral': int(self._bajo_umbral[i])
+        }
+
+
 class PricingSimulator:
     """Servicio para ejecutar simulaciones de pricing"""
     
     def __init__(self):
         self.rules_engine = RulesEngine()
     
-    def run_simulation(self, db: Session, tenant_id: str, list_id: str, ruleset_id: str) -> PriceRun:
+    def run_simulation(self, db: Session, tenant_id: str, list_id: str, ruleset_id: str,
+                       base_run_id: Optional[str] = None, run_id: Optional[str] = None,
+                       progress: Optional[Callable[[int, int], None]] = None) -> PriceRun:
         """
         Ejecuta una simulación de pricing
         
+        Si se indica un run base, los items cuyos inputs (y versión del ruleset)
+        no cambiaron reutilizan su resultado y solo se evalúan los modificados.
+        
         Args:
             db: Sesión de base de datos
             tenant_id: ID del tenant
             list_id: ID de la lista de precios
             ruleset_id: ID del ruleset
+            base_run_id: ID de un run completado a reutilizar (opcional)
+            run_id: ID de un price run ya creado (ej. encolado); si no, se crea uno
+            progress: Callback (items procesados, items totales) tras cada chunk
             
         Returns:
             PriceRun con los resultados
         """
+        price_run = None
+        writer = None
         try:
-            # Crear el price run
-            price_run = PriceRun(
-                list_id=list_id,
-                ruleset_id=ruleset_id,
-                status="running"
-            )
-            db.add(price_run)
+            if run_id:
+                price_run = db.query(PriceRun).filter(PriceRun.id == run_id).first()
+                if not price_run:
+                    raise ValueError(f"Price run no encontrado: {run_id}")
+                price_run.status = "running"
+            else:
+                # Crear el price run
+                price_run = PriceRun(
+                    tenant_id=tenant_id,
+                    list_id=list_id,
+                    ruleset_id=ruleset_id,
+                    status="running"
+                )
+                db.add(price_run)
             db.commit()
             db.refresh(price_run)
             
-            # Obtener el ruleset
-            ruleset = db.query(Ruleset).filter(Ruleset.id == ruleset_id).first()
-            if not ruleset:
-                raise ValueError(f"Ruleset no encontrado: {ruleset_id}")
-            
-            # Cargar el ruleset en el motor
-            if not self.rules_engine.load_ruleset(ruleset.config):
-                raise ValueError("Error cargando ruleset")
+            # Obtener el ruleset compilado (cacheado por id y versión)
+            compiled = ruleset_cache.get(db, ruleset_id)
+            base_file = self._check_base_run(db, base_run_id) if base_run_id else None
             
-            # Obtener items normalizados
-            items = db.query(NormalizedItem).filter(NormalizedItem.list_id == list_id).all()
-            if not items:
+            total_items = db.query(func.count(NormalizedItem.id)).filter(NormalizedItem.list_id == list_id).scalar()
+            if not total_items:
                 raise ValueError(f"No se encontraron items para la lista: {list_id}")
             
-            # Procesar cada item
-            price_items = []
-            for item in items:
-                price_item = self._process_item(item, price_run.id)
-                price_items.append(price_item)
+            # Listas grandes: se decide una vez por run (por el total de la lista) y
+            # cada chunk alcanza para repartir en shards sobre el pool de procesos
+            shard = sharded_pricer.should_shard(total_items)
+            if shard:
+                chunk_size = sharded_pricer.workers * sharded_pricer.shard_size
+            else:
+                chunk_size = settings.get_price_item_chunk_size()
             
-            # Guardar price items
-            db.add_all(price_items)
+            # Leer los items con un cursor del servidor, de a un chunk por vez: la
+            # memoria queda acotada al chunk sin importar el largo de la lista
+            stmt = self._items_statement(list_id, chunk_size)
             
-            # Calcular resumen
-            summary = self._calculate_summary(price_items)
+            # Los valores comunes a todos los items se guardan una vez en el run
+            constants = run_constants(compiled)
+            writer = self._results_writer(db, price_run.id)
+            stats = RunStatistics()
+            reused = 0
+            if progress:
+                progress(0, total_items)
+            for rows in db.execute(stmt).partitions():
+                reused += self._simulate_chunk(
+                    db, compiled, rows, writer, stats, base_run_id, base_file, constants, shard
+                )
+                if progress:
+                    progress(stats.total_items, total_items)
+            total_written = writer.close()
+            if isinstance(writer, RunResultsWriter):
+                price_run.results_file = writer.object_name
+            
+            # Calcular resumen, con el diff y los QA gates contra el run anterior de
+            # la lista: ambos runs se leen ya guardados, en orden de sku
+            summary = stats.summary()
+            previous_run = find_previous_run(db, price_run)
+            if previous_run is not None:
+                diff = RunDiff(run_prices(db, price_run), run_prices(db, previous_run), base_run_id=previous_run.id)
+                summary.update(diff.summary())
+            if base_run_id:
+                summary['base_run_id'] = base_run_id
+                summary['items_reutilizados'] = reused
+                summary['items_recalculados'] = total_written - reused
             price_run.resumen = summary
+            price_run.items_count = total_written
+            price_run.breakdown_constants = constants
             price_run.status = "completed"
             price_run.completed_at = datetime.utcnow()
             
             db.commit()
             db.refresh(price_run)
             
-            logger.info(f"Simulación completada: {price_run.id} - {len(price_items)} items")
+            logger.info(f"Simulación completada: {price_run.id} - {total_written} items")
             return price_run
             
         except Exception as e:
             logger.error(f"Error en simulación: {e}")
-            if 'price_run' in locals():
+            if price_run is not None:
+                # Descartar los resultados ya escritos de la simulación fallida
+                if writer is not None:
+                    writer.discard()
+                db.rollback()
                 price_run.status = "failed"
+                price_run.resumen = {"error": str(e)}
                 db.commit()
             raise
     
-    def _process_item(self, item: NormalizedItem, run_id: str) -> PriceItem:
+    def run_sweep(self, db: Session, tenant_id: str, list_id: str, ruleset_id: str,
+                  grid: Dict[str, List[Any]], umbral_rentabilidad: float = 0.0) -> List[Dict[str, Any]]:
         """
-        Procesa un item individual con el motor de reglas
+        Evalúa todas las combinaciones de una grilla de parámetros sobre una lista
+        
+        No crea price runs ni price items: solo retorna un resumen por combinación.
         
         Args:
-            item: Item normalizado
-            run_id: ID del price run
+            db: Sesión de base de datos
+            tenant_id: ID del tenant
+            list_id: ID de la lista de precios
+            ruleset_id: ID del ruleset
+            grid: Valores a probar por parámetro (globals o pasos `value`)
+            umbral_rentabilidad: Rentabilidad por debajo de la cual se cuenta un SKU
             
         Returns:
-            PriceItem con los resultados
+            Lista de {'globals': combinación, 'resumen': métricas}
+            
+        Raises:
+            ValueError: Si la grilla es inválida o no hay items
         """
-        # Preparar datos de entrada
-        item_data = {
-            'sku': item.sku,
-            'marca': item.marca,
-            'linea': item.linea,
-            'base_price': item.base_price,
-            'cost': item.cost,
-            **item.attrs
-        }
+        if not grid or any(not values for values in grid.values()):
+            raise ValueError("La grilla debe tener al menos un valor por parámetro")
         
-        # Ejecutar motor de reglas
-        result = self.rules_engine.calculate_pricing(item_data)
+        keys = list(grid)
+        combinations = [dict(zip(keys, values)) for values in product(*grid.values())]
+        max_combinations = settings.get_sweep_max_combinations()
+        if len(combinations) > max_combinations:
+            raise ValueError(f"La grilla tiene {len(combinations)} combinaciones (máximo {max_combinations})")
         
-        # Extraer outputs y breakdown
-        outputs = result.get('outputs', {})
-        breakdown = result.get('breakdown', {})
+        compiled = compile_sweep(ruleset_cache.get(db, ruleset_id).config, keys)
         
-        # Crear price item
-        price_item = PriceItem(
-            run_id=run_id,
-            sku=item.sku,
-            inputs=item_data,
-            outputs=outputs,
-            breakdown=breakdown
-        )
+        # Los items se leen de a un chunk con un cursor del servidor y cada chunk se
+        # evalúa para todas las combinaciones, acumulando las métricas por combinación
+        totals = _SweepTotals(len(combinations), umbral_rentabilidad)
+        cells = settings.get_sweep_chunk_cells()
+        stmt = self._items_statement(list_id, settings.get_price_item_chunk_size())
+        for rows in db.execute(stmt).partitions():
+            items_data = [self._build_item_data(row) for row in rows]
+            # Varias combinaciones por pasada, acotando la memoria a items x combinaciones
+            chunk = max(1, cells // len(items_data))
+            for start in range(0, len(combinations), chunk):
+                block = combinations[start:start + chunk]
+                totals.add(start, evaluate_grid(compiled, items_data, block))
+        if not totals.total_items:
+            raise ValueError(f"No se encontraron items para la lista: {list_id}")
         
-        return price_item
+        logger.info(f"Barrido completado: {len(combinations)} combinaciones x {totals.total_items} items")
+        return [
+            {'globals': combination, 'resumen': totals.summary(i)}
+            for i, combination in enumerate(combinations)
+        ]
+    
+    def _items_statement(self, list_id: str, chunk_size: int):
+        """Consulta de los items de una lista leída de a chunk_size filas (cursor del servidor)"""
+        return select(
+            NormalizedItem.sku, NormalizedItem.marca, NormalizedItem.linea,
+            NormalizedItem.base_price, NormalizedItem.cost, NormalizedItem.attrs
+        ).where(NormalizedItem.list_id == list_id).execution_options(yield_per=chunk_size)
+    
+    def _results_writer(self, db: Session, run_id: str) -> Union[PriceItemWriter, RunResultsWriter]:
+        """Escritura de resultados según RESULTS_STORAGE (tabla o archivo columnar)"""
+        if settings.get_results_storage() == "parquet":
+            return RunResultsWriter(run_id)
+        return PriceItemWriter(db, run_id)
     
-    def _calculate_summary(self, price_items: List[PriceItem]) -> Dict[str, Any]:
+    def _simulate_chunk(self, db: Session, compiled: CompiledRuleset, rows: List[Any],
+                        writer: Union[PriceItemWriter, RunResultsWriter], stats: RunStatistics,
+                        base_run_id: Optional[str], base_file: Optional[RunResultsFile] = None,
+                        constants: Optional[Dict[str, Any]] = None, shard: bool = False) -> int:
         """
-        Calcula el resumen de la simulación
+        Evalúa y escribe un chunk de items
         
         Args:
-            price_items: Lista de price items
+            db: Sesión de base de datos
+            compiled: Ruleset compilado de la simulación
+            rows: Filas de items normalizados del chunk
+            writer: Escritura masiva de los resultados
+            stats: Estadísticas en curso de la simulación
+            base_run_id: ID del run base a reutilizar (opcional)
+            base_file: Archivo de resultados del run base, si no está en la tabla
+            constants: Constantes del run a quitar de cada breakdown (opcional)
+            shard: Repartir los items pendientes en shards sobre el pool de procesos
+                (decidido por el tamaño total de la lista)
             
         Returns:
-            Diccionario con el resumen
-        """
-        if not price_items:
-            return {}
-        
-        # Calcular métricas básicas
-        total_items = len(price_items)
-        margenes = []
-        rentabilidades = []
-        
-        for item in price_items:
-            outputs = item.outputs
-            if outputs:
-                if 'markup' in outputs:
-                    margenes.append(outputs['markup'])
-                if 'rentabilidad' in outputs:
-                    rentabilidades.append(outputs['rentabilidad'])
-        
-        # Calcular promedios
-        margen_promedio = sum(margenes) / len(margenes) if margenes else 0
-        rentabilidad_promedio = sum(rentabilidades) / len(rentabilidades) if rentabilidades else 0
-        
-        # QA Gates (simplificado por ahora)
-        skus_bloqueados = 0
-        skus_afectados = total_items  # Por defecto, todos están afectados
-        
-        # Calcular cambio promedio (simplificado)
-        cambio_promedio = 0.0  # Esto se calcularía comparando con versión anterior
-        
-        summary = {
-            'total_items': total_items,
-            'cambio_promedio': cambio_promedio,
-            'skus_afectados': skus_afectados,
-            'skus_bloqueados_por_gate': skus_bloqueados,
-            'margen_promedio': margen_promedio,
-            'rentabilidad_promedio': rentabilidad_promedio
-        }
+            Cantidad de items reutilizados del run base
+        """
+        items_data = [self._build_item_data(row) for row in rows]
+        hashes = [item_input_hash(item_data, compiled.fingerprint) for item_data in items_data]
         
-        return summary
+        # Resultados reutilizables del run base, por huella de inputs
+        previous = self._load_base_results(db, base_run_id, hashes, base_file) if base_run_id else {}
+        pending_data = [
+            item_data for item_data, input_hash in zip(items_data, hashes)
+            if input_hash not in previous
+        ]
+        
+        # Evaluar el ruleset sobre los items pendientes: en un único lote o, en
+        # listas grandes, repartidos en shards si alcanzan para más de uno
+        if shard and len(pending_data) > sharded_pricer.shard_size:
+            fresh = iter(sharded_pricer.price(compiled, pending_data))
+        else:
+            fresh = iter(self.rules_engine.calculate_pricing_batch(pending_data, compiled))
+        
+        outputs_list = []
+        for row, item_data, input_hash in zip(rows, items_data, hashes):
+            result = previous[input_hash] if input_hash in previous else next(fresh)
+            outputs = result.get('outputs', {})
+            breakdown = compact_breakdown(result.get('breakdown', {}), constants)
+            writer.add(row.sku, item_data, outputs, breakdown, input_hash)
+            outputs_list.append(outputs)
+        stats.add_batch(outputs_list, [row.marca for row in rows], [row.linea for row in rows])
+        
+        return len(items_data) - len(pending_data)
+    
+    def _check_base_run(self, db: Session, base_run_id: str) -> Optional[RunResultsFile]:
+        """Valida que el run base exista y esté completado; retorna su archivo de resultados si tiene"""
+        base_run = db.query(PriceRun.status, PriceRun.results_file).filter(PriceRun.id == base_run_id).first()
+        if not base_run:
+            raise ValueError(f"Run base no encontrado: {base_run_id}")
+        if base_run.status != "completed":
+            raise ValueError(f"El run base no está completado: {base_run_id}")
+        return RunResultsFile(base_run.results_file) if base_run.results_file else None
+    
+    def _load_base_results(self, db: Session, base_run_id: str, hashes: List[str],
+                           base_file: Optional[RunResultsFile] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Carga los resultados del run base que pueden reutilizarse
+        
+        Args:
+            db: Sesión de base de datos
+            base_run_id: ID del run base
+            hashes: Huellas de inputs de los items a evaluar
+            base_file: Archivo de resultados del run base (opcional)
+            
+        Returns:
+            Diccionario huella -> resultado (outputs y breakdown)
+        """
+        if base_file is not None:
+            return base_file.lookup(hashes)
+        
+        results = {}
+        unique = list(set(hashes))
+        for start in range(0, len(unique), _BASE_LOOKUP_BATCH):
+            rows = db.query(PriceItem.input_hash, PriceItem.outputs, PriceItem.breakdown).filter(
+                PriceItem.run_id == base_run_id,
+                PriceItem.input_hash.in_(unique[start:start + _BASE_LOOKUP_BATCH])
+            )
+            for row in rows:
+                results[row.input_hash] = {'outputs': row.outputs, 'breakdown': row.breakdown}
+        return results
+    
+    def _build_item_data(self, item: NormalizedItem) -> Dict[str, Any]:
+        """
+        Prepara los datos de entrada de un item para el motor de reglas
+        
+        Args:
+            item: Item normalizado (entidad o fila con sus columnas)
+            
+        Returns:
+            Diccionario con los datos del item
+        """
+        return {
+            'sku': item.sku,
+            'marca': item.marca,
+            'linea': item.linea,
+            'base_price': item.base_price,
+            'cost': item.cost,
+            **item.attrs
+        }
     
     def get_run_summary(self, db: Session, run_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -183,22 +379,166 @@ class PricingSimulator:
         
         return price_run.resumen
     
-    def get_price_items(self, db: Session, run_id: str, skip: int = 0, limit: int = 50) -> List[PriceItem]:
+    def get_price_items(self, db: Session, run_id: str, cursor: Optional[str] = None,
+                        limit: int = 50) -> Tuple[List[PriceItem], Optional[str]]:
         """
-        Obtiene los price items de un run con paginación
+        Obtiene los price items de un run con paginación por cursor (keyset)
+        
+        Los items se ordenan por (sku, id) y cada página continúa desde la
+        última fila de la anterior, así el costo no crece con el número de página.
         
         Args:
             db: Sesión de base de datos
             run_id: ID del price run
-            skip: Número de items a saltar
+            cursor: Cursor de la página anterior (None = primera página)
             limit: Número máximo de items
             
         Returns:
-            Lista de price items
+            Tupla (price items, cursor de la página siguiente o None)
+            
+        Raises:
+            ValueError: Si el cursor es inválido
+        """
+        after = decode_cursor(cursor, 2) if cursor else None
+        price_run = db.query(PriceRun.results_file).filter(PriceRun.id == run_id).first()
+        if price_run and price_run.results_file:
+            items = RunResultsFile(price_run.results_file).page(run_id, after, limit + 1)
+        else:
+            query = db.query(PriceItem).filter(PriceItem.run_id == run_id)
+            if after:
+                last_sku, last_id = after
+                query = query.filter(or_(
+                    PriceItem.sku > last_sku,
+                    and_(PriceItem.sku == last_sku, PriceItem.id > last_id)
+                ))
+            items = query.order_by(PriceItem.sku, PriceItem.id).limit(limit + 1).all()
+        
+        if len(items) <= limit:
+            return items, None
+        items = items[:limit]
+        return items, encode_cursor([items[-1].sku, items[-1].id])
+    
+    def get_item_breakdown(self, price_run: PriceRun, item: PriceItem) -> Dict[str, Any]:
+        """Breakdown completo de un item: el guardado por item más las constantes del run"""
+        return expand_breakdown(item.breakdown, price_run.breakdown_constants)
+    
+    def diff_runs(self, db: Session, run_id: str, base_run_id: Optional[str] = None) -> RunDiff:
+        """
+        Compara los precios de un run con los de otro run
+        
+        Las filas se leen por página; el resumen se toma del guardado en el run
+        (si compara con el mismo run anterior y los mismos umbrales) o se
+        calcula una vez por par de runs.
+        
+        Args:
+            db: Sesión de base de datos
+            run_id: ID del price run
+            base_run_id: ID del run contra el que comparar (None = el anterior de la lista)
+            
+        Returns:
+            RunDiff con los cambios por SKU y los QA gates
+            
+        Raises:
+            ValueError: Si algún run no existe, no está completado o no hay run anterior
+        """
+        price_run = db.query(PriceRun).filter(PriceRun.id == run_id).first()
+        if not price_run:
+            raise ValueError(f"Price run no encontrado: {run_id}")
+        if price_run.status != "completed":
+            raise ValueError(f"Price run no está completado: {run_id}")
+        
+        if base_run_id:
+            base_run = db.query(PriceRun).filter(PriceRun.id == base_run_id).first()
+            if not base_run or base_run.status != "completed":
+                raise ValueError(f"Run base no encontrado o no completado: {base_run_id}")
+        else:
+            base_run = find_previous_run(db, price_run)
+            if base_run is None:
+                raise ValueError(f"No hay un run anterior de la lista para comparar: {run_id}")
+        
+        prices, base_prices = run_prices(db, price_run), run_prices(db, base_run)
+        sku_threshold, global_threshold = settings.get_qa_sku_threshold(), settings.get_qa_global_threshold()
+        stored = price_run.resumen or {}
+        if (stored.get('run_anterior_id') == base_run.id and all(key in stored for key in DIFF_SUMMARY_KEYS)
+                and stored['umbral_sku'] == sku_threshold and stored['umbral_global'] == global_threshold):
+            summary = {key: stored[key] for key in DIFF_SUMMARY_KEYS}
+        else:
+            summary = diff_summaries.get((price_run.id, base_run.id, sku_threshold, global_threshold))
+        
+        diff = RunDiff(prices, base_prices, base_run_id=base_run.id, sku_threshold=sku_threshold,
+                       global_threshold=global_threshold, summary=summary)
+        if summary is None:
+            diff_summaries.put((price_run.id, base_run.id, sku_threshold, global_threshold), diff.summary())
+        return diff
+    
+    def iter_price_items(self, db: Session, price_run: PriceRun) -> Iterator[PriceItem]:
+        """
+        Recorre todos los price items de un run sin cargarlos juntos en memoria
+        
+        Args:
+            db: Sesión de base de datos
+            price_run: Price run
+            
+        Returns:
+            Iterador de price items (de la tabla o del archivo de resultados)
         """
-        return db.query(PriceItem).filter(
-            PriceItem.run_id == run_id
-        ).offset(skip).limit(limit).all()
+        if price_run.results_file:
+            return RunResultsFile(price_run.results_file).iter_items(price_run.id)
+        return iter(db.query(PriceItem).filter(PriceItem.run_id == price_run.id).yield_per(
+            settings.get_price_item_chunk_size()
+        ))
+    
+    def delete_results(self, db: Session, price_run: PriceRun) -> None:
+        """Elimina los price items de un run (filas de la tabla y archivo de resultados)"""
+        db.query(PriceItem).filter(PriceItem.run_id == price_run.id).delete()
+        if price_run.results_file:
+            storage_service.delete_file(price_run.results_file)
+    
+    def list_runs(self, db: Session, tenant_id: Optional[str], cursor: Optional[str] = None,
+                  limit: int = 50, status: Optional[str] = None,
+                  desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+                  list_id: Optional[str] = None) -> Tuple[List[PriceRun], Optional[str]]:
+        """
+        Lista los price runs de un tenant, del más reciente al más antiguo, por cursor
+        
+        Usa PriceRun.tenant_id y el índice (tenant_id, created_at, id), sin join
+        con la lista; filtrando por lista, el índice (list_id, created_at, id).
+        
+        Args:
+            db: Sesión de base de datos
+            tenant_id: ID del tenant (None = sin filtrar por tenant, p. ej. por lista)
+            cursor: Cursor de la página anterior (None = primera página)
+            limit: Número máximo de runs
+            status: Solo runs con este estado (opcional)
+            desde: Solo runs creados desde esta fecha (opcional)
+            hasta: Solo runs creados antes de esta fecha (opcional)
+            list_id: Solo runs de esta lista (opcional)
+            
+        Returns:
+            Tupla (price runs, cursor de la página siguiente o None)
+            
+        Raises:
+            ValueError: Si el cursor es inválido
+        """
+        query = db.query(PriceRun)
+        if tenant_id:
+            query = query.filter(PriceRun.tenant_id == tenant_id)
+        if list_id:
+            query = query.filter(PriceRun.list_id == list_id)
+        if status:
+            query = query.filter(PriceRun.status == status)
+        if desde:
+            query = query.filter(PriceRun.created_at >= desde)
+        if hasta:
+            query = query.filter(PriceRun.created_at < hasta)
+        
+        return paginate_newest_first(query, PriceRun.created_at, PriceRun.id, cursor, limit)
+    
+    def get_items_count(self, db: Session, price_run: PriceRun) -> int:
+        """Cantidad de items de un run: la guardada al completarlo o, si no está, un conteo"""
+        if price_run.items_count is not None:
+            return price_run.items_count
+        return db.query(func.count(PriceItem.id)).filter(PriceItem.run_id == price_run.id).scalar()
 
 # Instancia global del simulador
 pricing_simulator = PricingSimulator()
@@ -1,8 +1,10 @@
 import os
 import io
+import uuid
 import shutil
+import hashlib
 from pathlib import Path
-from typing import Optional, BinaryIO
+from typing import NamedTuple, Optional, BinaryIO
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,21 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Bloque de lectura al guardar un stream
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLarge(ValueError):
+    """El archivo supera el tamaño máximo permitido"""
+
+
+class StoredFile(NamedTuple):
+    """Archivo guardado por store_stream"""
+    path: str
+    size: int
+    sha256: str
+
+
 class StorageService:
     """Almacenamiento local basado en filesystem (Railway Volumes)."""
 
@@ -25,19 +42,69 @@ class StorageService:
         logger.info(f"Archivo guardado localmente: {file_path}")
         return str(file_path)
 
-    def download_file(self, object_name: str) -> Optional[BinaryIO]:
-        """Devuelve un stream de lectura del archivo si existe."""
+    def store_stream(self, file_data: BinaryIO, directory: str, suffix: str = "",
+                     max_size: Optional[int] = None) -> StoredFile:
+        """
+        Guarda un stream en una sola pasada: cuenta, hashea y escribe cada bloque
+
+        El archivo se escribe en su carpeta final con un nombre temporal y se
+        renombra a `<sha256><suffix>` al terminar, así un contenido repetido
+        reutiliza el archivo existente.
+
+        Args:
+            file_data: Stream de lectura
+            directory: Carpeta dentro del volumen
+            suffix: Extensión del archivo final (ej. ".xlsx")
+            max_size: Tamaño máximo en bytes (opcional)
+
+        Returns:
+            StoredFile con la ruta absoluta, el tamaño y el sha256
+
+        Raises:
+            FileTooLarge: Si el stream supera max_size (no queda nada escrito)
+        """
+        target_dir = self.resolve_path(directory)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        partial_path = target_dir / f".upload-{uuid.uuid4().hex}.part"
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(partial_path, "wb") as buffer:
+                while True:
+                    chunk = file_data.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise FileTooLarge(f"El archivo supera el máximo de {max_size} bytes")
+                    digest.update(chunk)
+                    buffer.write(chunk)
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+
+        file_path = target_dir / f"{digest.hexdigest()}{suffix}"
+        os.replace(partial_path, file_path)
+        logger.info(f"Archivo guardado localmente: {file_path} ({size} bytes)")
+        return StoredFile(str(file_path), size, digest.hexdigest())
+
+    def resolve_path(self, object_name: str) -> Path:
+        """Ruta local de un objeto (relativo al volumen o absoluto)."""
         file_path = Path(object_name)
         if not file_path.is_absolute():
             file_path = self.base_path / object_name
+        return file_path
+
+    def download_file(self, object_name: str) -> Optional[BinaryIO]:
+        """Devuelve un stream de lectura del archivo si existe."""
+        file_path = self.resolve_path(object_name)
         if not file_path.exists():
             return None
         return open(file_path, "rb")
 
     def delete_file(self, object_name: str) -> bool:
-        file_path = Path(object_name)
-        if not file_path.is_absolute():
-            file_path = self.base_path / object_name
+        file_path = self.resolve_path(object_name)
         try:
             os.remove(file_path)
             logger.info(f"Archivo eliminado: {file_path}")
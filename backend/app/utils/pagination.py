@@ -0,0 +1,93 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# Tipos de la clave de orden serializados con su etiqueta en el cursor
+_DATETIME_TAG = "$dt"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and _DATETIME_TAG in value:
+        return datetime.fromisoformat(value[_DATETIME_TAG])
+    return value
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Codifica la clave de la última fila de una página como cursor opaco
+
+    Args:
+        values: Valores de la clave de orden (ej. [sku, id])
+
+    Returns:
+        Cursor en base64 url-safe
+    """
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decodifica un cursor generado por encode_cursor
+
+    Args:
+        cursor: Cursor recibido del cliente
+        size: Cantidad de valores esperada en la clave
+
+    Returns:
+        Valores de la clave de orden
+
+    Raises:
+        ValueError: Si el cursor es inválido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("estructura inesperada")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+
+
+def paginate_newest_first(query: Query, created_column, id_column, cursor: Optional[str],
+                          limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página de una consulta ordenada por (created_at desc, id desc) con cursor (keyset)
+
+    Args:
+        query: Consulta ya filtrada
+        created_column: Columna de fecha de creación
+        id_column: Columna id (desempate)
+        cursor: Cursor de la página anterior (None = primera página)
+        limit: Número máximo de filas
+
+    Returns:
+        Tupla (filas, cursor de la página siguiente o None)
+
+    Raises:
+        ValueError: Si el cursor es inválido
+    """
+    if cursor:
+        last_created, last_id = decode_cursor(cursor, 2)
+        query = query.filter(or_(
+            created_column < last_created,
+            and_(created_column == last_created, id_column < last_id)
+        ))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, created_column.key), getattr(last, id_column.key)])
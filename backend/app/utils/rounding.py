@@ -1,66 +1,114 @@
+import re
 import math
-from typing import Union
+from functools import lru_cache
+from typing import NamedTuple, Optional, Union
+import numpy as np
+
+# <modo>[<paso>][.<terminación>]: ceil, floor50, round100, ceil500, ceil.990, floor1000.490
+_METHOD_PATTERN = re.compile(r'^(ceil|floor|round)(\d+)?(?:\.(\d+))?$')
+
+_SCALAR_MODES = {'ceil': math.ceil, 'floor': math.floor, 'round': round}
+_ARRAY_MODES = {'ceil': np.ceil, 'floor': np.floor, 'round': np.round}
+
+
+class RoundingRule(NamedTuple):
+    """Método de redondeo ya interpretado: múltiplos de `step` desplazados en `offset`"""
+    mode: str
+    step: int
+    offset: int
+
+
+_DEFAULT_RULE = RoundingRule('round', 1, 0)
+
+
+@lru_cache(maxsize=256)
+def _parse(method: str) -> Optional[RoundingRule]:
+    match = _METHOD_PATTERN.match(method)
+    if not match:
+        return None
+
+    mode, step, ending = match.groups()
+    if ending is None:
+        step = int(step) if step else 1
+        offset = 0
+    else:
+        # Terminación psicológica: ".990" → k*1000 + 990 salvo paso explícito
+        offset = int(ending)
+        step = int(step) if step else 10 ** len(ending)
+        if offset >= step:
+            return None
+
+    if step <= 0:
+        return None
+    return RoundingRule(mode, step, offset)
+
+
+def parse_rounding_method(method: str) -> RoundingRule:
+    """
+    Interpreta un método de redondeo (cacheado por método)
+
+    Args:
+        method: Método de redondeo
+
+    Returns:
+        RoundingRule; los métodos desconocidos redondean al entero más cercano
+    """
+    if not isinstance(method, str):
+        return _DEFAULT_RULE
+    return _parse(method) or _DEFAULT_RULE
+
 
 def rounding(value: Union[float, int], method: str = 'round') -> float:
     """
     Función de redondeo personalizada
-    
+
     Args:
         value: Valor a redondear
         method: Método de redondeo
-        
+
     Returns:
         Valor redondeado según el método especificado
     """
     if not isinstance(value, (int, float)):
         raise ValueError("El valor debe ser numérico")
-    
-    if method == 'ceil50':
-        return math.ceil(value / 50) * 50
-    elif method == 'floor50':
-        return math.floor(value / 50) * 50
-    elif method == 'round50':
-        return round(value / 50) * 50
-    elif method == 'ceil100':
-        return math.ceil(value / 100) * 100
-    elif method == 'floor100':
-        return math.floor(value / 100) * 100
-    elif method == 'round100':
-        return round(value / 100) * 100
-    elif method == 'ceil25':
-        return math.ceil(value / 25) * 25
-    elif method == 'floor25':
-        return math.floor(value / 25) * 25
-    elif method == 'round25':
-        return round(value / 25) * 25
-    elif method == 'ceil10':
-        return math.ceil(value / 10) * 10
-    elif method == 'floor10':
-        return math.floor(value / 10) * 10
-    elif method == 'round10':
-        return round(value / 10) * 10
-    elif method == 'ceil':
-        return math.ceil(value)
-    elif method == 'floor':
-        return math.floor(value)
-    else:
-        return round(value)
+
+    mode, step, offset = parse_rounding_method(method)
+    func = _SCALAR_MODES[mode]
+    if step == 1 and offset == 0:
+        return func(value)
+    return func((value - offset) / step) * step + offset
+
+
+def rounding_array(values, method: str = 'round') -> np.ndarray:
+    """
+    Versión vectorizada de rounding() sobre arrays de numpy
+
+    Args:
+        values: Valores a redondear (array o escalar)
+        method: Método de redondeo, el mismo para todos los valores
+
+    Returns:
+        Array float con los valores redondeados
+    """
+    if not isinstance(method, str):
+        raise TypeError("El método de redondeo debe ser el mismo para todos los valores")
+
+    values = np.asarray(values, dtype=float)
+    mode, step, offset = parse_rounding_method(method)
+    func = _ARRAY_MODES[mode]
+    if step == 1 and offset == 0:
+        return func(values)
+    return func((values - offset) / step) * step + offset
+
 
 def validate_rounding_method(method: str) -> bool:
     """
     Valida si un método de redondeo es válido
-    
+
     Args:
         method: Método a validar
-        
+
     Returns:
         True si es válido, False en caso contrario
     """
-    valid_methods = [
-        'ceil50', 'floor50', 'round50',
-        'ceil100', 'floor100', 'round100',
-        'ceil25', 'floor25', 'round25',
-        'ceil10', 'floor10', 'round10',
-        'ceil', 'floor', 'round'
-    ]
-    return method in valid_methods
+    return isinstance(method, str) and _parse(method) is not None
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Script para comparar los lectores de Excel (EXCEL_READER) sobre listas reales
+
+Uso:
+    python bench_excel_readers.py lista_moura.xlsx lista_varta.xlsx
+    python bench_excel_readers.py --filas 50000   # genera una lista sintética
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from app.services.excel_reader import read_excel, available_readers
+
+
+def generar_lista(path: str, filas: int):
+    """Genera una lista de precios con las columnas que espera el parser"""
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        'Codigo': [f"M{i:06d}" for i in range(filas)],
+        'Marca': rng.choice(['Moura', 'Varta'], filas),
+        'Linea': rng.choice(['Automotor', 'Moto', 'Nautica'], filas),
+        'Precio Base': rng.uniform(10000, 200000, filas).round(2),
+        'Costo': rng.uniform(5000, 150000, filas).round(2),
+        'Descripcion': [f"Bateria {i}" for i in range(filas)],
+    }).to_excel(path, index=False)
+
+
+def medir(path: str, repeticiones: int):
+    print(f"\n📄 {path} ({os.path.getsize(path) / 1024 / 1024:.1f}MB)")
+    for reader in available_readers():
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            df = read_excel(path, engine=reader)
+            tiempos.append(time.perf_counter() - inicio)
+        print(f"  {reader:<10} {min(tiempos):7.2f}s  ({len(df)} filas, {len(df.columns)} columnas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('archivos', nargs='*', help="Archivos .xlsx/.xls a leer")
+    parser.add_argument('--filas', type=int, default=50000, help="Filas de la lista sintética")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.archivos:
+        for path in args.archivos:
+            medir(path, args.repeticiones)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lista_sintetica.xlsx")
+        print(f"🚀 Generando lista sintética de {args.filas} filas...")
+        generar_lista(path, args.filas)
+        medir(path, args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,16 +25,16 @@ fi
 # Configurar variables de entorno para demo
 echo "⚙️  Configurando modo demo..."
 export DEMO_MODE=true
-export DATABASE_URL="sqlite:///:memory:"
+export DATABASE_URL="sqlite:///./acubat_demo.db"
 export DEBUG=true
 
 # Crear archivo .env si no existe
 if [ ! -f ".env" ]; then
     echo "📝 Creando archivo .env para demo..."
     cat > .env << EOF
-# Configuración para DEMO - SQLite en memoria
+# Configuración para DEMO - SQLite en archivo
 DEMO_MODE=true
-DATABASE_URL=sqlite:///:memory:
+DATABASE_URL=sqlite:///./acubat_demo.db
 
 # Configuración de la aplicación
 DEBUG=true
@@ -70,7 +70,7 @@ fi
 
 # Iniciar la aplicación
 echo "🚀 Iniciando AcuBat en modo demo..."
-echo "📊 Base de datos: SQLite en memoria"
+echo "📊 Base de datos: SQLite en archivo (acubat_demo.db)"
 echo "🌐 URL: http://localhost:8000"
 echo "📚 Docs: http://localhost:8000/docs"
 echo "🔍 Demo data: http://localhost:8000/demo/data"
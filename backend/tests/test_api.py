@@ -37,27 +37,33 @@ class TestAPI:
         assert data["status"] == "ok"
         assert "timestamp" in data
     
-    @patch('app.services.storage.storage_service.upload_file')
-    @patch('app.services.parser.excel_parser.parse_excel_file')
-    def test_upload_excel(self, mock_parse, mock_upload):
-        """Test del endpoint de upload"""
+    @patch('app.api.routes_upload.parse_jobs.submit')
+    @patch('app.services.storage.storage_service.store_stream')
+    def test_upload_excel(self, mock_store, mock_submit):
+        """Test del endpoint de upload: guarda el archivo y encola el parseo"""
         # Mock responses
-        mock_upload.return_value = "https://s3.example.com/file.xlsx"
-        mock_parse.return_value = [
-            MagicMock(sku="BAT001", marca="Moura", linea="Automotriz", base_price=1000, cost=800)
-        ]
+        mock_store.return_value = MagicMock(path="/data/lists/test.xlsx", size=18, sha256="abc123")
+        db = MagicMock()
+        db.refresh.side_effect = lambda list_raw: setattr(list_raw, 'id', list_raw.id or "test-list-id")
+        app.dependency_overrides[get_db] = lambda: db
         
         # Crear archivo Excel simulado
         file_content = b"fake excel content"
         files = {"file": ("test.xlsx", io.BytesIO(file_content), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
         data = {"tenant_id": self.tenant_id}
         
-        response = client.post("/api/v1/upload", files=files, data=data, headers=self.headers)
+        try:
+            response = client.post("/api/v1/upload", files=files, data=data, headers=self.headers)
+        finally:
+            app.dependency_overrides[get_db] = override_get_db
         
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
-        assert "id" in data
-        assert data["normalized_items_count"] == 1
+        assert data["id"] == "test-list-id"
+        assert data["status"] == "parsing"
+        mock_submit.assert_called_once_with(
+            "test-list-id", self.tenant_id, "/data/lists/test.xlsx", content_hash="abc123"
+        )
     
     def test_simulate_pricing(self):
         """Test del endpoint de simulación"""
@@ -67,18 +73,15 @@ class TestAPI:
             "ruleset_id": "test-ruleset-id"
         }
         
-        with patch('app.services.simulator.pricing_simulator.run_simulation') as mock_simulate:
-            mock_run = MagicMock()
-            mock_run.id = "test-run-id"
-            mock_run.status = "completed"
-            mock_simulate.return_value = mock_run
-            
+        with patch('app.api.routes_simulate.simulation_jobs.submit') as mock_submit:
             response = client.post("/api/v1/simulate", json=request_data, headers=self.headers)
             
-            assert response.status_code == 200
-            data = response.json()
-            assert data["run_id"] == "test-run-id"
-            assert data["status"] == "completed"
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "queued"
+        mock_submit.assert_called_once_with(
+            data["id"], self.tenant_id, "test-list-id", "test-ruleset-id", base_run_id=None
+        )
     
     def test_get_run_details(self):
         """Test del endpoint para obtener detalles de run"""
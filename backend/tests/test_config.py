@@ -91,6 +91,46 @@ class TestConfig:
         settings.QA_SKU_THRESHOLD = "invalid"
         assert settings.get_qa_sku_threshold() == 0.15  # default
     
+    def test_pool_settings(self):
+        """Test que verifica la configuración del pool de conexiones"""
+        settings = Settings()
+        
+        settings.DB_POOL_SIZE = "20"
+        settings.DB_MAX_OVERFLOW = "0"
+        settings.DB_POOL_TIMEOUT = "2.5"
+        assert settings.get_db_pool_size() == 20
+        assert settings.get_db_max_overflow() == 0
+        assert settings.get_db_pool_timeout() == 2.5
+        
+        settings.DB_POOL_SIZE = "invalid"
+        settings.DB_MAX_OVERFLOW = "-1"
+        settings.SQLITE_CACHE_SIZE_MB = "invalid"
+        assert settings.get_db_pool_size() == 5  # default
+        assert settings.get_db_max_overflow() == 10  # default
+        assert settings.get_sqlite_cache_size_mb() == 64  # default
+    
+    def test_simulation_workers(self):
+        """Test que verifica que la simulación no abre un pool de procesos salvo que se pida"""
+        settings = Settings()
+        assert settings.get_simulation_workers() == 1  # default
+        
+        settings.SIMULATION_WORKERS = "4"
+        assert settings.get_simulation_workers() == 4
+        
+        settings.SIMULATION_WORKERS = "0"
+        assert settings.get_simulation_workers() == (os.cpu_count() or 1)
+        
+        settings.SIMULATION_WORKERS = "invalid"
+        assert settings.get_simulation_workers() == 1
+    
+    def test_sqlite_file_url_kept(self):
+        """Test que verifica que una URL de SQLite en archivo no se reemplaza ni recibe sslmode"""
+        with patch.dict(os.environ, {'DATABASE_URL': 'sqlite:////data/acubat.db'}):
+            os.environ.pop('DEMO_MODE', None)
+            settings = Settings()
+            settings.resolve_database_url()
+            assert settings.DATABASE_URL == 'sqlite:////data/acubat.db'
+    
     @patch('os.getenv')
     def test_port_from_env_xxxx(self, mock_getenv):
         """Test específico para PORT='XXXX' - debe usar 8000 por defecto"""
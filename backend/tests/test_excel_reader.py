@@ -0,0 +1,298 @@
+import os
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.models import Base, Tenant, ListRaw, NormalizedItem
+from app.services import excel_reader
+from app.services.excel_reader import read_excel, resolve_reader, available_readers
+from app.services.jobs import ParseJobs, ParseQueueFull, recover_interrupted_uploads
+from app.services.parse_cache import parse_cache
+from app.services.parser import ExcelParser, PARSER_VERSION
+
+
+@pytest.fixture
+def lista(tmp_path):
+    path = tmp_path / "lista.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Codigo", "Marca", "Precio Base", "Costo", "Vigencia", "Marca", None])
+    sheet.append(["M001", "Moura", 120000.5, 80000, datetime(2024, 1, 1), "x", None])
+    sheet.append([])
+    sheet.append(["M002", "Varta", 95000, 70000.0, datetime(2024, 2, 1), None, 3])
+    sheet.append([None, None, None])
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def lista_precios(tmp_path):
+    path = tmp_path / "precios.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Codigo", "Marca", "Linea", "Precio Base", "Costo", "Descripcion", "Amperaje"])
+    sheet.append(["M18FD", " Moura ", "Automotriz", 120000, 80000.5, "Bateria 12x45", 45])
+    sheet.append(["M20GD", "Moura", "Pesada", "abc", 90000, "Precio inválido", 110])
+    sheet.append(["M22GD", "Moura", "Pesada", 150000, 95000, None, None])
+    workbook.save(path)
+    return str(path)
+
+
+class TestReadExcel:
+    """Tests para los lectores de Excel en modo solo lectura"""
+
+    @pytest.mark.parametrize("engine", available_readers())
+    def test_same_frame_as_pandas(self, lista, engine):
+        expected = pd.read_excel(lista, engine='openpyxl')
+
+        df = read_excel(lista, engine=engine)
+
+        assert list(df.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+    def test_integral_floats_as_int(self, tmp_path):
+        path = tmp_path / "codigos.xlsx"
+        workbook = Workbook()
+        workbook.active.append(["sku", "cost"])
+        workbook.active.append([1001.0, 10])
+        workbook.active.append(["A1", 20.5])
+        workbook.save(path)
+
+        df = read_excel(str(path), engine='openpyxl')
+
+        assert df['sku'].tolist() == [1001, "A1"]
+
+    def test_sheet_by_name(self, tmp_path):
+        path = tmp_path / "hojas.xlsx"
+        workbook = Workbook()
+        workbook.active.append(["otra"])
+        workbook.create_sheet("Precios").append(["sku", "cost"])
+        workbook["Precios"].append(["A1", 10])
+        workbook.save(path)
+
+        df = read_excel(str(path), sheet_name="Precios", engine='openpyxl')
+
+        assert df.to_dict('records') == [{"sku": "A1", "cost": 10}]
+
+    def test_empty_sheet(self, tmp_path):
+        path = tmp_path / "vacia.xlsx"
+        Workbook().save(path)
+
+        assert read_excel(str(path), engine='openpyxl').empty
+
+
+class TestResolveReader:
+    """Tests para la elección del lector"""
+
+    def test_auto_without_calamine(self, monkeypatch):
+        monkeypatch.setattr(excel_reader, 'CalamineWorkbook', None)
+
+        assert resolve_reader("lista.xlsx", "auto") == 'openpyxl'
+        assert resolve_reader("lista.xls", "auto") == 'pandas'
+
+    def test_xls_not_read_by_openpyxl(self):
+        assert resolve_reader("lista.xls", "openpyxl") == 'pandas'
+
+    def test_calamine_not_installed(self, monkeypatch):
+        monkeypatch.setattr(excel_reader, 'CalamineWorkbook', None)
+
+        with pytest.raises(ValueError):
+            resolve_reader("lista.xlsx", "calamine")
+
+    def test_unknown_reader(self):
+        with pytest.raises(ValueError):
+            resolve_reader("lista.xlsx", "xlsx2csv")
+
+
+class TestExcelParser:
+    """Tests para la normalización de la lista en filas de normalized_items"""
+
+    def test_rows_as_mappings(self, lista_precios):
+        items = ExcelParser().parse_excel_file(lista_precios, "tenant-1", "list-1")
+
+        assert [item['sku'] for item in items] == ["M18FD", "M22GD"]
+        first = items[0]
+        assert first['list_id'] == "list-1"
+        assert first['marca'] == "Moura"
+        assert first['base_price'] == 120000.0 and type(first['base_price']) is float
+        assert first['cost'] == 80000.5
+        assert first['attrs'] == {"descripcion": "Bateria 12x45", "amperaje": 45}
+        assert items[1]['attrs'] == {"descripcion": None, "amperaje": None}
+        assert len({item['id'] for item in items}) == 2
+
+    def test_save_items_bulk(self, lista_precios, monkeypatch):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        monkeypatch.setattr('app.services.parser.SessionLocal', session_factory)
+        monkeypatch.setattr('app.core.config.settings.PRICE_ITEM_CHUNK_SIZE', "1")
+        session = session_factory()
+        session.add(Tenant(id="tenant-1", nombre="Test"))
+        session.add(ListRaw(id="list-1", tenant_id="tenant-1", filename="precios.xlsx", storage_url=lista_precios))
+        session.commit()
+
+        parser = ExcelParser()
+        parser.save_items_to_db(parser.parse_excel_file(lista_precios, "tenant-1", "list-1"))
+
+        saved = session.query(NormalizedItem).order_by(NormalizedItem.sku).all()
+        assert [item.sku for item in saved] == ["M18FD", "M22GD"]
+        assert saved[0].attrs == {"descripcion": "Bateria 12x45", "amperaje": 45}
+        assert saved[0].created_at is not None
+
+
+class TestParseCache:
+    """Tests para la caché de listas parseadas por hash de contenido"""
+
+    @pytest.fixture(autouse=True)
+    def volume(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('app.services.storage.storage_service.base_path', tmp_path)
+        return tmp_path
+
+    def test_repeat_upload_skips_excel(self, lista_precios, monkeypatch):
+        parser = ExcelParser()
+        first = parser.parse_excel_file(lista_precios, "tenant-1", "list-1", content_hash="abc")
+
+        def no_excel(*args, **kwargs):
+            raise AssertionError("no debería leer el Excel")
+        monkeypatch.setattr('app.services.parser.read_excel', no_excel)
+        second = parser.parse_excel_file(lista_precios, "tenant-2", "list-2", content_hash="abc")
+
+        assert [item['list_id'] for item in second] == ["list-2"] * len(first)
+        assert not {item['id'] for item in first} & {item['id'] for item in second}
+        strip = lambda items: [{k: v for k, v in item.items() if k not in ('id', 'list_id', 'created_at')} for item in items]
+        assert strip(second) == strip(first)
+
+    def test_cache_hit_keeps_attrs_of_fresh_parse(self, tmp_path, monkeypatch):
+        path = tmp_path / "vencimientos.xlsx"
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Codigo", "Marca", "Linea", "Precio Base", "Costo", "Vencimiento"])
+        sheet.append(["M18FD", "Moura", "Automotriz", 120000, 80000, datetime(2024, 5, 1)])
+        workbook.save(path)
+
+        parser = ExcelParser()
+        fresh = parser.parse_excel_file(str(path), "tenant-1", "list-1", content_hash="fechas")
+        monkeypatch.setattr('app.services.parser.read_excel', None)
+        cached = parser.parse_excel_file(str(path), "tenant-1", "list-2", content_hash="fechas")
+
+        assert fresh[0]['attrs'] == {'vencimiento': "2024-05-01 00:00:00"}
+        assert cached[0]['attrs'] == fresh[0]['attrs']
+
+    def test_parser_version_in_key(self, lista_precios):
+        parser = ExcelParser()
+        parser.parse_excel_file(lista_precios, "tenant-1", "list-1", content_hash="abc")
+
+        assert parse_cache.get("abc", PARSER_VERSION) is not None
+        assert parse_cache.get("abc", PARSER_VERSION + "-nueva") is None
+
+    def test_bounded_entries(self, volume, monkeypatch):
+        monkeypatch.setattr('app.core.config.settings.PARSE_CACHE_MAX_ENTRIES', "2")
+        item = {'sku': "A1", 'marca': "Moura", 'linea': "Pesada", 'base_price': 1.0, 'cost': 1.0, 'attrs': {}}
+        for i, content_hash in enumerate(["h1", "h2", "h3"]):
+            parse_cache.put(content_hash, "1", [item])
+            os.utime(volume / "parse_cache" / "1" / f"{content_hash}.parquet", (i, i))
+
+        assert parse_cache.get("h1", "1") is None
+        assert parse_cache.get("h3", "1") == [item]
+
+    def test_concurrent_puts_of_same_file(self, volume, monkeypatch):
+        items = [{'sku': f"A{i}", 'marca': "Moura", 'linea': "Pesada", 'base_price': 1.0, 'cost': 1.0, 'attrs': {}}
+                 for i in range(500)]
+        tmp_paths = []
+        replace = os.replace
+        monkeypatch.setattr(os, 'replace', lambda src, dst: tmp_paths.append(src) or replace(src, dst))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: parse_cache.put("abc", "1", items), range(8)))
+
+        # Cada escritura usa su propio archivo temporal
+        assert len(set(tmp_paths)) == 8
+        assert parse_cache.get("abc", "1") == items
+        assert [path.name for path in (volume / "parse_cache" / "1").iterdir()] == ["abc.parquet"]
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr('app.core.config.settings.PARSE_CACHE_MAX_ENTRIES', "0")
+        parse_cache.put("abc", "1", [])
+
+        assert parse_cache.get("abc", "1") is None
+
+
+class TestParseJobs:
+    """Tests para el parseo de listas en segundo plano"""
+
+    @pytest.fixture
+    def session_factory(self, lista_precios, tmp_path, monkeypatch):
+        monkeypatch.setattr('app.services.storage.storage_service.base_path', tmp_path)
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        session = factory()
+        session.add(Tenant(id="tenant-1", nombre="Test"))
+        session.add(ListRaw(id="list-1", tenant_id="tenant-1", filename="precios.xlsx",
+                            storage_url=lista_precios, list_metadata={"status": "parsing"}))
+        session.commit()
+        session.close()
+        return factory
+
+    def test_job_parses_and_marks_ready(self, session_factory, lista_precios, monkeypatch):
+        monkeypatch.setattr('app.core.config.settings.PRICE_ITEM_CHUNK_SIZE', "1")
+        jobs = ParseJobs(workers=1, max_pending=2, session_factory=session_factory)
+        stages = []
+        report = jobs._report
+        monkeypatch.setattr(jobs, '_report', lambda job_id, progress: (stages.append(dict(progress)), report(job_id, progress)))
+
+        jobs.submit("list-1", "tenant-1", lista_precios)
+        jobs.shutdown(wait=True)
+
+        session = session_factory()
+        list_raw = session.query(ListRaw).filter(ListRaw.id == "list-1").one()
+        assert list_raw.list_metadata == {"status": "ready", "normalized_items_count": 2}
+        assert session.query(NormalizedItem).count() == 2
+        assert [stage['etapa'] for stage in stages] == ['leyendo', 'normalizando', 'normalizando', 'guardando', 'guardando']
+        assert stages[-1] == {'etapa': 'guardando', 'filas_procesadas': 2, 'filas_totales': 2}
+        assert jobs.progress("list-1") is None
+        assert jobs.pending() == 0
+
+    def test_failed_job_marks_list(self, session_factory, tmp_path):
+        invalid = tmp_path / "invalida.xlsx"
+        invalid.write_bytes(b"no es un excel")
+        jobs = ParseJobs(workers=1, max_pending=2, session_factory=session_factory, inline=True)
+
+        jobs.submit("list-1", "tenant-1", str(invalid))
+
+        session = session_factory()
+        metadata = session.query(ListRaw).filter(ListRaw.id == "list-1").one().list_metadata
+        assert metadata["status"] == "failed"
+        assert metadata["error"]
+        assert session.query(NormalizedItem).count() == 0
+        assert jobs.pending() == 0
+
+    def test_queue_is_bounded(self, session_factory, lista_precios):
+        release = threading.Event()
+        jobs = ParseJobs(workers=1, max_pending=1, session_factory=session_factory)
+        jobs._run = lambda *args: release.wait(5)
+        try:
+            jobs.submit("list-1", "tenant-1", lista_precios)
+            assert jobs.progress("list-1")['etapa'] == 'en_cola'
+            with pytest.raises(ParseQueueFull):
+                jobs.submit("list-2", "tenant-1", lista_precios)
+        finally:
+            release.set()
+            jobs.shutdown(wait=True)
+
+    def test_recover_interrupted_uploads(self, session_factory):
+        session = session_factory()
+        session.add(ListRaw(id="list-2", tenant_id="tenant-1", filename="lista.xlsx",
+                            storage_url="/tmp/lista.xlsx", list_metadata={"status": "ready"}))
+        session.commit()
+        session.close()
+
+        assert recover_interrupted_uploads(session_factory) == 1
+
+        session = session_factory()
+        statuses = {list_raw.id: list_raw.list_metadata["status"] for list_raw in session.query(ListRaw)}
+        assert statuses == {"list-1": "failed", "list-2": "ready"}
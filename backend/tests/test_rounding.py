@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from app.utils.rounding import RoundingRule, parse_rounding_method, rounding, rounding_array, validate_rounding_method
+
+
+class TestRounding:
+    """Tests para la utilidad de redondeo"""
+
+    def test_parse_method(self):
+        assert parse_rounding_method('ceil50') == RoundingRule('ceil', 50, 0)
+        assert parse_rounding_method('floor') == RoundingRule('floor', 1, 0)
+        assert parse_rounding_method('ceil500') == RoundingRule('ceil', 500, 0)
+        assert parse_rounding_method('ceil.990') == RoundingRule('ceil', 1000, 990)
+        assert parse_rounding_method('round100.90') == RoundingRule('round', 100, 90)
+
+    def test_unknown_method_falls_back_to_round(self):
+        assert parse_rounding_method('redondo') == RoundingRule('round', 1, 0)
+        assert rounding(1234.6, 'redondo') == 1235
+        assert not validate_rounding_method('redondo')
+        assert not validate_rounding_method('ceil0')
+        assert not validate_rounding_method('ceil10.990')
+
+    def test_legacy_methods(self):
+        assert rounding(1234, 'ceil50') == 1250
+        assert rounding(1234, 'floor100') == 1200
+        assert rounding(1275, 'round50') == 1300
+        assert rounding(1234.2, 'ceil') == 1235
+        assert rounding(1234.7) == 1235
+        for method in ('ceil10', 'floor25', 'round100', 'round'):
+            assert validate_rounding_method(method)
+
+    def test_arbitrary_step_and_endings(self):
+        assert rounding(12345, 'ceil500') == 12500
+        assert rounding(12345, 'ceil.990') == 12990
+        assert rounding(12995, 'ceil.990') == 13990
+        assert rounding(12345, 'floor.990') == 11990
+        assert rounding(12345, 'ceil100.90') == 12390
+
+    def test_non_numeric_value(self):
+        with pytest.raises(ValueError):
+            rounding("1234", 'ceil50')
+
+    @pytest.mark.parametrize('method', ['ceil50', 'floor10', 'round25', 'ceil500', 'ceil.990', 'round', 'otro'])
+    def test_array_matches_scalar(self, method):
+        values = np.array([0.0, 12.5, 1234.0, 1250.0, 12345.67, 99999.5])
+        expected = [rounding(float(v), method) for v in values]
+        assert rounding_array(values, method).tolist() == expected
+
+    def test_array_requires_single_method(self):
+        with pytest.raises(TypeError):
+            rounding_array([1.0, 2.0], np.array(['ceil50', 'floor50'], dtype=object))
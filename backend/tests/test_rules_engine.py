@@ -1,5 +1,7 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from app.services.rules_engine import RulesEngine, MOURA_RULESET
+from app.services.ruleset_compiler import OverrideIndex, RulesetCompilationError, compile_expression, compile_ruleset
 
 class TestRulesEngine:
     """Tests para el motor de reglas"""
@@ -165,3 +167,238 @@ class TestRulesEngine:
         # Test floor50
         assert self.engine.evaluate_expression("rounding(1234, 'floor50')", {}) == 1200
         assert self.engine.evaluate_expression("rounding(1200, 'floor50')", {}) == 1200
+
+
+class TestRulesetCompiler:
+    """Tests para el compilador de rulesets"""
+    
+    def test_compile_moura_ruleset(self):
+        """El ruleset de Moura compila a un plan con todos sus pasos"""
+        compiled = compile_ruleset(MOURA_RULESET)
+        
+        assert compiled.name == "moura_base"
+        assert len(compiled.steps) == len(MOURA_RULESET["steps"])
+        
+        neto1 = next(step for step in compiled.steps if step.var == "neto1")
+        assert neto1.kind == "expr"
+        assert neto1.reads == frozenset({"precio_lista", "desc1"})
+    
+    def test_constant_folding(self):
+        """Las expresiones con solo constantes se pliegan a un valor fijo"""
+        compiled = compile_expression("(1 + 0.21) * 100")
+        assert compiled.constant == pytest.approx(121.0)
+        
+        # La división por cero no se pliega: se evalúa (y falla) en ejecución
+        assert compile_expression("1 / 0").constant is None
+    
+    def test_rejects_unsafe_expressions(self):
+        """Construcciones fuera de la whitelist se rechazan al compilar"""
+        for expr in ["__import__('os')", "math.__dict__", "open('x')", "x.y", "lambda: 1", "K +"]:
+            with pytest.raises(RulesetCompilationError):
+                compile_expression(expr)
+    
+    def test_load_ruleset_with_invalid_expression(self):
+        """Un ruleset con expresiones inválidas no se carga y se reporta al validar"""
+        engine = RulesEngine()
+        invalid_ruleset = {
+            "name": "test",
+            "version": "v1",
+            "steps": [{"var": "x", "expr": "__import__('os').getcwd()"}]
+        }
+        
+        assert engine.load_ruleset(invalid_ruleset) is False
+        assert len(engine.validate_ruleset(invalid_ruleset)) == 1
+
+
+class TestBatchPricing:
+    """Tests para la evaluación vectorizada por lotes"""
+    
+    def setup_method(self):
+        self.engine = RulesEngine()
+        self.engine.load_ruleset(MOURA_RULESET)
+    
+    def _items(self):
+        lineas = ['Automotriz', 'Pesada', 'Motocicleta']
+        items = [
+            {
+                'sku': f'SKU-{i}',
+                'marca': 'Moura',
+                'linea': lineas[i % 3],
+                'base_price': 1000.0 + i * 137.25,
+                'cost': 400.0 + i * 51.5,
+                'attrs': {'capacidad': f'{i}Ah'} if i % 2 else {}
+            }
+            for i in range(30)
+        ]
+        # Casos borde: costo cero (división por cero), datos faltantes e inválidos
+        items.append({'sku': 'ZERO', 'marca': 'Moura', 'linea': 'Automotriz', 'base_price': 1000.0, 'cost': 0})
+        items.append({'sku': 'EMPTY', 'marca': 'Moura', 'linea': 'Automotriz'})
+        items.append({'sku': 'BAD', 'marca': 'Moura', 'linea': 'Automotriz', 'base_price': 'abc', 'cost': 1})
+        return items
+    
+    def test_batch_matches_scalar(self):
+        """El lote produce exactamente los mismos resultados que el cálculo por item"""
+        items = self._items()
+        
+        batch_results = self.engine.calculate_pricing_batch(items)
+        scalar_results = [self.engine.calculate_pricing(item) for item in items]
+        
+        assert batch_results == scalar_results
+    
+    def test_batch_with_non_vectorizable_expression(self):
+        """Las expresiones que no se pueden vectorizar se resuelven por item"""
+        ruleset = {
+            "name": "test",
+            "version": "v1",
+            "globals": {"umbral": 500},
+            "steps": [
+                {"var": "precio_publico", "expr": "base_price if base_price > umbral else cost"},
+                {"var": "markup", "expr": "max(precio_publico - cost, 0) / cost"},
+            ]
+        }
+        self.engine.load_ruleset(ruleset)
+        items = self._items()
+        
+        assert self.engine.calculate_pricing_batch(items) == [
+            self.engine.calculate_pricing(item) for item in items
+        ]
+    
+    def test_empty_batch(self):
+        assert self.engine.calculate_pricing_batch([]) == []
+
+
+class TestExecutionPlan:
+    """Tests para el plan de ejecución (pasos invariantes y descartados)"""
+    
+    def test_moura_plan_hoists_invariant_steps(self):
+        """Los pasos que no dependen del item se evalúan una sola vez"""
+        compiled = compile_ruleset(MOURA_RULESET)
+        
+        assert compiled.hoisted == ('desc1', 'desc_contado')
+        assert compiled.constants['desc1'] == 0.50
+        assert 'neto1' in [step.var for step in compiled.item_steps]
+        assert compiled.dropped == ()
+    
+    def test_dead_steps_dropped_for_outputs(self):
+        """Con outputs explícitos se descartan los pasos que no contribuyen"""
+        compiled = compile_ruleset(MOURA_RULESET, outputs=['markup'])
+        
+        assert [step.var for step in compiled.item_steps] == ['precio_lista', 'neto1', 'K', 'markup']
+        assert 'precio_publico' in compiled.dropped
+        assert 'rentabilidad' in compiled.dropped
+    
+    def test_hoisting_preserves_step_order_semantics(self):
+        """No se adelantan pasos cuya variable se lee antes o se reasigna"""
+        ruleset = {
+            "name": "test",
+            "version": "v1",
+            "globals": {"factor": 2},
+            "steps": [
+                {"var": "a", "expr": "x * factor"},
+                {"var": "x", "value": 10},
+                {"var": "b", "value": 1},
+                {"var": "b", "expr": "b + base_price"},
+                {"var": "c", "expr": "factor * 3"},
+            ]
+        }
+        compiled = compile_ruleset(ruleset)
+        assert compiled.hoisted == ('c',)
+        
+        engine = RulesEngine()
+        engine.load_ruleset(ruleset)
+        result = engine.calculate_pricing({'sku': 'A', 'base_price': 5.0, 'cost': 1.0, 'attrs': {'x': 3}})
+        
+        assert result['breakdown']['a'] == 6.0
+        assert result['breakdown']['x'] == 10
+        assert result['breakdown']['b'] == 6.0
+        assert result['breakdown']['c'] == 6.0
+
+
+class TestOverrideIndex:
+    """Tests para el índice de overrides"""
+    
+    def test_overrides_take_precedence_over_globals(self):
+        """Un override sobre una variable global reemplaza su valor"""
+        engine = RulesEngine()
+        engine.load_ruleset(MOURA_RULESET)
+        
+        pesada = engine.calculate_pricing({'sku': 'P', 'linea': 'Pesada', 'base_price': 100.0, 'cost': 50.0})
+        auto = engine.calculate_pricing({'sku': 'A', 'linea': 'Automotriz', 'base_price': 100.0, 'cost': 50.0})
+        
+        assert pesada['breakdown']['IVA'] == 0.105
+        assert auto['breakdown']['IVA'] == 0.21
+    
+    def test_declaration_order_precedence(self):
+        """Si varios overrides aplican, el último declarado gana por variable"""
+        index = OverrideIndex([
+            {"when": {"linea": "Pesada"}, "set": {"IVA": 0.105, "L": 0.1}},
+            {"when": {"sku": "P-1"}, "set": {"IVA": 0.0}},
+            {"when": {"linea": "Pesada", "marca": "Moura"}, "set": {"L": 0.2}},
+            {"when": {}, "set": {"M": 0.01}},
+        ])
+        
+        assert index.resolve({"sku": "P-1", "linea": "Pesada", "marca": "Moura"}) == {
+            "IVA": 0.0, "L": 0.2, "M": 0.01
+        }
+        assert index.resolve({"sku": "P-2", "linea": "Pesada", "marca": "Varta"}) == {
+            "IVA": 0.105, "L": 0.1, "M": 0.01
+        }
+        assert index.resolve({"sku": "X", "linea": "Auto"}) == {"M": 0.01}
+    
+    def test_unhashable_conditions(self):
+        """Condiciones con valores no hasheables se evalúan igual que antes"""
+        index = OverrideIndex([{"when": {"tags": ["a", "b"]}, "set": {"L": 0.3}}])
+        
+        assert index.resolve({"tags": ["a", "b"]}) == {"L": 0.3}
+        assert index.resolve({"tags": ["a"]}) == {}
+    
+    def test_many_sku_overrides(self):
+        """Miles de overrides por SKU se resuelven por búsqueda directa"""
+        overrides = [{"when": {"sku": f"SKU-{i}"}, "set": {"desc_extra": i / 10000}} for i in range(5000)]
+        index = OverrideIndex(overrides)
+        
+        assert index.resolve({"sku": "SKU-4321"}) == {"desc_extra": 0.4321}
+        assert index.resolve({"sku": "OTRO"}) == {}
+        assert index.match({"sku": "SKU-10"}) == [10]
+
+
+class TestConcurrency:
+    """Tests para el uso concurrente del motor"""
+    
+    def test_compiled_ruleset_is_immutable(self):
+        compiled = compile_ruleset(MOURA_RULESET)
+        
+        with pytest.raises(TypeError):
+            compiled.globals['IVA'] = 0.0
+        with pytest.raises(TypeError):
+            compiled.overrides[0]['set']['IVA'] = 0.0
+        with pytest.raises(AttributeError):
+            compiled.name = "otro"
+    
+    def test_concurrent_simulations_with_different_rulesets(self):
+        """Un mismo motor atiende en paralelo simulaciones con rulesets distintos"""
+        engine = RulesEngine()
+        base = compile_ruleset(MOURA_RULESET)
+        other_config = dict(MOURA_RULESET, globals=dict(MOURA_RULESET['globals'], IVA=0.5))
+        other = compile_ruleset(other_config)
+        item = {'sku': 'A', 'linea': 'Automotriz', 'base_price': 1000.0, 'cost': 400.0}
+        
+        expected = {
+            id(base): engine.calculate_pricing(item, base)['breakdown']['precio_publico_bruto'],
+            id(other): engine.calculate_pricing(item, other)['breakdown']['precio_publico_bruto'],
+        }
+        assert expected[id(base)] != expected[id(other)]
+        
+        def run(ruleset):
+            for _ in range(200):
+                # Alternar el ruleset "cargado" no debe afectar a los cálculos en curso
+                engine.load_ruleset(other_config if ruleset is base else MOURA_RULESET)
+                result = engine.calculate_pricing(item, ruleset)
+                assert result['breakdown']['precio_publico_bruto'] == expected[id(ruleset)]
+                batch = engine.calculate_pricing_batch([item] * 5, ruleset)
+                assert all(r['breakdown']['precio_publico_bruto'] == expected[id(ruleset)] for r in batch)
+            return True
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(run, base if i % 2 else other) for i in range(16)]
+            assert all(future.result() for future in futures)
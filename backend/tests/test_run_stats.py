@@ -0,0 +1,84 @@
+import json
+import random
+import numpy as np
+import pytest
+from app.services.run_stats import Histogram, QuantileSketch, RunStatistics, StreamingStat, MAX_GROUPS, OTHER_GROUP
+
+
+class TestStreamingStatistics:
+    """Tests para las estadísticas en streaming de un run"""
+
+    def test_mean_std_min_max(self):
+        rng = random.Random(1)
+        values = [rng.gauss(0.3, 0.1) for _ in range(1000)]
+        stat = StreamingStat()
+        for start in range(0, 1000, 300):
+            stat.extend(np.array(values[start:start + 300]))
+
+        result = stat.result()
+        assert result['count'] == 1000
+        assert result['mean'] == pytest.approx(np.mean(values))
+        assert result['std'] == pytest.approx(np.std(values, ddof=1))
+        assert result['min'] == min(values)
+        assert result['max'] == max(values)
+
+    @pytest.mark.parametrize('p', [0.05, 0.5, 0.95])
+    def test_sketch_percentiles(self, p):
+        values = np.random.default_rng(7).lognormal(0, 0.5, 200000)
+        sketch = QuantileSketch(capacity=1024)
+        for start in range(0, len(values), 5000):
+            sketch.extend(values[start:start + 5000])
+
+        assert sum(len(level) for level in sketch.levels) <= 1024 * len(sketch.levels)
+        assert sketch.quantile(p) == pytest.approx(np.percentile(values, p * 100), rel=0.02)
+
+    def test_small_sample_percentile_is_exact(self):
+        sketch = QuantileSketch()
+        assert sketch.quantile(0.5) is None
+        sketch.extend(np.array([3.0, 1.0, 2.0]))
+        assert sketch.quantile(0.5) == 2.0
+        assert sketch.quantile(0.0) == 1.0
+        assert sketch.quantile(1.0) == 3.0
+
+    def test_histogram(self):
+        histogram = Histogram((0.0, 0.5))
+        histogram.extend(np.array([-0.1, 0.0, 0.2, 0.5, 0.9, float('nan')]))
+        assert histogram.result() == [
+            {'desde': None, 'hasta': 0.0, 'items': 1},
+            {'desde': 0.0, 'hasta': 0.5, 'items': 2},
+            {'desde': 0.5, 'hasta': None, 'items': 2},
+        ]
+
+    def test_run_summary(self):
+        stats = RunStatistics()
+        stats.add({'markup': 0.2, 'rentabilidad': 0.1, 'precio_publico': 100}, 'Moura', 'Automotriz')
+        stats.add({'markup': 0.4, 'rentabilidad': 0.3, 'precio_publico': 200}, 'Moura', 'Pesada')
+        stats.add({'markup': float('nan'), 'rentabilidad': 0.2}, 'Varta', 'Pesada')
+        stats.add({})
+
+        summary = stats.summary()
+        assert summary['total_items'] == 4
+        assert summary['margen_promedio'] == pytest.approx(0.3)
+        assert summary['rentabilidad_promedio'] == pytest.approx(0.2)
+
+        estadisticas = summary['estadisticas']
+        assert estadisticas['markup']['count'] == 2
+        assert estadisticas['precio_publico']['p50'] == 100
+        assert estadisticas['por_marca']['Moura']['items'] == 2
+        assert estadisticas['por_marca']['Moura']['margen_promedio'] == pytest.approx(0.3)
+        assert estadisticas['por_marca']['Varta']['items'] == 1
+        assert estadisticas['por_linea']['Pesada']['rentabilidad_promedio'] == pytest.approx(0.25)
+        assert sum(b['items'] for b in estadisticas['histograma_markup']) == 2
+        json.dumps(summary)
+
+    def test_groups_are_bounded(self):
+        stats = RunStatistics()
+        for i in range(MAX_GROUPS + 10):
+            stats.add({'markup': 0.1}, f"marca-{i}", "linea")
+
+        por_marca = stats.summary()['estadisticas']['por_marca']
+        assert len(por_marca) == MAX_GROUPS
+        assert por_marca[OTHER_GROUP]['items'] == 11
+
+    def test_empty(self):
+        assert RunStatistics().summary() == {}
@@ -0,0 +1,717 @@
+import pytest
+from datetime import datetime
+from app.core.config import settings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import threading
+from sqlalchemy.pool import StaticPool
+from app.db.models import Base, Tenant, ListRaw, NormalizedItem, Ruleset, PriceRun, PriceItem
+from app.services.rules_engine import RulesEngine, MOURA_RULESET
+from app.services.ruleset_cache import RulesetCache, ruleset_cache
+from app.services.ruleset_compiler import RulesetCompilationError, compile_ruleset
+from app.services.jobs import SimulationJobs, SimulationQueueFull, recover_interrupted_runs
+from app.services.price_item_writer import PriceItemWriter
+from app.services.sharding import ShardedPricer
+from app.services.run_diff import RunDiff, run_prices
+from app.services.run_results import RunResultsFile, RunResultsWriter
+from app.services.run_stats import RunStatistics
+from app.services.storage import storage_service
+from app.services.simulator import PricingSimulator
+from app.utils.pagination import decode_cursor, encode_cursor, paginate_newest_first
+
+
+@pytest.fixture
+def db():
+    """Base SQLite en memoria con un tenant, una lista y el ruleset de Moura"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    session.add(Tenant(id="tenant-1", nombre="Test"))
+    session.add(ListRaw(id="list-1", tenant_id="tenant-1", filename="lista.xlsx", storage_url="/tmp/lista.xlsx"))
+    session.add(Ruleset(id="ruleset-1", tenant_id="tenant-1", nombre="Moura", version="v1", config=MOURA_RULESET))
+    lineas = ['Automotriz', 'Pesada', 'Motocicleta']
+    for i in range(30):
+        session.add(NormalizedItem(
+            list_id="list-1",
+            sku=f"SKU-{i:03d}",
+            marca="Moura",
+            linea=lineas[i % 3],
+            base_price=10000.0 + i * 250,
+            cost=4000.0 + i * 100,
+            attrs={}
+        ))
+    session.commit()
+
+    ruleset_cache.invalidate()
+    yield session
+    session.close()
+
+
+class TestPricingSimulator:
+    """Tests para el simulador de pricing"""
+
+    def test_run_simulation(self, db):
+        price_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert price_run.status == "completed"
+        assert price_run.resumen['total_items'] == 30
+        assert db.query(PriceItem).filter(PriceItem.run_id == price_run.id).count() == 30
+
+    def test_streams_items_in_chunks(self, db, monkeypatch):
+        full_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        monkeypatch.setattr(settings, 'PRICE_ITEM_CHUNK_SIZE', "7")
+        chunked_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        chunked, full = chunked_run.resumen, full_run.resumen
+        assert chunked['total_items'] == full['total_items']
+        assert chunked['margen_promedio'] == pytest.approx(full['margen_promedio'])
+        assert chunked['rentabilidad_promedio'] == pytest.approx(full['rentabilidad_promedio'])
+        assert chunked['estadisticas']['markup']['p50'] == full['estadisticas']['markup']['p50']
+        assert chunked['estadisticas']['histograma_markup'] == full['estadisticas']['histograma_markup']
+        assert chunked['estadisticas']['por_linea'].keys() == full['estadisticas']['por_linea'].keys()
+        assert db.query(PriceItem).filter(PriceItem.run_id == chunked_run.id).count() == 30
+
+    def test_empty_list_fails(self, db):
+        db.query(NormalizedItem).delete()
+        db.commit()
+        with pytest.raises(ValueError):
+            PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        assert db.query(PriceRun).one().status == "failed"
+
+    def test_incremental_run_reuses_unchanged_items(self, db):
+        simulator = PricingSimulator()
+        base_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        changed = db.query(NormalizedItem).filter(NormalizedItem.sku.in_(["SKU-001", "SKU-002"])).all()
+        for item in changed:
+            item.base_price += 1000
+        db.commit()
+
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1", base_run_id=base_run.id)
+        full_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert price_run.resumen['items_reutilizados'] == 28
+        assert price_run.resumen['items_recalculados'] == 2
+        for key in ('total_items', 'margen_promedio', 'rentabilidad_promedio'):
+            assert price_run.resumen[key] == full_run.resumen[key]
+
+        def outputs_by_sku(run):
+            rows = db.query(PriceItem).filter(PriceItem.run_id == run.id)
+            return {row.sku: row.outputs for row in rows}
+        assert outputs_by_sku(price_run) == outputs_by_sku(full_run)
+
+    def test_incremental_run_recomputes_on_ruleset_change(self, db):
+        simulator = PricingSimulator()
+        base_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        ruleset = db.query(Ruleset).filter(Ruleset.id == "ruleset-1").first()
+        ruleset.config = dict(MOURA_RULESET, version="v2")
+        db.commit()
+
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1", base_run_id=base_run.id)
+        assert price_run.resumen['items_reutilizados'] == 0
+        assert price_run.resumen['items_recalculados'] == 30
+
+    def test_incremental_run_requires_completed_base(self, db):
+        with pytest.raises(ValueError):
+            PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1", base_run_id="no-existe")
+
+
+class TestBreakdownConstants:
+    """Tests para las constantes del breakdown guardadas una vez por run"""
+
+    def test_breakdown_stored_without_run_constants(self, db):
+        simulator = PricingSimulator()
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert price_run.breakdown_constants['roundingPublic'] == "ceil50"
+        assert price_run.breakdown_constants['desc1'] == 0.50
+        items = {item.sku: item for item in db.query(PriceItem).filter(PriceItem.run_id == price_run.id)}
+        assert 'roundingPublic' not in items["SKU-000"].breakdown
+        assert 'IVA' not in items["SKU-000"].breakdown
+        # Override de IVA para la línea Pesada: el item conserva su valor
+        assert items["SKU-001"].breakdown['IVA'] == 0.105
+
+        engine = RulesEngine()
+        for sku, item in items.items():
+            expected = engine.calculate_pricing(item.inputs, ruleset_cache.get(db, "ruleset-1"))['breakdown']
+            assert simulator.get_item_breakdown(price_run, item) == expected
+
+    def test_legacy_run_breakdown_unchanged(self, db):
+        price_run = PriceRun(list_id="list-1", ruleset_id="ruleset-1", status="completed")
+        item = PriceItem(run_id="run", sku="SKU-000", inputs={}, outputs={}, breakdown={'IVA': 0.21})
+        assert PricingSimulator().get_item_breakdown(price_run, item) == {'IVA': 0.21}
+
+
+class TestPagination:
+    """Tests para la paginación por cursor de items y runs"""
+
+    def test_price_items_pages_cover_run(self, db):
+        price_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        assert price_run.items_count == 30
+
+        skus, cursor, pages = [], None, 0
+        while True:
+            items, cursor = PricingSimulator().get_price_items(db, price_run.id, cursor, limit=7)
+            skus.extend(item.sku for item in items)
+            pages += 1
+            if cursor is None:
+                break
+
+        assert pages == 5
+        assert skus == sorted(f"SKU-{i:03d}" for i in range(30))
+
+    def test_list_runs_newest_first(self, db):
+        simulator = PricingSimulator()
+        run_ids = [simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1").id for _ in range(3)]
+        for i, run_id in enumerate(run_ids):
+            db.query(PriceRun).filter(PriceRun.id == run_id).update({'created_at': datetime(2024, 1, 1 + i)})
+        db.commit()
+
+        first, cursor = simulator.list_runs(db, "tenant-1", limit=2)
+        second, last_cursor = simulator.list_runs(db, "tenant-1", cursor, limit=2)
+
+        assert [run.id for run in first + second] == run_ids[::-1]
+        assert last_cursor is None
+        assert simulator.list_runs(db, "otro-tenant")[0] == []
+
+    def test_list_runs_filters(self, db):
+        simulator = PricingSimulator()
+        completed = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        queued = PriceRun(tenant_id="tenant-1", list_id="list-1", ruleset_id="ruleset-1",
+                          status="queued", created_at=datetime(2020, 1, 1))
+        db.add(queued)
+        db.commit()
+
+        assert completed.tenant_id == "tenant-1"
+        assert [run.id for run in simulator.list_runs(db, "tenant-1", status="queued")[0]] == [queued.id]
+        assert [run.id for run in simulator.list_runs(db, "tenant-1", desde=datetime(2021, 1, 1))[0]] == [completed.id]
+        assert [run.id for run in simulator.list_runs(db, "tenant-1", hasta=datetime(2021, 1, 1))[0]] == [queued.id]
+        assert simulator.list_runs(db, "tenant-1", list_id="otra-lista")[0] == []
+
+    def test_list_runs_by_list_without_tenant(self, db):
+        simulator = PricingSimulator()
+        legacy = PriceRun(list_id="list-1", ruleset_id="ruleset-1", status="completed")
+        db.add(legacy)
+        db.commit()
+
+        # El listado por lista no depende de PriceRun.tenant_id
+        assert [run.id for run in simulator.list_runs(db, None, list_id="list-1")[0]] == [legacy.id]
+        assert simulator.list_runs(db, "tenant-1")[0] == []
+
+    def test_paginate_newest_first(self, db):
+        for i in range(5):
+            db.add(ListRaw(id=f"list-{i + 2}", tenant_id="tenant-1", filename="l.xlsx",
+                           storage_url="/tmp/l.xlsx", created_at=datetime(2024, 1, 1)))
+        db.commit()
+
+        query = db.query(ListRaw).filter(ListRaw.tenant_id == "tenant-1", ListRaw.id != "list-1")
+        ids, cursor = [], None
+        while True:
+            page, cursor = paginate_newest_first(query, ListRaw.created_at, ListRaw.id, cursor, 2)
+            ids.extend(list_raw.id for list_raw in page)
+            if cursor is None:
+                break
+        assert ids == ["list-6", "list-5", "list-4", "list-3", "list-2"]
+
+    def test_invalid_cursor(self, db):
+        with pytest.raises(ValueError):
+            PricingSimulator().get_price_items(db, "run", cursor="no-es-un-cursor")
+
+    def test_cursor_round_trip(self):
+        values = [datetime(2024, 5, 1, 12, 30), "id-1", 3]
+        assert decode_cursor(encode_cursor(values), 3) == values
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor(values), 2)
+
+
+class TestSimulationJobs:
+    """Tests para la cola de simulaciones"""
+
+    def _queued_run(self, db):
+        price_run = PriceRun(list_id="list-1", ruleset_id="ruleset-1", status="queued")
+        db.add(price_run)
+        db.commit()
+        return price_run.id
+
+    def test_job_runs_queued_simulation(self, db):
+        jobs = SimulationJobs(workers=1, max_pending=2, session_factory=sessionmaker(bind=db.get_bind()))
+        run_id = self._queued_run(db)
+
+        jobs.submit(run_id, "tenant-1", "list-1", "ruleset-1")
+        jobs.shutdown(wait=True)
+
+        db.expire_all()
+        price_run = db.query(PriceRun).filter(PriceRun.id == run_id).one()
+        assert price_run.status == "completed"
+        assert price_run.resumen['total_items'] == 30
+        assert jobs.progress(run_id) is None
+        assert jobs.pending() == 0
+
+    def test_progress_reported_per_chunk(self, db, monkeypatch):
+        monkeypatch.setattr(settings, 'PRICE_ITEM_CHUNK_SIZE', "10")
+        calls = []
+        PricingSimulator().run_simulation(
+            db, "tenant-1", "list-1", "ruleset-1", run_id=self._queued_run(db),
+            progress=lambda done, total: calls.append((done, total))
+        )
+        assert calls == [(0, 30), (10, 30), (20, 30), (30, 30)]
+
+    def test_queue_is_bounded(self, db):
+        release = threading.Event()
+        jobs = SimulationJobs(workers=1, max_pending=1, session_factory=sessionmaker(bind=db.get_bind()))
+        jobs._run = lambda *args: release.wait(5)
+        try:
+            jobs.submit("run-1", "tenant-1", "list-1", "ruleset-1")
+            with pytest.raises(SimulationQueueFull):
+                jobs.submit("run-2", "tenant-1", "list-1", "ruleset-1")
+        finally:
+            release.set()
+            jobs.shutdown(wait=True)
+
+    def test_failed_job_marks_run(self, db):
+        jobs = SimulationJobs(workers=1, max_pending=2, session_factory=sessionmaker(bind=db.get_bind()), inline=True)
+        run_id = self._queued_run(db)
+
+        jobs.submit(run_id, "tenant-1", "list-1", "no-existe")
+
+        db.expire_all()
+        price_run = db.query(PriceRun).filter(PriceRun.id == run_id).one()
+        assert price_run.status == "failed"
+        assert "no-existe" in price_run.resumen['error']
+        assert jobs.pending() == 0
+
+
+    def test_recover_interrupted_runs(self, db):
+        for status in ("queued", "running", "completed"):
+            db.add(PriceRun(id=f"run-{status}", list_id="list-1", ruleset_id="ruleset-1", status=status))
+        db.commit()
+
+        assert recover_interrupted_runs(sessionmaker(bind=db.get_bind())) == 2
+
+        db.expire_all()
+        statuses = {run.id: run.status for run in db.query(PriceRun)}
+        assert statuses == {"run-queued": "failed", "run-running": "failed", "run-completed": "completed"}
+        assert "reinicio" in db.query(PriceRun).filter(PriceRun.id == "run-queued").one().resumen['error']
+
+
+class TestPriceItemWriter:
+    """Tests para la escritura masiva de price items"""
+
+    def test_writes_in_chunks(self, db):
+        price_run = PriceRun(list_id="list-1", ruleset_id="ruleset-1", status="running")
+        db.add(price_run)
+        db.commit()
+
+        writer = PriceItemWriter(db, price_run.id, chunk_size=7)
+        for i in range(20):
+            writer.add(f"SKU-{i}", {'cost': i}, {'markup': 0.1 * i}, {'cost': i}, input_hash=f"h{i}")
+            assert writer.written == (i + 1) // 7 * 7
+        assert writer.close() == 20
+        db.commit()
+
+        rows = db.query(PriceItem).filter(PriceItem.run_id == price_run.id).order_by(PriceItem.sku).all()
+        assert len(rows) == 20
+        assert rows[0].sku == "SKU-0"
+        assert rows[0].outputs == {'markup': 0.0}
+        assert rows[0].input_hash == "h0"
+        assert rows[0].created_at is not None
+
+    def test_failed_simulation_discards_written_rows(self, db, monkeypatch):
+        def fail(self):
+            raise RuntimeError("fallo")
+        monkeypatch.setattr(RunStatistics, 'summary', fail)
+
+        with pytest.raises(RuntimeError):
+            PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert db.query(PriceRun).one().status == "failed"
+        assert db.query(PriceItem).count() == 0
+
+
+class TestRunResultsFile:
+    """Tests para los resultados de runs guardados en archivos Parquet"""
+
+    @pytest.fixture
+    def parquet_storage(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, 'RESULTS_STORAGE', "parquet")
+        monkeypatch.setattr(settings, 'PRICE_ITEM_CHUNK_SIZE', "8")
+        monkeypatch.setattr(storage_service, 'base_path', tmp_path)
+        return tmp_path
+
+    def test_results_written_to_file(self, db, parquet_storage):
+        simulator = PricingSimulator()
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert price_run.results_file == f"results/{price_run.id}.parquet"
+        assert (parquet_storage / price_run.results_file).exists()
+        assert db.query(PriceItem).count() == 0
+        assert price_run.items_count == 30
+
+        table = RunResultsFile(price_run.results_file).read_columns(['sku', 'precio_publico'])
+        assert table.num_rows == 30
+        assert sorted(table['sku'].to_pylist()) == [f"SKU-{i:03d}" for i in range(30)]
+
+    def test_pages_match_database_results(self, db, parquet_storage, monkeypatch):
+        simulator = PricingSimulator()
+        file_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        monkeypatch.setattr(settings, 'RESULTS_STORAGE', "database")
+        db_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        items, cursor = [], None
+        while True:
+            page, cursor = simulator.get_price_items(db, file_run.id, cursor, limit=7)
+            items.extend(page)
+            if cursor is None:
+                break
+
+        expected = {item.sku: item for item in db.query(PriceItem).filter(PriceItem.run_id == db_run.id)}
+        assert [item.sku for item in items] == sorted(expected)
+        for item in items:
+            assert item.outputs == expected[item.sku].outputs
+            assert item.breakdown == expected[item.sku].breakdown
+            assert item.inputs == expected[item.sku].inputs
+        assert len(list(simulator.iter_price_items(db, file_run))) == 30
+
+    def test_file_sorted_and_paged_by_row_group(self, parquet_storage):
+        writer = RunResultsWriter("run-1", chunk_size=4)
+        for i in reversed(range(10)):
+            for _ in range(2):
+                writer.add(f"SKU-{i}", {'cost': i}, {'markup': 0.1 * i}, {'cost': i})
+        assert writer.close() == 20
+
+        results = RunResultsFile(writer.object_name)
+        assert results.is_sorted
+        assert results.parquet_file.metadata.num_row_groups == 5
+        keys = results.read_columns(['sku', 'id'])
+        expected = list(zip(keys['sku'].to_pylist(), keys['id'].to_pylist()))
+        assert expected == sorted(expected)
+
+        items, after = [], None
+        while True:
+            page = results.page("run-1", after, 3)
+            if not page:
+                break
+            items.extend(page)
+            after = (page[-1].sku, page[-1].id)
+        assert [(item.sku, item.id) for item in items] == expected
+        assert items[0].outputs == {'markup': 0.0}
+
+    def test_chunks_merged_from_disk(self, parquet_storage):
+        skus = [f"SKU-{(i * 37) % 50:02d}" for i in range(50)]
+        writer = RunResultsWriter("run-1", chunk_size=6)
+        for sku in skus:
+            writer.add(sku, {}, {'markup': 0.1}, {})
+            # Los chunks completos ya están en disco, no en memoria
+            assert len(writer._rows['id']) < 6
+        assert writer.close() == 50
+
+        results = RunResultsFile(writer.object_name)
+        keys = results.read_columns(['sku', 'id'])
+        assert keys['sku'].to_pylist() == sorted(skus)
+        assert [group.num_rows for group in map(results.parquet_file.metadata.row_group,
+                range(results.parquet_file.metadata.num_row_groups))] == [6] * 8 + [2]
+        assert [path.name for path in (parquet_storage / "results").iterdir()] == ["run-1.parquet"]
+
+    def test_incremental_run_reuses_file_results(self, db, parquet_storage):
+        simulator = PricingSimulator()
+        base_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        item = db.query(NormalizedItem).filter(NormalizedItem.sku == "SKU-005").one()
+        item.base_price += 1000
+        db.commit()
+
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1", base_run_id=base_run.id)
+        assert price_run.resumen['items_reutilizados'] == 29
+        assert price_run.resumen['items_recalculados'] == 1
+
+    def test_failed_simulation_leaves_no_file(self, db, parquet_storage, monkeypatch):
+        def fail(self):
+            raise RuntimeError("fallo")
+        monkeypatch.setattr(RunStatistics, 'summary', fail)
+
+        with pytest.raises(RuntimeError):
+            PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        assert db.query(PriceRun).one().results_file is None
+        assert list((parquet_storage / "results").iterdir()) == []
+
+    def test_delete_results_removes_file(self, db, parquet_storage):
+        simulator = PricingSimulator()
+        price_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        simulator.delete_results(db, price_run)
+        assert not (parquet_storage / price_run.results_file).exists()
+
+
+def _prices(skus, prices):
+    """Fuente de precios en orden de sku a partir de listas"""
+    rows = sorted(zip(skus, prices), key=lambda row: row[0])
+    return lambda after: iter([row for row in rows if after is None or row[0] > after])
+
+
+class TestRunDiff:
+    """Tests para el diff de precios entre runs y los QA gates"""
+
+    def test_diff_joins_by_sku(self):
+        diff = RunDiff(
+            _prices(["A", "B", "C"], [110.0, 100.0, 50.0]),
+            _prices(["B", "A", "D"], [100.0, 100.0, 80.0]),
+            base_run_id="base", sku_threshold=0.05, global_threshold=0.5
+        )
+        summary = diff.summary()
+
+        assert summary['run_anterior_id'] == "base"
+        assert summary['cambio_promedio'] == pytest.approx(0.05)
+        assert summary['cambio_global'] == pytest.approx(0.05)
+        assert summary['skus_afectados'] == 1
+        assert summary['skus_bloqueados_por_gate'] == 1
+        assert summary['skus_nuevos'] == 1
+        assert summary['skus_eliminados'] == 1
+        assert summary['gate_global_superado'] is False
+
+        rows, has_more = diff.page(limit=10)
+        assert [row['sku'] for row in rows] == ["A", "B", "C", "D"]
+        assert rows[0] == {'sku': "A", 'precio_anterior': 100.0, 'precio_nuevo': 110.0,
+                           'cambio': pytest.approx(0.1), 'bloqueado': True}
+        assert rows[2]['precio_anterior'] is None
+        assert rows[3]['precio_nuevo'] is None
+        assert not has_more
+
+    def test_page_after_sku_and_blocked_only(self):
+        skus = [f"S{i}" for i in range(6)]
+        diff = RunDiff(_prices(skus, [100.0, 130.0, 100.0, 70.0, 100.0, 150.0]),
+                       _prices(skus, [100.0] * 6), sku_threshold=0.15, global_threshold=0.08)
+
+        rows, has_more = diff.page(limit=2, solo_bloqueados=True)
+        assert [row['sku'] for row in rows] == ["S1", "S3"] and has_more
+        rows, has_more = diff.page(after="S3", limit=2, solo_bloqueados=True)
+        assert [row['sku'] for row in rows] == ["S5"] and not has_more
+        assert diff.summary()['gate_global_superado'] is True
+
+    def test_run_prices_in_sku_order(self, db, monkeypatch, tmp_path):
+        simulator = PricingSimulator()
+        db_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        monkeypatch.setattr(settings, 'RESULTS_STORAGE', "parquet")
+        monkeypatch.setattr(settings, 'PRICE_ITEM_CHUNK_SIZE', "8")
+        monkeypatch.setattr(storage_service, 'base_path', tmp_path)
+        file_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        expected = sorted(
+            (item.sku, item.outputs['precio_publico'])
+            for item in db.query(PriceItem).filter(PriceItem.run_id == db_run.id)
+        )
+        for price_run in (db_run, file_run):
+            source = run_prices(db, price_run, chunk_size=7)
+            rows = list(source(None))
+            assert [sku for sku, _ in rows] == [sku for sku, _ in expected]
+            assert [price for _, price in rows] == pytest.approx([price for _, price in expected])
+            assert [sku for sku, _ in source("SKU-010")] == [sku for sku, _ in expected[11:]]
+
+        assert file_run.resumen['run_anterior_id'] == db_run.id
+        assert file_run.resumen['skus_afectados'] == 0
+        assert file_run.resumen['skus_nuevos'] == file_run.resumen['skus_eliminados'] == 0
+
+    def test_simulation_summary_compares_with_previous_run(self, db):
+        simulator = PricingSimulator()
+        first_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        assert 'run_anterior_id' not in first_run.resumen
+        assert first_run.resumen['skus_bloqueados_por_gate'] == 0
+
+        changed = db.query(NormalizedItem).filter(NormalizedItem.sku.in_(["SKU-001", "SKU-002"])).all()
+        for item in changed:
+            item.base_price *= 1.5
+        db.commit()
+
+        second_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        resumen = second_run.resumen
+        assert resumen['run_anterior_id'] == first_run.id
+        assert resumen['skus_afectados'] == 2
+        assert resumen['skus_bloqueados_por_gate'] == 2
+        assert resumen['cambio_promedio'] > 0
+
+        diff = simulator.diff_runs(db, second_run.id)
+        rows, _ = diff.page(solo_bloqueados=True)
+        assert [row['sku'] for row in rows] == ["SKU-001", "SKU-002"]
+        assert diff.summary()['skus_bloqueados_por_gate'] == resumen['skus_bloqueados_por_gate']
+
+    def test_diff_pages_reuse_summary(self, db, monkeypatch):
+        simulator = PricingSimulator()
+        first_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        second_run = simulator.run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+
+        merges = []
+        rows = RunDiff.rows
+        monkeypatch.setattr(RunDiff, 'rows', lambda diff, after=None: merges.append(after) or rows(diff, after))
+
+        # Contra el run anterior: el resumen guardado en el run, sin recorrer los runs
+        diff = simulator.diff_runs(db, second_run.id)
+        assert diff.summary()['run_anterior_id'] == first_run.id
+        diff.page(after="SKU-010", limit=5)
+        assert merges == ["SKU-010"]
+
+        # Contra otro run: el resumen se calcula una vez para todas las páginas
+        merges.clear()
+        for after in (None, "SKU-005"):
+            diff = simulator.diff_runs(db, first_run.id, base_run_id=second_run.id)
+            assert diff.summary()['run_anterior_id'] == second_run.id
+            diff.page(after=after, limit=5)
+        assert merges == [None, None, "SKU-005"]
+
+    def test_diff_requires_previous_run(self, db):
+        price_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        with pytest.raises(ValueError):
+            PricingSimulator().diff_runs(db, price_run.id)
+
+
+class TestParameterSweep:
+    """Tests para el barrido de parámetros (what-if)"""
+
+    def test_sweep_matches_individual_simulations(self, db):
+        grid = {'IVA': [0.21, 0.27], 'desc_contado': [0.0, 0.06, 0.1]}
+        results = PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", grid, 0.3)
+
+        assert len(results) == 6
+        assert db.query(PriceRun).count() == 0
+
+        items = [PricingSimulator()._build_item_data(item) for item in db.query(NormalizedItem).all()]
+        for result in results:
+            config = dict(MOURA_RULESET, globals=dict(MOURA_RULESET['globals'], IVA=result['globals']['IVA']))
+            config['steps'] = [
+                dict(step, value=result['globals']['desc_contado']) if step['var'] == 'desc_contado' else step
+                for step in MOURA_RULESET['steps']
+            ]
+            expected = RulesEngine().calculate_pricing_batch(items, compile_ruleset(config))
+            rentabilidades = [r['outputs']['rentabilidad'] for r in expected]
+
+            resumen = result['resumen']
+            assert resumen['total_items'] == 30
+            assert resumen['precio_promedio'] == pytest.approx(
+                sum(r['outputs']['precio_publico'] for r in expected) / 30)
+            assert resumen['rentabilidad_promedio'] == pytest.approx(sum(rentabilidades) / 30)
+            assert resumen['skus_bajo_umbral'] == sum(1 for r in rentabilidades if r < 0.3)
+
+    def test_sweep_rejects_unknown_parameter(self, db):
+        with pytest.raises(RulesetCompilationError):
+            PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", {'no_existe': [1]})
+
+    def test_sweep_combination_limit(self, db, monkeypatch):
+        monkeypatch.setattr(settings, 'SWEEP_MAX_COMBINATIONS', "4")
+        with pytest.raises(ValueError):
+            PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", {'L': [0.0, 0.05, 0.1], 'M': [0.0, 0.02]})
+
+    def test_sweep_chunks_combinations(self, db, monkeypatch):
+        grid = {'L': [0.0, 0.05, 0.1]}
+        single_pass = PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", grid)
+        monkeypatch.setattr(settings, 'SWEEP_CHUNK_CELLS', "30")
+        chunked = PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", grid)
+        assert chunked == single_pass
+
+    def test_sweep_streams_items_in_chunks(self, db, monkeypatch):
+        grid = {'L': [0.0, 0.05, 0.1]}
+        single_chunk = PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", grid, 0.3)
+        monkeypatch.setattr(settings, 'PRICE_ITEM_CHUNK_SIZE', "7")
+        streamed = PricingSimulator().run_sweep(db, "tenant-1", "list-1", "ruleset-1", grid, 0.3)
+
+        for expected, result in zip(single_chunk, streamed):
+            assert result['globals'] == expected['globals']
+            assert result['resumen'] == pytest.approx(expected['resumen'])
+
+
+class TestRulesetCache:
+    """Tests para la cache de rulesets compilados"""
+
+    def test_hits_and_misses(self, db):
+        cache = RulesetCache(maxsize=4)
+
+        first = cache.get(db, "ruleset-1")
+        second = cache.get(db, "ruleset-1")
+
+        assert first is second
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_invalidated_on_update(self, db):
+        first = ruleset_cache.get(db, "ruleset-1")
+
+        ruleset = db.query(Ruleset).filter(Ruleset.id == "ruleset-1").first()
+        ruleset.config = dict(MOURA_RULESET, version="v2")
+        db.commit()
+
+        second = ruleset_cache.get(db, "ruleset-1")
+        assert second is not first
+        assert second.version == "v2"
+
+    def test_lru_eviction(self, db):
+        cache = RulesetCache(maxsize=2)
+        for i in range(3):
+            db.add(Ruleset(id=f"rs-{i}", tenant_id="tenant-1", nombre="R", version="v1", config=MOURA_RULESET))
+        db.commit()
+
+        cache.get(db, "rs-0")
+        cache.get(db, "rs-1")
+        cache.get(db, "rs-0")
+        cache.get(db, "rs-2")
+
+        stats = cache.stats()
+        assert stats['size'] == 2
+        assert stats['evictions'] == 1
+        cache.get(db, "rs-0")
+        assert cache.stats()['hits'] == 2
+
+    def test_missing_ruleset(self, db):
+        with pytest.raises(ValueError):
+            RulesetCache().get(db, "no-existe")
+
+
+class TestShardedPricing:
+    """Tests para la simulación repartida en procesos"""
+
+    def test_sharded_results_match_single_process(self):
+        compiled = compile_ruleset(MOURA_RULESET)
+        items = [
+            {'sku': f'S{i}', 'marca': 'Moura', 'linea': ['Automotriz', 'Pesada'][i % 2],
+             'base_price': 1000.0 + i, 'cost': 500.0 + i}
+            for i in range(250)
+        ]
+        pricer = ShardedPricer(workers=2, shard_size=100, threshold=200)
+        try:
+            assert pricer.should_shard(len(items))
+            assert not pricer.should_shard(150)
+            assert pricer.price(compiled, items) == RulesEngine().calculate_pricing_batch(items, compiled)
+        finally:
+            pricer.shutdown()
+
+    def test_large_list_uses_the_pool(self, db, monkeypatch):
+        expected = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        expected_outputs = {item.sku: item.outputs for item in db.query(PriceItem).filter(PriceItem.run_id == expected.id)}
+
+        # 30 items superan el umbral, pero cada chunk (2 x 5 = 10 items) no
+        pricer = ShardedPricer(workers=2, shard_size=5, threshold=20)
+        shard_calls = []
+        price = pricer.price
+        monkeypatch.setattr(pricer, 'price', lambda compiled, items: (shard_calls.append(len(items)), price(compiled, items))[1])
+        monkeypatch.setattr('app.services.simulator.sharded_pricer', pricer)
+        try:
+            price_run = PricingSimulator().run_simulation(db, "tenant-1", "list-1", "ruleset-1")
+        finally:
+            pricer.shutdown()
+
+        assert shard_calls == [10, 10, 10]
+        outputs = {item.sku: item.outputs for item in db.query(PriceItem).filter(PriceItem.run_id == price_run.id)}
+        assert outputs == expected_outputs
+
+    def test_pool_does_not_fork_the_server(self):
+        pricer = ShardedPricer(workers=2, shard_size=100, threshold=200)
+        try:
+            assert pricer._get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+        finally:
+            pricer.shutdown()
+
+    def test_single_worker_never_shards(self):
+        assert not ShardedPricer(workers=1, shard_size=10, threshold=10).should_shard(1000)
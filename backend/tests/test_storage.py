@@ -0,0 +1,42 @@
+import io
+import hashlib
+import pytest
+from app.services.storage import StorageService, FileTooLarge
+
+
+@pytest.fixture
+def storage(tmp_path):
+    service = StorageService()
+    service.base_path = tmp_path
+    return service
+
+
+class TestStoreStream:
+    """Tests para el guardado de streams en una sola pasada"""
+
+    def test_writes_content_addressed_file(self, storage, tmp_path, monkeypatch):
+        monkeypatch.setattr('app.services.storage.STREAM_CHUNK_SIZE', 4)
+        content = b"contenido de una lista de precios"
+
+        stored = storage.store_stream(io.BytesIO(content), "lists/tenant-1", ".xlsx")
+
+        assert stored.size == len(content)
+        assert stored.sha256 == hashlib.sha256(content).hexdigest()
+        assert stored.path == str(tmp_path / "lists" / "tenant-1" / f"{stored.sha256}.xlsx")
+        with open(stored.path, "rb") as f:
+            assert f.read() == content
+
+    def test_same_content_same_file(self, storage, tmp_path):
+        first = storage.store_stream(io.BytesIO(b"abc"), "lists", ".xlsx")
+        second = storage.store_stream(io.BytesIO(b"abc"), "lists", ".xlsx")
+
+        assert first == second
+        assert len(list((tmp_path / "lists").iterdir())) == 1
+
+    def test_too_large_leaves_nothing(self, storage, tmp_path, monkeypatch):
+        monkeypatch.setattr('app.services.storage.STREAM_CHUNK_SIZE', 4)
+
+        with pytest.raises(FileTooLarge):
+            storage.store_stream(io.BytesIO(b"x" * 20), "lists", ".xlsx", max_size=10)
+
+        assert list((tmp_path / "lists").iterdir()) == []